@@ -1,10 +1,12 @@
 import os
-import glob
-import pandas as pd
-from PIL import Image
+import sys
 import tkinter as tk
 from tkinter import filedialog
 
+# Accès au paquet core depuis ce dossier de scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.image_audit import scan_image_dimensions, summarize_dimensions
+
 def analyze_dimensions():
     print("--- Analyseur de Dimensions d'Images ---")
     
@@ -20,42 +22,12 @@ def analyze_dimensions():
 
     print(f"Analyse du dossier : {directory} ...")
 
-    # 2. Récupération des fichiers
-    extensions = ['*.jpg', '*.jpeg', '*.png', '*.tif', '*.tiff', '*.bmp']
-    files = []
-    for ext in extensions:
-        files.extend(glob.glob(os.path.join(directory, ext)))
-        # Version minuscule/majuscule pour Linux/Windows parfois sensible
-        files.extend(glob.glob(os.path.join(directory, ext.upper())))
-
-    files = sorted(list(set(files))) # Doublons et tri
-
-    if not files:
-        print("Aucune image trouvée.")
-        return
-
-    # 3. Extraction des dimensions
-    data = []
-    print(f"{len(files)} images trouvées. Lecture des en-têtes...")
-
-    for f_path in files:
-        try:
-            with Image.open(f_path) as img:
-                w, h = img.size
-                filename = os.path.basename(f_path)
-                data.append({
-                    "Fichier": filename,
-                    "Largeur": w,
-                    "Hauteur": h,
-                    "Définition (Mpx)": round((w * h) / 1_000_000, 2),
-                    "Ratio": round(w/h, 3)
-                })
-        except Exception as e:
-            print(f"Erreur sur {os.path.basename(f_path)}: {e}")
-
-    # 4. Analyse et Affichage
-    df = pd.DataFrame(data)
+    # 2. Lecture des en-têtes (sans décodage, en parallèle)
+    df, errors = scan_image_dimensions(directory, progress_callback=print)
+    for err in errors:
+        print(f"Erreur sur {err}")
 
+    # 3. Analyse et Affichage
     if df.empty:
         print("Aucune donnée extraite.")
         return
@@ -65,7 +37,7 @@ def analyze_dimensions():
     print("="*50)
 
     # On groupe par Largeur/Hauteur pour voir les 'types' de fiches
-    summary = df.groupby(['Largeur', 'Hauteur']).size().reset_index(name='Nombre d\'images')
+    summary = summarize_dimensions(df)
     print(summary.to_string(index=False))
 
     print("\n" + "="*50)
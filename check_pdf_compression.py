@@ -2,7 +2,10 @@ import sys
 import os
 import struct
 import math
+import zlib
+import numpy as np
 from pypdf import PdfReader
+from pypdf.generic import StreamObject
 
 # Table de quantification Luminance standard (IJG)
 # Utilisée comme référence pour calculer le facteur de qualité
@@ -16,99 +19,153 @@ STD_LUMINANCE_QUANT_TBL = [
     49, 64, 78, 87, 103, 121, 120, 101,
     72, 92, 95, 98, 112, 100, 103, 99
 ]
+STD_LUMINANCE = np.array(STD_LUMINANCE_QUANT_TBL, dtype=np.float64)
+
+# Ordre zigzag : position naturelle (ligne*8+colonne) du k-ième coefficient stocké dans le DQT
+ZIGZAG = np.array([
+     0,  1,  8, 16,  9,  2,  3, 10,
+    17, 24, 32, 25, 18, 11,  4,  5,
+    12, 19, 26, 33, 40, 48, 41, 34,
+    27, 20, 13,  6,  7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36,
+    29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46,
+    53, 60, 61, 54, 47, 55, 62, 63
+])
+
+# Marqueurs sans champ longueur (SOI, EOI, RSTn, TEM)
+STANDALONE_MARKERS = {0xD8, 0xD9, 0x01} | set(range(0xD0, 0xD8))
+
+def parse_jpeg_dqt(jpeg_data):
+    """
+    Lit les tables de quantification d'un flux JPEG en sautant de segment
+    en segment grâce aux longueurs (arrêt au SOS, les données compressées
+    ne sont jamais parcourues).
+    Gère plusieurs tables par segment DQT et la précision 16 bits.
+    Retourne {id_table: np.array(64) en ordre naturel}.
+    """
+    tables = {}
+    n = len(jpeg_data)
+    if n < 4 or jpeg_data[0] != 0xFF or jpeg_data[1] != 0xD8:
+        return tables
+
+    i = 2
+    while i + 1 < n:
+        if jpeg_data[i] != 0xFF:
+            # Flux non conforme : on resynchronise sur le prochain marqueur
+            i = jpeg_data.find(b"\xff", i)
+            if i < 0: break
+            continue
+        marker = jpeg_data[i + 1]
+        if marker == 0xFF:  # Octet de bourrage
+            i += 1
+            continue
+        if marker in STANDALONE_MARKERS:
+            i += 2
+            continue
+        if marker == 0xDA or i + 4 > n:  # SOS : fin de l'en-tête
+            break
+
+        length = struct.unpack_from(">H", jpeg_data, i + 2)[0]
+        seg_start, seg_end = i + 4, min(n, i + 2 + length)
+
+        if marker == 0xDB:
+            pos = seg_start
+            while pos < seg_end:
+                pq, tq = jpeg_data[pos] >> 4, jpeg_data[pos] & 0x0F
+                size = 128 if pq else 64
+                raw = jpeg_data[pos + 1:pos + 1 + size]
+                if len(raw) < size: break
+                values = np.frombuffer(raw, dtype=">u2" if pq else np.uint8).astype(np.float64)
+                table = np.empty(64)
+                table[ZIGZAG] = values
+                tables[tq] = table
+                pos += 1 + size
+
+        i += 2 + length
+    return tables
 
 def estimate_jpeg_quality(jpeg_data):
     """
     Estime la qualité JPEG (1-100) en analysant la table de quantification (DQT).
-    Retourne une chaîne (ex: "~85") ou None si échec.
+    Retourne un entier ou None si échec.
     """
     try:
-        # Recherche du marqueur DQT (Define Quantization Table) : FF DB
-        # On parcourt le flux d'octets
-        i = 0
-        while i < len(jpeg_data) - 1:
-            if jpeg_data[i] == 0xFF and jpeg_data[i+1] == 0xDB:
-                # DQT trouvé !
-                # Structure: [FF DB] [Length (2)] [QT Info (1)] [Table (64)]
-                length = struct.unpack(">H", jpeg_data[i+2:i+4])[0]
-                
-                # On regarde la première table (souvent Luminance, ID 0)
-                # QT Info : bit 0-3 = ID, bit 4-7 = précision
-                qt_info = jpeg_data[i+4]
-                qt_id = qt_info & 0x0F
-                
-                if qt_id == 0: # Table 0 (Luminance)
-                    # Lire les 64 octets de la table
-                    table_data = jpeg_data[i+5 : i+5+64]
-                    if len(table_data) < 64:
-                        return None
-                    
-                    # Calculer le facteur de mise à l'échelle moyen par rapport au standard
-                    total_scale = 0
-                    for j in range(64):
-                        val_file = table_data[j]
-                        val_std = STD_LUMINANCE_QUANT_TBL[j]
-                        # Eviter division par 0
-                        if val_std == 0: val_std = 1
-                        total_scale += (val_file * 100.0) / val_std
-                        
-                    avg_scale = total_scale / 64.0
-                    
-                    # Formule inverse de l'IJG pour retrouver la Qualité Q
-                    # Scale = 5000 / Q (si Q < 50)
-                    # Scale = 200 - 2*Q (si Q > 50)
-                    
-                    # Donc :
-                    # Si Scale > 100 (Qualité < 50) -> Q = 5000 / Scale
-                    # Si Scale <= 100 (Qualité >= 50) -> Q = (200 - Scale) / 2
-                    
-                    if avg_scale == 0: 
-                        est_quality = 100
-                    elif avg_scale >= 100:
-                        est_quality = 5000 / avg_scale
-                    else:
-                        est_quality = (200 - avg_scale) / 2
-                    
-                    return int(est_quality)
-                
-                # Avancer au prochain segment
-                i += length + 2
-            else:
-                i += 1
-                # Optimisation : Si on trouve FF C0 (Start of Frame), on arrête, les DQT sont avant.
-                if i < len(jpeg_data)-1 and jpeg_data[i] == 0xFF and jpeg_data[i+1] == 0xC0:
-                    break
-        return None
+        tables = parse_jpeg_dqt(bytes(jpeg_data))
+        # Table 0 (Luminance)
+        table = tables.get(0)
+        if table is None:
+            return None
+
+        # Facteur de mise à l'échelle moyen par rapport au standard
+        avg_scale = float(np.mean(table * 100.0 / STD_LUMINANCE))
+
+        # Formule inverse de l'IJG pour retrouver la Qualité Q
+        # Scale = 5000 / Q (si Q < 50)
+        # Scale = 200 - 2*Q (si Q > 50)
+        
+        # Donc :
+        # Si Scale > 100 (Qualité < 50) -> Q = 5000 / Scale
+        # Si Scale <= 100 (Qualité >= 50) -> Q = (200 - Scale) / 2
+        
+        if avg_scale == 0: 
+            est_quality = 100
+        elif avg_scale >= 100:
+            est_quality = 5000 / avg_scale
+        else:
+            est_quality = (200 - avg_scale) / 2
+        
+        return int(est_quality)
     except Exception:
         return None
 
+# Taille maximale lue pour trouver les DQT (ils précèdent toujours le SOS, en début de flux)
+JPEG_HEADER_LIMIT = 64 * 1024
+
+def _filter_names(obj):
+    filters = obj.get('/Filter')
+    if not filters:
+        return []
+    if isinstance(filters, list):
+        return [str(f).lstrip('/') for f in filters]
+    return [str(filters).lstrip('/')]
+
+def _jpeg_header_bytes(obj, limit=JPEG_HEADER_LIMIT):
+    """
+    Octets JPEG d'un flux DCTDecode, pour la lecture des tables de quantification.
+    - Flate + DCT : seuls les limit premiers octets sont décompressés (les DQT
+      sont en début de fichier), à partir du flux brut encore compressé.
+    - DCT seul : pypdf a déjà chargé les octets du flux à la lecture de l'objet
+      et ne décode pas la couche DCT, get_data() les rend sans autre coût.
+    """
+    if _filter_names(obj) == ["FlateDecode", "DCTDecode"] and not obj.get('/DecodeParms'):
+        # StreamObject.get_data : octets bruts, sans le décodage complet d'EncodedStreamObject
+        raw = StreamObject.get_data(obj)
+        return zlib.decompressobj().decompress(raw, limit)
+    return obj.get_data()
+
 def get_obj_filter_and_quality(obj):
     """Extrait le filtre et tente d'estimer la qualité si JPEG."""
-    filters = obj.get('/Filter')
     quality_str = ""
     
-    filter_list = []
-    if filters:
-        if isinstance(filters, list):
-            filter_list = [str(f) for f in filters]
-        else:
-            filter_list = [str(filters)]
-    else:
-        filter_list = ["None (Raw)"]
+    filter_list = ['/' + f for f in _filter_names(obj)] or ["None (Raw)"]
         
-    # Si c'est du JPEG (DCTDecode), on essaie d'extraire les données pour calculer la qualité
-    if "DCTDecode" in [f.lstrip('/') for f in filter_list]:
-        try:
-            data = obj.get_data()
-            if data:
-                q = estimate_jpeg_quality(data)
-                if q:
-                    quality_str = f" [Qualité Est.: ~{q} %]"
-        except Exception:
-            pass
+    # Si c'est du JPEG (DCTDecode), on lit l'en-tête pour calculer la qualité
+    q = _obj_jpeg_quality(obj)
+    if q:
+        quality_str = f" [Qualité Est.: ~{q} %]"
             
     return filter_list, quality_str
 
+def _obj_jpeg_quality(obj):
+    if "DCTDecode" not in _filter_names(obj):
+        return None
+    try:
+        data = _jpeg_header_bytes(obj)
+        return estimate_jpeg_quality(data) if data else None
+    except Exception:
+        return None
+
 def analyze_xobjects(xobjects, results):
     """Parcourt récursivement les XObjects."""
     if not xobjects:
@@ -175,12 +232,95 @@ def interpret_result(res_string):
     else:
         return res_string
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Utilisation: python check_pdf_compression.py <fichier.pdf>")
-        sys.exit(1)
+# =============================================================================
+# AUDIT PAR LOT (DOSSIERS)
+# =============================================================================
+
+def _collect_image_rows(xobjects, pdf_path, page_num, rows, prefix=""):
+    """Parcourt récursivement les XObjects d'une page et ajoute une ligne par image."""
+    if not xobjects:
+        return
+
+    for obj_name in xobjects:
+        try:
+            obj = xobjects[obj_name].get_object()
+            subtype = obj.get('/Subtype')
+
+            if subtype == '/Image':
+                filters = _filter_names(obj)
+                q = _obj_jpeg_quality(obj)
+                rows.append({
+                    "fichier": pdf_path,
+                    "page": page_num,
+                    "image": prefix + str(obj_name),
+                    "filtres": ", ".join(filters) or "None (Raw)",
+                    "largeur": obj.get('/Width'),
+                    "hauteur": obj.get('/Height'),
+                    "bits": obj.get('/BitsPerComponent'),
+                    "qualite_jpeg": q,
+                    "erreur": ""
+                })
+            
+            elif subtype == '/Form':
+                if '/Resources' in obj and '/XObject' in obj['/Resources']:
+                    _collect_image_rows(obj['/Resources']['/XObject'].get_object(), pdf_path, page_num,
+                                        rows, prefix=prefix + str(obj_name) + "/")
+                    
+        except Exception:
+            continue
+
+def audit_pdf(pdf_path):
+    """Une ligne par image et par page (filtres, dimensions, qualité JPEG estimée)."""
+    rows = []
+    try:
+        reader = PdfReader(pdf_path)
+        for page_num, page in enumerate(reader.pages, start=1):
+            if '/Resources' in page and '/XObject' in page['/Resources']:
+                xobjects = page['/Resources']['/XObject'].get_object()
+                _collect_image_rows(xobjects, pdf_path, page_num, rows)
+    except Exception as e:
+        rows.append({"fichier": pdf_path, "page": None, "image": None, "filtres": None,
+                     "largeur": None, "hauteur": None, "bits": None, "qualite_jpeg": None,
+                     "erreur": str(e)})
+    return rows
+
+def find_pdfs(root_dir):
+    pdfs = []
+    for dirpath, _, filenames in os.walk(root_dir):
+        pdfs.extend(os.path.join(dirpath, f) for f in filenames if f.lower().endswith(".pdf"))
+    return sorted(pdfs)
+
+def audit_directory(root_dir, workers=None, progress_callback=None):
+    """
+    Audite tous les PDF d'une arborescence dans un pool de processus.
+    Retourne un DataFrame (une ligne par image et par page).
+    """
+    import pandas as pd
+    from concurrent.futures import ProcessPoolExecutor
+
+    pdfs = find_pdfs(root_dir)
+    if progress_callback: progress_callback(f"{len(pdfs)} PDF trouvés.")
 
-    pdf_file_path = sys.argv[1]
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for i, pdf_rows in enumerate(ex.map(audit_pdf, pdfs, chunksize=4), start=1):
+            rows.extend(pdf_rows)
+            if progress_callback and (i % 20 == 0 or i == len(pdfs)):
+                progress_callback(f"{i}/{len(pdfs)} PDF analysés...")
+
+    df = pd.DataFrame(rows, columns=["fichier", "page", "image", "filtres", "largeur",
+                                     "hauteur", "bits", "qualite_jpeg", "erreur"])
+    df["qualite_jpeg"] = df["qualite_jpeg"].astype("Int64")
+    return df
+
+def save_audit(df, out_path):
+    """Écrit le résumé en Parquet (extension .parquet, nécessite pyarrow) ou en CSV."""
+    if out_path.lower().endswith(".parquet"):
+        df.to_parquet(out_path, index=False)
+    else:
+        df.to_csv(out_path, index=False)
+
+def print_single_report(pdf_file_path):
     print(f"--- Analyse Qualité : {os.path.basename(pdf_file_path)} ---")
     
     raw_results = get_image_info(pdf_file_path)
@@ -200,3 +340,24 @@ if __name__ == "__main__":
             print(f"🔹 {count} image(s) : {human_desc}")
             if "JPEG" in human_desc and "Qualité" not in human_desc: # Si on n'a pas réussi à estimer
                  print(f"   (Interne: {raw_desc})")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyse la compression des images d'un PDF ou d'un dossier de PDF.")
+    parser.add_argument("chemin", help="Fichier PDF, ou dossier à auditer récursivement")
+    parser.add_argument("--out", default="audit_compression.csv",
+                        help="Fichier de sortie du mode dossier (.csv ou .parquet)")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus (défaut : nb de coeurs)")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.chemin):
+        df = audit_directory(args.chemin, workers=args.workers, progress_callback=print)
+        save_audit(df, args.out)
+        print(f"\n{len(df)} image(s) auditée(s). Résumé : {args.out}")
+        if not df.empty:
+            print(df.groupby("filtres", dropna=False).agg(
+                images=("image", "size"), qualite_moyenne=("qualite_jpeg", "mean")
+            ).to_string())
+    else:
+        print_single_report(args.chemin)
@@ -0,0 +1,259 @@
+"""
+Boucle d'apprentissage actif : le pipeline OCR devient la fonction objectif.
+
+À chaque tour, le métamodèle propose un lot de jeux de paramètres (borne
+haute de confiance + diversité), ceux-ci sont évalués par
+ocr_quality_audit.pipeline_complet et une fonction de score sur un jeu
+d'images local, puis ajoutés au criblage et le métamodèle est complété.
+
+Le score n'a a priori ni l'unité ni l'échelle de la réponse du criblage :
+par défaut il est écrit dans sa propre colonne (score_col) et le
+métamodèle n'est entraîné que sur les lignes évaluées par la boucle.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+from sklearn.ensemble import RandomForestRegressor
+
+from core.optimization_finder import compute_search_bounds, forest_predict_stats
+from core.render_engine import OCR_PARAM_DEFAULTS, normalize_ocr_params
+
+try:
+    import pytesseract
+    TESSERACT_AVAILABLE = True
+except ImportError:
+    TESSERACT_AVAILABLE = False
+
+
+TESSERACT_SCORE_COL = "confiance_tesseract"
+
+
+def check_tesseract():
+    """Lève une erreur explicite si pytesseract ou l'exécutable tesseract manque."""
+    if not TESSERACT_AVAILABLE:
+        raise ImportError("La librairie pytesseract est requise. Veuillez l'installer avec : pip install pytesseract")
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        raise RuntimeError(f"Exécutable Tesseract introuvable : {e}")
+
+
+def tesseract_confidence(img):
+    """Score par défaut : confiance moyenne (0-100) des mots reconnus par Tesseract."""
+    if not TESSERACT_AVAILABLE:
+        raise ImportError("La librairie pytesseract est requise. Veuillez l'installer avec : pip install pytesseract")
+    data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+    conf = [float(c) for c in data["conf"] if float(c) >= 0]
+    return float(np.mean(conf)) if conf else 0.0
+
+
+# =============================================================================
+# ÉVALUATION (processus)
+# =============================================================================
+
+# Images décodées une fois par processus (cf. _init_eval_worker)
+_WORKER_IMAGES = []
+_WORKER_SCORE_FN = None
+
+def _init_eval_worker(image_paths, score_fn):
+    global _WORKER_IMAGES, _WORKER_SCORE_FN
+    _WORKER_IMAGES = [img for img in (cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in image_paths)
+                      if img is not None]
+    _WORKER_SCORE_FN = score_fn
+
+def _evaluate_job(raw_params):
+    """(score moyen, None) ou (nan, message) : un jeu en échec n'interrompt pas la boucle."""
+    import ocr_quality_audit
+    ocr_params = normalize_ocr_params(raw_params)
+    try:
+        # Copie par évaluation : pipeline_complet peut travailler sur place
+        scores = [_WORKER_SCORE_FN(ocr_quality_audit.pipeline_complet(img.copy(), ocr_params))
+                  for img in _WORKER_IMAGES]
+    except Exception as e:
+        return np.nan, f"{ocr_params} : {e}"
+    return (float(np.mean(scores)) if scores else np.nan), None
+
+
+# =============================================================================
+# PROPOSITION
+# =============================================================================
+
+def propose_batch(model, bounds, params, batch_size=8, kappa=2.0, n_candidates=4000,
+                  min_distance=0.1, X_known=None, rng=None):
+    """
+    Choisit batch_size points parmi n_candidates (hypercube latin) par borne
+    haute de confiance (moyenne + kappa*écart-type des arbres), en écartant
+    les candidats à moins de min_distance (espace normalisé [0, 1]) d'un point
+    déjà retenu ou déjà évalué.
+    Retourne une liste de dicts {param: valeur}.
+    """
+    rng = rng or np.random.default_rng()
+    low = np.array([b[0] for b in bounds], dtype=float)
+    span = np.array([b[1] - b[0] for b in bounds], dtype=float)
+    safe_span = np.where(span > 0, span, 1.0)
+
+    unit = qmc.LatinHypercube(d=len(bounds), seed=rng).random(n_candidates)
+    X = low + unit * span
+    mean, std = forest_predict_stats(model, X)
+    order = np.argsort(mean + kappa * std)[::-1]
+
+    taken = [] if X_known is None else list((np.asarray(X_known, dtype=float) - low) / safe_span)
+    chosen = []
+    for idx in order:
+        if taken and np.min(np.linalg.norm(np.array(taken) - unit[idx], axis=1)) < min_distance:
+            continue
+        chosen.append(X[idx])
+        taken.append(unit[idx])
+        if len(chosen) == batch_size: break
+    return [dict(zip(params, x)) for x in chosen]
+
+
+# =============================================================================
+# BOUCLE
+# =============================================================================
+
+def evaluated_params(raw_params, params):
+    """
+    Valeurs réellement évaluées pour un point proposé : les paramètres OCR
+    passent par normalize_ocr_params (arrondi, parité), les autres sont inchangés.
+    """
+    ocr_params = normalize_ocr_params(raw_params)
+    return {p: ocr_params[p] if p in OCR_PARAM_DEFAULTS else raw_params[p] for p in params}
+
+
+def widen_bounds(bounds, expansion_pct):
+    """
+    Élargit chaque intervalle de expansion_pct de son étendue de part et
+    d'autre ; une borne basse positive ne devient pas négative.
+    """
+    widened = []
+    for low, high in bounds:
+        span = (high - low) * expansion_pct
+        new_low = low - span
+        if low >= 0: new_low = max(0.0, new_low)
+        widened.append((new_low, high + span))
+    return widened
+
+
+def run_active_learning(df, params, response, image_paths, n_rounds=5, batch_size=8,
+                        max_evaluations=None, time_budget=None, kappa=2.0, score_fn=None,
+                        score_col=TESSERACT_SCORE_COL, expansion_pct=0.0, workers=None,
+                        trees_per_round=50, progress_callback=None, stop_event=None, random_state=42):
+    """
+    Alterne proposition (propose_batch), évaluation réelle et mise à jour du métamodèle.
+
+    Args:
+        df: criblage existant (params + response) ; il n'est pas modifié, les
+            nouveaux essais sont ajoutés à une copie.
+        response: réponse du criblage, utilisée seulement si score_col est None.
+        image_paths: images de test, décodées une fois par processus.
+        max_evaluations / time_budget: budget (nombre de jeux évalués / secondes).
+        score_fn: image traitée -> score (picklable ; défaut : tesseract_confidence).
+        score_col: colonne recevant les scores. Le métamodèle est entraîné sur
+            les seules lignes où elle est renseignée ; sans historique, un
+            premier lot est tiré par hypercube latin. Avec score_col=None, les
+            scores sont écrits dans response : score_fn est alors obligatoire
+            et doit mesurer la même grandeur que le criblage.
+        expansion_pct: élargissement du domaine observé (cf. widen_bounds).
+        trees_per_round: arbres ajoutés à chaque tour (warm_start) au lieu de
+            réentraîner toute la forêt.
+        stop_event: threading.Event permettant d'interrompre entre deux tours.
+
+    Returns:
+        (DataFrame augmenté avec une colonne 'origine', historique par tour).
+        Les paramètres des nouvelles lignes sont les valeurs évaluées (cf. evaluated_params).
+    """
+    if not image_paths:
+        raise ValueError("Aucune image de test fournie.")
+    if score_col is None and score_fn is None:
+        raise ValueError("Une fonction de score cohérente avec la réponse du criblage est requise "
+                         "pour écrire dans la colonne réponse.")
+    if score_fn is None:
+        check_tesseract()  # Échec immédiat plutôt que dans chaque processus
+    score_fn = score_fn or tesseract_confidence
+    target = score_col or response
+    rng = np.random.default_rng(random_state)
+
+    data = df.copy()
+    if "origine" not in data.columns:
+        data["origine"] = "criblage"
+    if target not in data.columns:
+        data[target] = np.nan
+    bounds = widen_bounds(compute_search_bounds(data, params, {}, 0.0), expansion_pct)
+
+    model = RandomForestRegressor(n_estimators=200, random_state=random_state, warm_start=True, n_jobs=-1)
+
+    def fit():
+        train = data[params + [target]].dropna()
+        if len(train) < 2: return False
+        model.fit(train[params].values, train[target].values)
+        return True
+
+    fitted = fit()
+
+    history = []
+    n_evals = 0
+    t0 = time.perf_counter()
+    workers = workers or min(batch_size, os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_eval_worker,
+                             initargs=(list(image_paths), score_fn)) as ex:
+        for rnd in range(1, n_rounds + 1):
+            if stop_event is not None and stop_event.is_set(): break
+            if time_budget is not None and time.perf_counter() - t0 >= time_budget: break
+            size = batch_size if max_evaluations is None else min(batch_size, max_evaluations - n_evals)
+            if size <= 0: break
+
+            if fitted:
+                batch = propose_batch(model, bounds, params, size, kappa,
+                                      X_known=data.dropna(subset=[target])[params].values, rng=rng)
+            else:
+                # Pas encore de scores : lot initial réparti sur le domaine
+                unit = qmc.LatinHypercube(d=len(bounds), seed=rng).random(size)
+                low = np.array([b[0] for b in bounds])
+                high = np.array([b[1] for b in bounds])
+                batch = [dict(zip(params, x)) for x in low + unit * (high - low)]
+            batch = [evaluated_params(raw, params) for raw in batch]
+            try:
+                outcomes = list(ex.map(_evaluate_job, batch))
+            except Exception as e:
+                # Pool inutilisable (processus tué...) : on rend les tours déjà évalués
+                if progress_callback: progress_callback(f"Tour {rnd} interrompu : {e}")
+                break
+            scores = [score for score, _ in outcomes]
+            if progress_callback:
+                for _, error in outcomes:
+                    if error: progress_callback(f"  Échec de l'évaluation {error}")
+            n_evals += len(batch)
+
+            new_rows = pd.DataFrame(batch)
+            new_rows[target] = scores
+            new_rows["origine"] = f"actif_{rnd}"
+            new_rows = new_rows.dropna(subset=[target])
+            data = pd.concat([data, new_rows], ignore_index=True)
+
+            # Complément incrémental : nouveaux arbres entraînés sur toutes les données
+            if fitted: model.n_estimators += trees_per_round
+            fitted = fit()
+
+            scored = data.dropna(subset=[target])
+            best = scored.loc[scored[target].idxmax()] if len(scored) else None
+            history.append({
+                "round": rnd,
+                "n_evals": n_evals,
+                "batch_best": float(new_rows[target].max()) if len(new_rows) else np.nan,
+                "best": float(best[target]) if best is not None else np.nan,
+                "best_origin": best["origine"] if best is not None else None,
+                "elapsed": time.perf_counter() - t0
+            })
+            if progress_callback:
+                h = history[-1]
+                progress_callback(f"Tour {rnd} : {len(batch)} jeux évalués, meilleur du lot "
+                                  f"{h['batch_best']:.3f}, meilleur global {h['best']:.3f} "
+                                  f"({h['elapsed']:.0f}s)")
+
+    return data, history
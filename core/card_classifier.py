@@ -0,0 +1,201 @@
+"""
+Classifieur de type de fiche (ANCIEN / NOUVEAU) entraîné sur les profils d'encre.
+
+Alternative rapide à la corrélation décalée de classify_profiles : chaque
+carte est résumée par quelques dizaines de descripteurs (profils
+sous-échantillonnés, positions des pics principaux) et un modèle linéaire
+calibré renvoie une probabilité par classe.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+from scipy.signal import find_peaks
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import cross_val_score
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from core.image_logic import get_image_profiles, _list_images
+
+MODEL_VERSION = 1
+CLASSES = ("old", "new")
+
+
+def _downsample(prof, bins):
+    # Moyenne par tranche : robuste au léger décalage du cadrage
+    edges = np.linspace(0, len(prof), bins + 1).astype(int)
+    return np.add.reduceat(prof, edges[:-1]) / np.diff(edges)
+
+
+def _peak_positions(prof, n_peaks):
+    """Positions relatives (0..1) des n_peaks pics les plus proéminents, triées ; -1 si absents."""
+    peaks, props = find_peaks(prof, prominence=0.05, distance=max(1, len(prof) // 100))
+    out = np.full(n_peaks, -1.0)
+    if len(peaks):
+        best = np.sort(peaks[np.argsort(props["prominences"])[::-1][:n_peaks]])
+        out[:len(best)] = best / len(prof)
+    return out
+
+
+def extract_features(h_prof, v_prof, bins=64, n_peaks=5):
+    """Vecteur de descripteurs d'une carte à partir de ses profils (lignes, colonnes)."""
+    h_prof = np.asarray(h_prof, dtype=np.float64)
+    v_prof = np.asarray(v_prof, dtype=np.float64)
+    return np.concatenate([
+        _downsample(h_prof, bins),
+        _downsample(v_prof, bins),
+        _peak_positions(h_prof, n_peaks),
+        _peak_positions(v_prof, n_peaks),
+        [h_prof.mean(), h_prof.std(), v_prof.mean(), v_prof.std()]
+    ])
+
+
+# =============================================================================
+# CACHE DES PROFILS
+# =============================================================================
+
+def load_profile_cache(cache_path):
+    """Cache {(chemin, mtime, taille, target_size): (h_prof, v_prof)} ; vide si absent ou illisible."""
+    if cache_path and os.path.exists(cache_path):
+        try:
+            return joblib.load(cache_path)
+        except Exception:
+            pass
+    return {}
+
+
+def save_profile_cache(cache_path, cache):
+    if not cache_path: return
+    tmp_path = cache_path + ".part"
+    joblib.dump(cache, tmp_path)
+    os.replace(tmp_path, cache_path)
+
+
+def _cache_key(path, target_size):
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size, tuple(target_size))
+
+
+def collect_profiles(files, target_size, cache=None, workers=None):
+    """
+    Profils des images de 'files' (None pour les images illisibles).
+    Les profils déjà présents dans cache sont réutilisés, les nouveaux y sont ajoutés.
+    """
+    cache = {} if cache is None else cache
+    keys = [_cache_key(f, target_size) for f in files]
+    missing = [i for i, k in enumerate(keys) if k not in cache]
+
+    # cv2 libère le GIL pendant le décodage : un pool de threads suffit
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as ex:
+        results = ex.map(lambda i: get_image_profiles(files[i], target_size), missing)
+        for i, (h_prof, v_prof) in zip(missing, results):
+            if h_prof is None: continue
+            cache[keys[i]] = (h_prof.astype(np.float32), v_prof.astype(np.float32))
+
+    return [cache.get(k) for k in keys]
+
+
+# =============================================================================
+# MODÈLE
+# =============================================================================
+
+class CardClassifier:
+    """Modèle entraîné + paramètres d'extraction, sérialisé avec joblib."""
+
+    def __init__(self, model, target_size, bins=64, n_peaks=5, metrics=None):
+        self.version = MODEL_VERSION
+        self.model = model
+        self.target_size = tuple(target_size)
+        self.bins = bins
+        self.n_peaks = n_peaks
+        self.metrics = metrics or {}
+
+    def features(self, profiles):
+        return np.vstack([extract_features(h, v, self.bins, self.n_peaks) for h, v in profiles])
+
+    def predict_proba(self, profiles):
+        """Probabilités (p_ancien, p_nouveau) pour une liste de profils (h, v)."""
+        if not profiles: return np.empty((0, 2))
+        proba = self.model.predict_proba(self.features(profiles))
+        order = [list(self.model.classes_).index(c) for c in CLASSES]
+        return proba[:, order]
+
+    def classify_batch(self, profiles, proba_threshold=0.8):
+        """
+        Même sortie que classify_profiles, pour un lot de cartes :
+        [(categorie, p_ancien, p_nouveau), ...] ; 'unsure' si aucune classe n'atteint proba_threshold.
+        """
+        results = []
+        for p_old, p_new in self.predict_proba(profiles):
+            if p_old >= proba_threshold:
+                category = "old"
+            elif p_new >= proba_threshold:
+                category = "new"
+            else:
+                category = "unsure"
+            results.append((category, float(p_old), float(p_new)))
+        return results
+
+    def save(self, path):
+        joblib.dump(self, path)
+
+
+def load_card_classifier(path):
+    clf = joblib.load(path)
+    if not isinstance(clf, CardClassifier):
+        raise ValueError(f"{os.path.basename(path)} n'est pas un classifieur de fiches.")
+    if clf.version > MODEL_VERSION:
+        raise ValueError(f"Version de classifieur non supportée : {clf.version} (max {MODEL_VERSION}).")
+    return clf
+
+
+def train_card_classifier(folder_old, folder_new, output_path, target_size=(800, 1000),
+                          cache_path=None, bins=64, n_peaks=5, limit=None, workers=None,
+                          progress_callback=None):
+    """
+    Entraîne le classifieur sur deux dossiers d'exemples étiquetés et l'enregistre dans output_path.
+    cache_path : fichier de cache des profils (réutilisé d'un entraînement à l'autre).
+    Retourne le CardClassifier entraîné.
+    """
+    cache = load_profile_cache(cache_path)
+
+    X, y = [], []
+    for label, folder, name in (("old", folder_old, "ANCIEN"), ("new", folder_new, "NOUVEAU")):
+        files = _list_images(folder)[:limit]
+        if progress_callback: progress_callback(f"Profils du groupe {name} ({len(files)} images)...")
+        profiles = [p for p in collect_profiles(files, target_size, cache, workers) if p is not None]
+        if not profiles:
+            raise ValueError(f"Aucune image valide trouvée dans le dossier {name}.")
+        X.extend(extract_features(h, v, bins, n_peaks) for h, v in profiles)
+        y.extend([label] * len(profiles))
+
+    save_profile_cache(cache_path, cache)
+
+    X = np.vstack(X)
+    y = np.array(y)
+    n_min = min(np.sum(y == c) for c in CLASSES)
+    if n_min < 2:
+        raise ValueError("Au moins deux exemples par catégorie sont nécessaires.")
+
+    base = make_pipeline(StandardScaler(), LogisticRegression(C=1.0, max_iter=2000))
+    model = CalibratedClassifierCV(base, method="sigmoid", cv=min(5, n_min))
+
+    metrics = {"n_old": int(np.sum(y == "old")), "n_new": int(np.sum(y == "new"))}
+    if n_min >= 10:
+        # Validation croisée externe ; la calibration interne se contente de 3 plis
+        if progress_callback: progress_callback("Validation croisée (5 plis)...")
+        scores = cross_val_score(CalibratedClassifierCV(base, method="sigmoid", cv=3), X, y, cv=5)
+        metrics.update(accuracy_cv=float(scores.mean()), accuracy_cv_std=float(scores.std()))
+        if progress_callback:
+            progress_callback(f"Précision (validation croisée) : {scores.mean():.3f} ± {scores.std():.3f}")
+    elif progress_callback:
+        progress_callback("Trop peu d'exemples pour une validation croisée (10 par catégorie minimum).")
+
+    model.fit(X, y)
+    clf = CardClassifier(model, target_size, bins, n_peaks, metrics)
+    clf.save(output_path)
+    if progress_callback: progress_callback(f"Classifieur enregistré : {os.path.basename(output_path)}")
+    return clf
@@ -0,0 +1,224 @@
+"""
+Audit des dimensions et résolutions d'un dossier d'images, par lecture des seuls en-têtes.
+
+JPEG (SOF + JFIF/EXIF), PNG (IHDR + pHYs), TIFF (IFD0) et BMP sont décodés
+directement : seuls quelques centaines d'octets sont lus par fichier. Les
+autres formats passent par PIL s'il est disponible.
+"""
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+AUDIT_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp')
+
+# Marqueurs SOF porteurs des dimensions (hors DHT C4, JPG C8, DAC CC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _unit_to_dpi(x, y, unit):
+    # unit : 1 = pouce, 2 = centimètre (JFIF / TIFF décalé de 1)
+    if unit == 1: return x, y
+    if unit == 2: return x * 2.54, y * 2.54
+    return None, None
+
+
+# =============================================================================
+# TIFF (aussi utilisé pour le bloc EXIF des JPEG)
+# =============================================================================
+
+_TIFF_TYPES = {3: ("H", 2), 4: ("I", 4), 5: ("II", 8)}
+
+
+def _parse_tiff(data):
+    """Largeur, hauteur et DPI de l'IFD0 d'un flux TIFF (ou EXIF) en mémoire."""
+    if data[:2] == b"II": bo = "<"
+    elif data[:2] == b"MM": bo = ">"
+    else: raise ValueError("En-tête TIFF invalide")
+    if struct.unpack(bo + "H", data[2:4])[0] != 42:
+        raise ValueError("TIFF non standard (BigTIFF ?)")
+
+    ifd = struct.unpack(bo + "I", data[4:8])[0]
+    n = struct.unpack(bo + "H", data[ifd:ifd + 2])[0]
+    tags = {}
+    for i in range(n):
+        entry = data[ifd + 2 + 12 * i: ifd + 14 + 12 * i]
+        tag, typ, count = struct.unpack(bo + "HHI", entry[:8])
+        if tag not in (256, 257, 282, 283, 296) or typ not in _TIFF_TYPES or count != 1:
+            continue
+        fmt, size = _TIFF_TYPES[typ]
+        raw = entry[8:12] if size <= 4 else data[struct.unpack(bo + "I", entry[8:12])[0]:][:size]
+        vals = struct.unpack(bo + fmt, raw[:size])
+        tags[tag] = vals[0] / vals[1] if typ == 5 and vals[1] else vals[0]
+
+    dpi_x, dpi_y = None, None
+    if 282 in tags and 283 in tags:
+        dpi_x, dpi_y = _unit_to_dpi(tags[282], tags[283], tags.get(296, 2) - 1)
+    return tags.get(256), tags.get(257), dpi_x, dpi_y
+
+
+def _read_tiff(f):
+    # L'IFD0 est en général en tête de fichier ; sinon on relit le fichier entier
+    data = f.read(65536)
+    try:
+        w, h, dx, dy = _parse_tiff(data)
+    except (struct.error, IndexError):
+        f.seek(0)
+        w, h, dx, dy = _parse_tiff(f.read())
+    if w is None or h is None: raise ValueError("Dimensions TIFF absentes")
+    return w, h, dx, dy
+
+
+# =============================================================================
+# JPEG / PNG / BMP
+# =============================================================================
+
+def _read_jpeg(f):
+    f.read(2)
+    dpi = (None, None)
+    while True:
+        byte = f.read(1)
+        if not byte: raise ValueError("SOF introuvable")
+        if byte != b"\xff": continue
+        marker = f.read(1)
+        while marker == b"\xff":
+            marker = f.read(1)
+        m = marker[0] if marker else 0
+        if m in (0xD8, 0x01) or 0xD0 <= m <= 0xD7:
+            continue
+        if m in (0xD9, 0xDA):
+            raise ValueError("SOF introuvable")
+        length = struct.unpack(">H", f.read(2))[0]
+        if m in _JPEG_SOF:
+            h, w = struct.unpack(">xHH", f.read(5))
+            return w, h, dpi[0], dpi[1]
+        segment = f.read(length - 2)
+        if m == 0xE0 and segment[:5] == b"JFIF\x00" and dpi[0] is None:
+            unit, x, y = struct.unpack(">BHH", segment[7:12])
+            dpi = _unit_to_dpi(x, y, unit)
+        elif m == 0xE1 and segment[:6] == b"Exif\x00\x00" and dpi[0] is None:
+            try:
+                dpi = _parse_tiff(segment[6:])[2:]
+            except (ValueError, struct.error, IndexError):
+                pass
+
+
+def _read_png(f):
+    data = f.read(33)
+    w, h = struct.unpack(">II", data[16:24])
+    dpi = (None, None)
+    # Parcours des chunks jusqu'aux données image
+    while True:
+        head = f.read(8)
+        if len(head) < 8: break
+        length, ctype = struct.unpack(">I4s", head)
+        if ctype in (b"IDAT", b"IEND"): break
+        if ctype == b"pHYs":
+            x, y, unit = struct.unpack(">IIB", f.read(9))
+            if unit == 1: dpi = (x * 0.0254, y * 0.0254)
+            f.seek(4, os.SEEK_CUR)
+        else:
+            f.seek(length + 4, os.SEEK_CUR)
+    return w, h, dpi[0], dpi[1]
+
+
+def _read_bmp(f):
+    data = f.read(46)
+    w, h = struct.unpack("<ii", data[18:26])
+    dx, dy = struct.unpack("<ii", data[38:46]) if len(data) >= 46 else (0, 0)
+    dpi = (dx * 0.0254, dy * 0.0254) if dx and dy else (None, None)
+    return w, abs(h), dpi[0], dpi[1]
+
+
+_READERS = (
+    (b"\xff\xd8", "JPEG", _read_jpeg),
+    (b"\x89PNG\r\n\x1a\n", "PNG", _read_png),
+    (b"II*\x00", "TIFF", _read_tiff),
+    (b"MM\x00*", "TIFF", _read_tiff),
+    (b"BM", "BMP", _read_bmp),
+)
+
+
+def read_image_header(path):
+    """
+    Dimensions et résolution d'une image sans la décoder.
+    Retourne (format, largeur, hauteur, dpi_x, dpi_y) ; dpi à None si non renseigné.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(8)
+        for prefix, fmt, reader in _READERS:
+            if magic.startswith(prefix):
+                f.seek(0)
+                w, h, dx, dy = reader(f)
+                return fmt, w, h, dx, dy
+
+    if Image is None:
+        raise ValueError("Format non reconnu")
+    with Image.open(path) as img:
+        dpi = img.info.get("dpi", (None, None))
+        return img.format, img.size[0], img.size[1], dpi[0], dpi[1]
+
+
+# =============================================================================
+# AUDIT D'UN DOSSIER
+# =============================================================================
+
+def list_image_files(directory, recursive=False, extensions=AUDIT_EXTENSIONS):
+    """Chemins des images de directory (extension insensible à la casse), triés."""
+    files = []
+    stack = [directory]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive: stack.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in extensions:
+                    files.append(entry.path)
+    return sorted(files)
+
+
+def _audit_row(path, directory):
+    try:
+        fmt, w, h, dx, dy = read_image_header(path)
+    except Exception as e:
+        return None, f"{os.path.relpath(path, directory)}: {e}"
+    return {
+        "Fichier": os.path.relpath(path, directory),
+        "Format": fmt,
+        "Largeur": w,
+        "Hauteur": h,
+        "DPI X": round(dx, 1) if dx else None,
+        "DPI Y": round(dy, 1) if dy else None,
+        "Définition (Mpx)": round((w * h) / 1_000_000, 2),
+        "Ratio": round(w / h, 3) if h else None
+    }, None
+
+
+def scan_image_dimensions(directory, recursive=False, workers=None, progress_callback=None):
+    """
+    Lit les en-têtes de toutes les images de directory en parallèle (pool de threads).
+    Retourne (DataFrame une ligne par image lisible, liste des erreurs).
+    """
+    files = list_image_files(directory, recursive)
+    if progress_callback: progress_callback(f"{len(files)} images trouvées. Lecture des en-têtes...")
+
+    rows, errors = [], []
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as ex:
+        for i, (row, err) in enumerate(ex.map(lambda p: _audit_row(p, directory), files), 1):
+            if row: rows.append(row)
+            else: errors.append(err)
+            if progress_callback and i % 10000 == 0:
+                progress_callback(f"  {i}/{len(files)} en-têtes lus...")
+
+    return pd.DataFrame(rows), errors
+
+
+def summarize_dimensions(df):
+    """Nombre d'images par couple (Largeur, Hauteur)."""
+    return df.groupby(['Largeur', 'Hauteur']).size().reset_index(name='Nombre d\'images')
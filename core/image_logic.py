@@ -2,9 +2,13 @@ import cv2
 import numpy as np
 import json
 import os
+import csv
 import shutil
-import glob
-import matplotlib.pyplot as plt
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from matplotlib.figure import Figure
 
 # Tentative d'import de PyMuPDF pour l'extraction PDF
 try:
@@ -16,23 +20,112 @@ except ImportError:
 # OUTILS COMMUNS & TRI
 # =============================================================================
 
+REFPROF_EXTENSION = ".refprof"
+REFPROF_MAGIC = b"REFPROF\x00"
+REFPROF_VERSION = 1
+REFPROF_ALIGN = 16
+REFERENCE_KEYS = ("h_mean", "h_std", "v_mean", "v_std")
+
+def _read_refprof(path):
+    """
+    Lit un fichier .refprof : magic (8 octets), version et taille d'en-tête (uint32 LE),
+    en-tête JSON puis les profils en float32 alignés, projetés en mémoire (np.memmap).
+    """
+    with open(path, "rb") as f:
+        if f.read(len(REFPROF_MAGIC)) != REFPROF_MAGIC:
+            raise ValueError(f"{os.path.basename(path)} n'est pas un fichier de références .refprof.")
+        version, header_len = np.frombuffer(f.read(8), dtype="<u4")
+        if version > REFPROF_VERSION:
+            raise ValueError(f"Version de références non supportée : {version} (max {REFPROF_VERSION}).")
+        header = json.loads(f.read(int(header_len)).decode("utf-8"))
+
+    data = np.memmap(path, dtype="<f4", mode="r", offset=header["data_offset"],
+                     shape=(header["data_length"],))
+    classes = {}
+    for cls, entry in header["classes"].items():
+        classes[cls] = {"count": entry.get("count", 0)}
+        for key, (start, length) in entry["arrays"].items():
+            classes[cls][key] = data[start:start + length]
+    return {"target_size": header["target_size"], "classes": classes}
+
+def _write_refprof(path, export_data):
+    classes = [c for c in export_data if c != "target_size"]
+    header = {"target_size": list(export_data["target_size"]), "classes": {}}
+    chunks, cursor = [], 0
+    for cls in classes:
+        entry = {"count": int(export_data[cls].get("count", 0)), "arrays": {}}
+        for key in REFERENCE_KEYS:
+            if key not in export_data[cls]: continue
+            arr = np.asarray(export_data[cls][key], dtype="<f4").ravel()
+            entry["arrays"][key] = [cursor, int(arr.size)]
+            chunks.append(arr)
+            cursor += arr.size
+        header["classes"][cls] = entry
+    header["data_length"] = cursor
+
+    # L'offset des données dépend de la taille de l'en-tête, qui le contient : on itère jusqu'à stabilité
+    prefix = len(REFPROF_MAGIC) + 8
+    header["data_offset"] = 0
+    while True:
+        raw = json.dumps(header).encode("utf-8")
+        offset = -(-(prefix + len(raw)) // REFPROF_ALIGN) * REFPROF_ALIGN
+        if offset == header["data_offset"]: break
+        header["data_offset"] = offset
+    raw = raw.ljust(offset - prefix, b" ")
+
+    tmp_path = path + ".part"
+    with open(tmp_path, "wb") as f:
+        f.write(REFPROF_MAGIC)
+        f.write(np.array([REFPROF_VERSION, len(raw)], dtype="<u4").tobytes())
+        f.write(raw)
+        for arr in chunks:
+            f.write(arr.tobytes())
+    os.replace(tmp_path, path)
+
 def load_references(json_path):
-    with open(json_path, 'r') as f:
-        data = json.load(f)
-    
-    refs = {
-        "target_size": tuple(data["target_size"]),
-        "old": {
-            "h_mean": np.array(data["old"]["h_mean"]),
-            "v_mean": np.array(data["old"]["v_mean"])
-        },
-        "new": {
-            "h_mean": np.array(data["new"]["h_mean"]),
-            "v_mean": np.array(data["new"]["v_mean"])
-        }
-    }
+    """
+    Charge les profils de référence depuis un .refprof (projeté en mémoire), un .npz ou l'ancien JSON.
+    Renvoie {"target_size", "classes": [...], <classe>: {"h_mean", "v_mean", ...}}.
+    """
+    lower = json_path.lower()
+    if lower.endswith(REFPROF_EXTENSION):
+        data = _read_refprof(json_path)
+        target_size, classes = data["target_size"], data["classes"]
+    elif lower.endswith(".npz"):
+        with np.load(json_path) as npz:
+            target_size = npz["target_size"].tolist()
+            classes = {}
+            for cls in ("old", "new"):
+                classes[cls] = {key: npz[f"{cls}_{key}"] for key in REFERENCE_KEYS if f"{cls}_{key}" in npz}
+                if f"{cls}_count" in npz: classes[cls]["count"] = int(npz[f"{cls}_count"])
+    else:
+        with open(json_path, 'r') as f:
+            data = json.load(f)
+        target_size = data["target_size"]
+        classes = {cls: val for cls, val in data.items() if cls != "target_size"}
+
+    for cls in ("old", "new"):
+        if cls not in classes:
+            raise ValueError(f"Classe de référence manquante : '{cls}'.")
+
+    refs = {"target_size": tuple(target_size), "classes": list(classes)}
+    for cls, val in classes.items():
+        refs[cls] = {key: np.asarray(val[key]) for key in REFERENCE_KEYS if key in val}
+        refs[cls]["count"] = int(val.get("count", 0))
     return refs
 
+def compute_profiles(gray):
+    """Profils d'encre normalisés (lignes, colonnes) d'une image en niveaux de gris déjà redimensionnée."""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    
+    h_prof = np.sum(binary, axis=1)
+    v_prof = np.sum(binary, axis=0)
+    
+    if h_prof.max() > 0: h_prof = h_prof / h_prof.max()
+    if v_prof.max() > 0: v_prof = v_prof / v_prof.max()
+    
+    return h_prof, v_prof
+
 def get_image_profiles(img_path, target_size):
     try:
         img = cv2.imread(img_path)
@@ -40,44 +133,91 @@ def get_image_profiles(img_path, target_size):
 
         img = cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        
-        h_prof = np.sum(binary, axis=1)
-        v_prof = np.sum(binary, axis=0)
-        
-        if h_prof.max() > 0: h_prof = h_prof / h_prof.max()
-        if v_prof.max() > 0: v_prof = v_prof / v_prof.max()
-        
-        return h_prof, v_prof
+        return compute_profiles(gray)
     except Exception:
         return None, None
 
-def compare_profiles_robust(prof, ref_mean, max_shift=30):
-    best_corr = -1.0
+def _shifted_corr(prof, ref_mean, shift, min_overlap=0.8):
+    """Corrélation de prof avec ref_mean décalé de 'shift' échantillons (None si non calculable)."""
     n = len(prof)
-    for shift in range(-max_shift, max_shift + 1):
-        if shift < 0:
-            p_slice = prof[-shift:] 
-            r_slice = ref_mean[:shift]
-        elif shift > 0:
-            p_slice = prof[:-shift]
-            r_slice = ref_mean[shift:]
-        else:
-            p_slice = prof
-            r_slice = ref_mean
-        if len(p_slice) < n * 0.8: continue
-        try:
-            corr = np.corrcoef(p_slice, r_slice)[0, 1]
-            if not np.isnan(corr) and corr > best_corr:
-                best_corr = corr
-        except:
-            pass
+    if shift < 0:
+        p_slice = prof[-shift:]
+        r_slice = ref_mean[:shift]
+    elif shift > 0:
+        p_slice = prof[:-shift]
+        r_slice = ref_mean[shift:]
+    else:
+        p_slice = prof
+        r_slice = ref_mean
+    if len(p_slice) < n * min_overlap: return None
+    try:
+        corr = np.corrcoef(p_slice, r_slice)[0, 1]
+    except Exception:
+        return None
+    return None if np.isnan(corr) else corr
+
+def _decimate(prof, factor):
+    # Moyenne par blocs de 'factor' échantillons (le reste en fin de profil est ignoré)
+    n = len(prof) // factor * factor
+    return np.asarray(prof[:n], dtype=np.float64).reshape(-1, factor).mean(axis=1)
+
+def compare_profiles_robust(prof, ref_mean, max_shift=30, coarse_factor=1, n_candidates=2):
+    """
+    Meilleure corrélation entre prof et ref_mean pour des décalages de -max_shift à +max_shift.
+    coarse_factor > 1 : recherche grossière sur les profils décimés d'un facteur coarse_factor,
+    puis affinage en pleine résolution autour des n_candidates meilleurs décalages grossiers
+    (± coarse_factor échantillons) au lieu de parcourir les 2*max_shift+1 décalages.
+    """
+    if coarse_factor > 1:
+        coarse_prof, coarse_ref = _decimate(prof, coarse_factor), _decimate(ref_mean, coarse_factor)
+        coarse_max = max(1, max_shift // coarse_factor)
+        coarse = []
+        for shift in range(-coarse_max, coarse_max + 1):
+            corr = _shifted_corr(coarse_prof, coarse_ref, shift)
+            if corr is not None: coarse.append((corr, shift))
+        coarse.sort(reverse=True)
+        shifts = set()
+        for _, c_shift in coarse[:n_candidates]:
+            center = c_shift * coarse_factor
+            shifts.update(range(max(-max_shift, center - coarse_factor),
+                                min(max_shift, center + coarse_factor) + 1))
+        if not shifts: shifts = {0}
+    else:
+        shifts = range(-max_shift, max_shift + 1)
+
+    best_corr = -1.0
+    for shift in shifts:
+        corr = _shifted_corr(prof, ref_mean, shift)
+        if corr is not None and corr > best_corr:
+            best_corr = corr
     return max(0, best_corr)
 
+def classify_profiles(h_prof, v_prof, refs, confidence_threshold=0.05, coarse_factor=1):
+    """
+    Compare les profils aux deux gabarits.
+    coarse_factor : cf. compare_profiles_robust (1 = recherche exhaustive).
+    Retourne (categorie, score_ancien, score_nouveau) avec categorie dans old / new / unsure.
+    """
+    score_old_h = compare_profiles_robust(h_prof, refs["old"]["h_mean"], coarse_factor=coarse_factor)
+    score_old_v = compare_profiles_robust(v_prof, refs["old"]["v_mean"], coarse_factor=coarse_factor)
+    score_old = (score_old_h + score_old_v) / 2
+
+    score_new_h = compare_profiles_robust(h_prof, refs["new"]["h_mean"], coarse_factor=coarse_factor)
+    score_new_v = compare_profiles_robust(v_prof, refs["new"]["v_mean"], coarse_factor=coarse_factor)
+    score_new = (score_new_h + score_new_v) / 2
+    
+    diff = score_old - score_new
+    
+    if score_old > score_new and diff > confidence_threshold:
+        return "old", score_old, score_new
+    elif score_new > score_old and abs(diff) > confidence_threshold:
+        return "new", score_old, score_new
+    return "unsure", score_old, score_new
+
 def save_debug_plot(output_path, filename, h_prof, v_prof, refs):
-    # Désactiver l'affichage interactif
-    plt.ioff()
-    fig, (ax_h, ax_v) = plt.subplots(1, 2, figsize=(12, 6))
+    # Figure autonome (sans pyplot) : utilisable depuis un thread ou un processus
+    fig = Figure(figsize=(12, 6))
+    ax_h, ax_v = fig.subplots(1, 2)
     fig.suptitle(f"Analyse Incertitude : {filename}", fontsize=14)
 
     y_ax = np.arange(len(h_prof))
@@ -94,34 +234,165 @@ def save_debug_plot(output_path, filename, h_prof, v_prof, refs):
     ax_v.plot(x_ax, refs['new']['v_mean'], 'b--', label='Ref NOUVELLE', alpha=0.7)
     ax_v.set_title("Profil Horizontal (Colonnes)")
     
-    plt.tight_layout()
+    fig.tight_layout()
     try:
         fig.savefig(output_path)
     except:
         pass
-    plt.close(fig)
-
-def handle_verso_copy(filename, source_dir, dest_dir):
-    """Cherche et copie le fichier Verso associé"""
-    potential_names = []
-    potential_names.append(filename.replace("R", "V").replace("r", "v"))
-    if "R" in filename:
-        head, sep, tail = filename.rpartition("R")
-        potential_names.append(head + "V" + tail)
-    if "r" in filename:
-        head, sep, tail = filename.rpartition("r")
-        potential_names.append(head + "v" + tail)
-        
-    for v_name in potential_names:
-        if v_name == filename: continue
-        v_path = os.path.join(source_dir, v_name)
-        if os.path.exists(v_path):
-            try:
-                shutil.copy2(v_path, os.path.join(dest_dir, v_name))
-                return True
-            except:
-                pass
-    return False
+
+def _save_debug_plot_job(job):
+    # Point d'entrée picklable pour le pool de processus
+    save_debug_plot(*job)
+
+def _draw_profiles(panel, curves, vertical):
+    """Trace des profils normalisés [0, 1] dans un panneau OpenCV."""
+    h, w = panel.shape[:2]
+    m = 10
+    for prof, color, thickness in curves:
+        prof = np.clip(np.asarray(prof, dtype=np.float64), 0, 1)
+        n = len(prof)
+        if n < 2: continue
+        pos = np.arange(n) / (n - 1)
+        if vertical:
+            # Profil des lignes : index en ordonnée (haut -> bas), valeur en abscisse
+            xs = m + prof * (w - 2 * m)
+            ys = m + pos * (h - 2 * m)
+        else:
+            xs = m + pos * (w - 2 * m)
+            ys = h - m - prof * (h - 2 * m)
+        pts = np.stack([xs, ys], axis=1).round().astype(np.int32).reshape(-1, 1, 2)
+        cv2.polylines(panel, [pts], False, color, thickness, cv2.LINE_AA)
+
+def render_debug_raster(filename, h_prof, v_prof, refs, size=(1200, 600)):
+    """
+    Équivalent rapide de save_debug_plot dessiné directement avec OpenCV.
+    Noir = image, rouge = référence ANCIENNE, bleu = référence NOUVELLE.
+    """
+    w, h = size
+    title_h = max(20, h // 12)
+    img = np.full((h, w, 3), 255, dtype=np.uint8)
+    scale = h / 600
+    cv2.putText(img, filename, (10, int(title_h * 0.75)), cv2.FONT_HERSHEY_SIMPLEX,
+                max(0.4, 0.6 * scale), (0, 0, 0), 1, cv2.LINE_AA)
+
+    half = w // 2
+    panels = ((img[title_h:, :half], h_prof, "h_mean", True),
+              (img[title_h:, half:], v_prof, "v_mean", False))
+    thick = max(1, int(round(2 * scale)))
+    for panel, prof, key, vertical in panels:
+        cv2.rectangle(panel, (0, 0), (panel.shape[1] - 1, panel.shape[0] - 1), (200, 200, 200), 1)
+        _draw_profiles(panel, [
+            (refs['old'][key], (0, 0, 220), 1),
+            (refs['new'][key], (220, 0, 0), 1),
+            (prof, (0, 0, 0), thick)
+        ], vertical)
+    return img
+
+def save_debug_raster(output_path, filename, h_prof, v_prof, refs):
+    cv2.imwrite(output_path, render_debug_raster(filename, h_prof, v_prof, refs))
+
+def save_debug_montage(dest_dir, jobs, refs, per_page=40, cols=4, thumb_size=(400, 200)):
+    """Planches récapitulatives (DEBUG_MONTAGE_xxx.png) des cartes incertaines."""
+    paths = []
+    tw, th = thumb_size
+    for page, start in enumerate(range(0, len(jobs), per_page), start=1):
+        chunk = jobs[start:start + per_page]
+        rows = (len(chunk) + cols - 1) // cols
+        sheet = np.full((rows * th, cols * tw, 3), 255, dtype=np.uint8)
+        for i, (_, filename, h_prof, v_prof) in enumerate(chunk):
+            r, c = divmod(i, cols)
+            sheet[r * th:(r + 1) * th, c * tw:(c + 1) * tw] = render_debug_raster(
+                filename, h_prof, v_prof, refs, size=thumb_size)
+        out_path = os.path.join(dest_dir, f"DEBUG_MONTAGE_{page:03d}.png")
+        cv2.imwrite(out_path, sheet)
+        paths.append(out_path)
+    return paths
+
+DEBUG_PLOT_MODES = ("deferred", "raster", "montage", "none")
+
+def render_debug_plots(jobs, refs, mode="deferred", dest_dir=None, workers=None, progress_callback=None):
+    """
+    Rendu différé des graphiques de diagnostic, après la boucle de tri.
+    jobs : liste de (chemin_sortie, nom_fichier, h_prof, v_prof).
+    mode :
+      - deferred : figures matplotlib rendues par un pool de processus
+      - raster   : rendu OpenCV direct (beaucoup plus rapide)
+      - montage  : pas de fichier par carte, seulement des planches récapitulatives
+      - none     : aucun rendu
+    """
+    if not jobs or mode == "none":
+        return
+    if progress_callback: progress_callback(f"Rendu des diagnostics ({mode}) : {len(jobs)} carte(s)...")
+
+    if mode == "montage":
+        paths = save_debug_montage(dest_dir, jobs, refs)
+        if progress_callback: progress_callback(f"{len(paths)} planche(s) de diagnostic générée(s).")
+        return
+
+    if mode == "raster":
+        # cv2 libère le GIL : un pool de threads suffit
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as ex:
+            list(ex.map(lambda job: save_debug_raster(*job, refs), jobs))
+        return
+
+    full_jobs = [(path, filename, h_prof, v_prof, refs) for path, filename, h_prof, v_prof in jobs]
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            list(ex.map(_save_debug_plot_job, full_jobs, chunksize=8))
+    except Exception as e:
+        # Environnement sans multiprocessing (exécutable figé...) : rendu séquentiel
+        if progress_callback: progress_callback(f"Pool indisponible ({e}), rendu séquentiel.")
+        for job in full_jobs:
+            _save_debug_plot_job(job)
+
+# Modes de répartition des fichiers triés
+DISPATCH_MODES = ("copy", "hardlink", "reflink", "symlink", "move", "manifest")
+
+def _reflink(src_path, dst_path):
+    """Clone copy-on-write (ioctl FICLONE, Linux btrfs/XFS). Lève OSError si non supporté."""
+    import fcntl  # Absent sous Windows -> ImportError, repli copie
+    FICLONE = 0x40049409
+    try:
+        with open(src_path, "rb") as f_src, open(dst_path, "wb") as f_dst:
+            fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+    except OSError:
+        if os.path.exists(dst_path): os.remove(dst_path)
+        raise
+    shutil.copystat(src_path, dst_path)
+
+def dispatch_file(src_path, dest_dir, mode="copy"):
+    """
+    Place src_path dans dest_dir selon le mode choisi (voir DISPATCH_MODES).
+    Si le mode n'est pas possible (autre volume, système de fichiers sans
+    reflink, droits insuffisants pour les liens...), on revient à la copie.
+    Retourne le mode effectivement appliqué.
+    """
+    if mode == "manifest":
+        return mode
+
+    dst_path = os.path.join(dest_dir, os.path.basename(src_path))
+    # Nettoyage d'un résultat précédent (évite d'écrire à travers un ancien lien)
+    if os.path.lexists(dst_path):
+        os.remove(dst_path)
+
+    try:
+        if mode == "hardlink":
+            os.link(src_path, dst_path)
+            return mode
+        if mode == "symlink":
+            os.symlink(os.path.abspath(src_path), dst_path)
+            return mode
+        if mode == "reflink":
+            _reflink(src_path, dst_path)
+            return mode
+        if mode == "move":
+            shutil.move(src_path, dst_path)
+            return mode
+    except (OSError, ImportError, NotImplementedError):
+        pass
+
+    shutil.copy2(src_path, dst_path)
+    return "copy"
 
 # =============================================================================
 # OUTILS FUSION & CROP
@@ -159,8 +430,71 @@ def pad_to_width(img, target_width):
     right = delta - left
     return cv2.copyMakeBorder(img, 0, 0, left, right, cv2.BORDER_CONSTANT, value=[255, 255, 255])
 
-def find_verso_path(r_path):
-    directory, filename = os.path.split(r_path)
+class CanvasPool:
+    """
+    Réserve thread-safe de tampons uint8 réutilisés d'une paire à l'autre.
+    Un tampon libre est réutilisé si sa capacité couvre le besoin sans le
+    dépasser de plus de max_ratio (paires de tailles voisines).
+    """
+    def __init__(self, max_free=4, headroom=1.05, max_ratio=1.5):
+        self.max_free = max_free
+        self.headroom = headroom
+        self.max_ratio = max_ratio
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, shape):
+        needed = int(np.prod(shape))
+        buf = None
+        with self._lock:
+            best = None
+            for i, candidate in enumerate(self._free):
+                if needed <= candidate.size <= needed * self.max_ratio:
+                    if best is None or candidate.size < self._free[best].size:
+                        best = i
+            if best is not None:
+                buf = self._free.pop(best)
+        if buf is None:
+            # Marge pour absorber les variations de taille des paires suivantes
+            buf = np.empty(int(needed * self.headroom), dtype=np.uint8)
+        return buf[:needed].reshape(shape)
+
+    def release(self, canvas):
+        buf = canvas.base if canvas.base is not None else canvas
+        with self._lock:
+            if len(self._free) < self.max_free:
+                self._free.append(buf.reshape(-1))
+
+def compose_recto_verso(img_r, img_v, crop_verso=False, separator_height=30, pool=None):
+    """
+    Assemble recto / séparateur / verso directement dans un canevas préalloué
+    (équivalent de pad_to_width + np.full + cv2.vconcat, sans copies intermédiaires).
+    Seules les marges et le séparateur sont remplis en blanc.
+    """
+    # crop_content renvoie une vue : aucune copie du verso
+    part_v = crop_content(img_v) if crop_verso else img_v
+
+    h_r, w_r = img_r.shape[:2]
+    h_v, w_v = part_v.shape[:2]
+    width = max(w_r, w_v)
+    shape = (h_r + separator_height + h_v, width) + img_r.shape[2:]
+
+    canvas = pool.acquire(shape) if pool is not None else np.empty(shape, dtype=np.uint8)
+
+    def place(top, part):
+        h, w = part.shape[:2]
+        left = (width - w) // 2
+        canvas[top:top + h, :left] = 255
+        canvas[top:top + h, left + w:] = 255
+        canvas[top:top + h, left:left + w] = part
+
+    place(0, img_r)
+    canvas[h_r:h_r + separator_height] = 255
+    place(h_r + separator_height, part_v)
+    return canvas
+
+def _verso_candidates(filename):
+    """Noms de verso possibles pour un recto, par ordre de priorité."""
     name, ext = os.path.splitext(filename)
     candidates = []
     if "R" in name:
@@ -170,26 +504,137 @@ def find_verso_path(r_path):
         head, sep, tail = name.rpartition("r")
         candidates.append(head + "v" + tail + ext)
     candidates.append(filename.replace("R", "V").replace("r", "v"))
+    return [c for c in candidates if c != filename]
 
-    for c in candidates:
-        v_path = os.path.join(directory, c)
-        if os.path.exists(v_path) and v_path != r_path:
-            return v_path
-    return None
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.jp2')
+
+def build_pairing_index(source_dir, extensions=IMAGE_EXTENSIONS):
+    """
+    Construit en une seule lecture du dossier (os.scandir) l'index d'appariement
+    recto -> verso, sans sonder le disque fichier par fichier.
+    Retourne un dict :
+      - rectos : liste triée des rectos (appariés ou non)
+      - pairs : {nom_recto: nom_verso}
+      - orphan_rectos : rectos sans verso
+      - orphan_versos : images non-recto qu'aucun recto ne réclame
+    """
+    names = []
+    with os.scandir(source_dir) as it:
+        for entry in it:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in extensions:
+                names.append(entry.name)
+    names.sort()
+
+    existing = set(names)
+    # Repli insensible à la casse (partages Windows)
+    by_lower = {}
+    for n in names:
+        by_lower.setdefault(n.lower(), n)
+
+    candidates = [n for n in names if "R" in n.upper()]
+    pairs = {}
+    for r_name in candidates:
+        for c in _verso_candidates(r_name):
+            v_name = c if c in existing else by_lower.get(c.lower())
+            if v_name and v_name != r_name:
+                pairs[r_name] = v_name
+                break
+
+    # Un fichier réclamé comme verso n'est pas traité comme recto
+    claimed = set(pairs.values())
+    rectos = [n for n in candidates if n not in claimed]
+    pairs = {r: v for r, v in pairs.items() if r not in claimed}
+    claimed = set(pairs.values())
+    recto_set = set(rectos)
+
+    return {
+        "directory": source_dir,
+        "rectos": rectos,
+        "pairs": pairs,
+        "orphan_rectos": [r for r in rectos if r not in pairs],
+        "orphan_versos": [n for n in names if n not in claimed and n not in recto_set]
+    }
+
+def format_pairing_summary(index):
+    return (f"Appariement : {len(index['pairs'])} paires recto/verso, "
+            f"{len(index['orphan_rectos'])} recto(s) sans verso, "
+            f"{len(index['orphan_versos'])} verso(s) orphelin(s).")
 
 # =============================================================================
 # FONCTIONS PRINCIPALES (CALLABLES)
 # =============================================================================
 
-def run_sorting_logic(source_dir, json_path, progress_callback=None):
+MANIFEST_FIELDS = ["fichier", "role", "categorie", "destination", "mode", "score_ancien", "score_nouveau"]
+
+def _write_manifest(manifest_path, rows):
+    with open(manifest_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+SORTING_BACKENDS = ("profiles", "classifier")
+
+def load_sorting_backend(json_path, backend="profiles", classifier_path=None, proba_threshold=0.8,
+                         coarse_factor=1):
+    """
+    Prépare la méthode de classement des cartes.
+    backend : 'profiles' (corrélation aux gabarits, cf. classify_profiles) ou
+        'classifier' (modèle entraîné, cf. core.card_classifier).
+    Retourne (refs, target_size, classify_batch) où classify_batch([(h, v), ...])
+    renvoie [(categorie, score_ancien, score_nouveau), ...]. refs vaut None si
+    le classifieur est utilisé sans fichier de références (pas de diagnostics).
+    coarse_factor : recherche des décalages grossière puis fine (cf. compare_profiles_robust).
+    """
+    if backend not in SORTING_BACKENDS:
+        raise ValueError(f"Méthode de classement inconnue : {backend}")
+
+    refs = load_references(json_path) if json_path and os.path.exists(json_path) else None
+    if backend == "profiles":
+        if refs is None:
+            raise ValueError("Fichier de références introuvable.")
+        def classify_batch(profiles):
+            return [classify_profiles(h, v, refs, coarse_factor=coarse_factor) for h, v in profiles]
+        return refs, refs["target_size"], classify_batch
+
+    if not classifier_path or not os.path.exists(classifier_path):
+        raise ValueError("Fichier du classifieur introuvable.")
+    # Import tardif : scikit-learn n'est requis que pour ce mode
+    from core.card_classifier import load_card_classifier
+    clf = load_card_classifier(classifier_path)
+    if refs is not None and tuple(refs["target_size"]) != clf.target_size:
+        refs = None
+    return refs, clf.target_size, lambda profiles: clf.classify_batch(profiles, proba_threshold)
+
+SORT_BATCH_SIZE = 256
+
+def run_sorting_logic(source_dir, json_path, progress_callback=None, dispatch_mode="copy",
+                      debug_plots="deferred", backend="profiles", classifier_path=None,
+                      proba_threshold=0.8, workers=None, coarse_factor=1):
     """
     Exécute le tri (V3).
     progress_callback(msg) : fonction pour renvoyer des logs texte.
+    dispatch_mode : copy / hardlink / reflink / symlink / move / manifest
+        (cf. dispatch_file). Le manifeste TRI_MANIFEST.csv est écrit dans
+        tous les cas ; en mode 'manifest' aucun fichier n'est déplacé ni copié.
+    debug_plots : rendu des diagnostics des cartes incertaines, effectué
+        après le tri (cf. render_debug_plots).
+    backend / classifier_path / proba_threshold : méthode de classement
+        (cf. load_sorting_backend). Avec le classifieur, les scores du
+        manifeste sont les probabilités de chaque classe.
+    workers : threads de lecture des images (lues par lots de SORT_BATCH_SIZE).
+    coarse_factor : > 1 pour la recherche de décalage grossière puis fine
+        (cf. compare_profiles_robust et validate_coarse_matching).
     Retourne: un dictionnaire avec les chemins des dossiers créés.
     """
+    if dispatch_mode not in DISPATCH_MODES:
+        raise ValueError(f"Mode de répartition inconnu : {dispatch_mode}")
+    if debug_plots not in DEBUG_PLOT_MODES:
+        raise ValueError(f"Mode de diagnostic inconnu : {debug_plots}")
+
     if progress_callback: progress_callback("Chargement des références...")
-    refs = load_references(json_path)
-    target_size = refs["target_size"]
+    refs, target_size, classify_batch = load_sorting_backend(json_path, backend, classifier_path,
+                                                             proba_threshold, coarse_factor)
+    if refs is None: debug_plots = "none"
 
     dest_old = os.path.join(source_dir, "TRI_ANCIEN")
     dest_new = os.path.join(source_dir, "TRI_NOUVEAU")
@@ -198,125 +643,387 @@ def run_sorting_logic(source_dir, json_path, progress_callback=None):
     for d in [dest_old, dest_new, dest_unsure]:
         os.makedirs(d, exist_ok=True)
 
-    extensions = ['*.jpg', '*.jpeg', '*.png', '*.tif']
-    files = []
-    for ext in extensions:
-        files.extend(glob.glob(os.path.join(source_dir, ext)))
+    index = build_pairing_index(source_dir)
     
-    if progress_callback: progress_callback(f"{len(files)} fichiers trouvés. Début analyse...")
+    if progress_callback:
+        progress_callback(format_pairing_summary(index))
+        progress_callback(f"{len(index['rectos'])} rectos à analyser. Début analyse...")
 
     count_old, count_new, count_unsure = 0, 0, 0
+    manifest_rows = []
+    fallback_count = 0
+    debug_jobs = []
 
-    for f_path in files:
-        filename = os.path.basename(f_path)
-        if "R" not in filename.upper(): continue
-
-        h_prof, v_prof = get_image_profiles(f_path, target_size)
-        if h_prof is None: continue
+    def read_profiles(filename):
+        return filename, get_image_profiles(os.path.join(source_dir, filename), target_size)
 
-        score_old_h = compare_profiles_robust(h_prof, refs["old"]["h_mean"])
-        score_old_v = compare_profiles_robust(v_prof, refs["old"]["v_mean"])
-        score_old = (score_old_h + score_old_v) / 2
+    def classified():
+        # Lecture parallèle par lots, puis classement du lot en un appel
+        rectos = index["rectos"]
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as ex:
+            for start in range(0, len(rectos), SORT_BATCH_SIZE):
+                batch = [(name, prof) for name, prof in ex.map(read_profiles, rectos[start:start + SORT_BATCH_SIZE])
+                         if prof[0] is not None]
+                results = classify_batch([prof for _, prof in batch])
+                for (filename, (h_prof, v_prof)), result in zip(batch, results):
+                    yield filename, h_prof, v_prof, result
 
-        score_new_h = compare_profiles_robust(h_prof, refs["new"]["h_mean"])
-        score_new_v = compare_profiles_robust(v_prof, refs["new"]["v_mean"])
-        score_new = (score_new_h + score_new_v) / 2
-        
-        diff = score_old - score_new
-        confidence_threshold = 0.05 
-        
-        target_dest = None
-        
-        if score_old > score_new and diff > confidence_threshold:
+    for filename, h_prof, v_prof, (category, score_old, score_new) in classified():
+        if category == "old":
             target_dest = dest_old
             count_old += 1
             log_msg = f"-> ANCIEN ({filename})"
-        elif score_new > score_old and abs(diff) > confidence_threshold:
+        elif category == "new":
             target_dest = dest_new
             count_new += 1
             log_msg = f"-> NOUVEAU ({filename})"
         else:
             target_dest = dest_unsure
             debug_name = os.path.splitext(filename)[0] + "_DEBUG.png"
-            save_debug_plot(os.path.join(dest_unsure, debug_name), filename, h_prof, v_prof, refs)
+            debug_jobs.append((os.path.join(dest_unsure, debug_name), filename, h_prof, v_prof))
             count_unsure += 1
             log_msg = f"-> INCERTAIN ({filename})"
 
         if progress_callback: progress_callback(log_msg)
 
-        shutil.copy2(f_path, os.path.join(target_dest, filename))
-        handle_verso_copy(filename, source_dir, target_dest)
+        v_name = index["pairs"].get(filename)
+        for name, role in ((filename, "recto"), (v_name, "verso")):
+            if not name: continue
+            applied = dispatch_file(os.path.join(source_dir, name), target_dest, dispatch_mode)
+            if applied != dispatch_mode: fallback_count += 1
+            manifest_rows.append({
+                "fichier": name,
+                "role": role,
+                "categorie": category,
+                "destination": os.path.basename(target_dest),
+                "mode": applied,
+                "score_ancien": f"{score_old:.4f}",
+                "score_nouveau": f"{score_new:.4f}"
+            })
+
+    render_debug_plots(debug_jobs, refs, mode=debug_plots, dest_dir=dest_unsure,
+                       progress_callback=progress_callback)
+
+    manifest_path = os.path.join(source_dir, "TRI_MANIFEST.csv")
+    _write_manifest(manifest_path, manifest_rows)
 
     if progress_callback:
         progress_callback("--- Terminé ---")
+        if fallback_count:
+            progress_callback(f"Mode '{dispatch_mode}' indisponible pour {fallback_count} fichier(s) : copie utilisée.")
+        progress_callback(f"Manifeste : {os.path.basename(manifest_path)}")
         progress_callback(f"Anciennes: {count_old} | Nouvelles: {count_new} | Incertaines: {count_unsure}")
 
-    return {"old": dest_old, "new": dest_new, "unsure": dest_unsure}
+    return {"old": dest_old, "new": dest_new, "unsure": dest_unsure, "manifest": manifest_path}
 
-def run_fusion_logic(source_dir, crop_verso=False, progress_callback=None):
+def validate_coarse_matching(json_path, labeled_dirs, coarse_factor=4, limit=None, workers=None,
+                             progress_callback=None):
+    """
+    Vérifie sur des dossiers étiquetés que la recherche grossière puis fine
+    donne le même classement que la recherche exhaustive.
+    labeled_dirs : {"old": dossier, "new": dossier}.
+    Retourne {"count", "agree", "accuracy_full", "accuracy_coarse",
+    "time_full", "time_coarse", "speedup", "mismatches": [(fichier, exhaustif, grossier)]}.
+    """
+    refs = load_references(json_path)
+    target_size = refs["target_size"]
+
+    samples = []
+    for label, folder in labeled_dirs.items():
+        files = _list_images(folder)[:limit]
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as ex:
+            for f, (h_prof, v_prof) in zip(files, ex.map(lambda f: get_image_profiles(f, target_size), files)):
+                if h_prof is not None: samples.append((f, label, h_prof, v_prof))
+    if not samples:
+        raise ValueError("Aucune image valide trouvée dans les dossiers étiquetés.")
+    if progress_callback: progress_callback(f"Validation sur {len(samples)} images...")
+
+    results, timings = {}, {}
+    for name, factor in (("full", 1), ("coarse", coarse_factor)):
+        t0 = time.perf_counter()
+        results[name] = [classify_profiles(h, v, refs, coarse_factor=factor)[0] for _, _, h, v in samples]
+        timings[name] = time.perf_counter() - t0
+
+    labels = [label for _, label, _, _ in samples]
+    mismatches = [(os.path.basename(f), full, coarse)
+                  for (f, _, _, _), full, coarse in zip(samples, results["full"], results["coarse"])
+                  if full != coarse]
+    report = {
+        "count": len(samples),
+        "agree": len(samples) - len(mismatches),
+        "accuracy_full": float(np.mean([r == l for r, l in zip(results["full"], labels)])),
+        "accuracy_coarse": float(np.mean([r == l for r, l in zip(results["coarse"], labels)])),
+        "time_full": timings["full"],
+        "time_coarse": timings["coarse"],
+        "speedup": timings["full"] / timings["coarse"] if timings["coarse"] else float("inf"),
+        "mismatches": mismatches
+    }
+    if progress_callback:
+        progress_callback(f"Classements identiques : {report['agree']}/{report['count']} | "
+                          f"Précision exhaustive {report['accuracy_full']:.3f} / grossière {report['accuracy_coarse']:.3f}")
+        progress_callback(f"Temps : {report['time_full']:.2f}s -> {report['time_coarse']:.2f}s (x{report['speedup']:.1f})")
+        for name, full, coarse in mismatches:
+            progress_callback(f"  Différence : {name} ({full} -> {coarse})")
+    return report
+
+# Marqueur de fin de flux pour les files du pipeline de fusion
+_STOP = object()
+
+def _start_pipeline_stage(name, func, q_in, q_out, n_threads, timings, lock, error_callback=None):
+    """
+    Lance un étage du pipeline : n_threads consomment q_in, appliquent func
+    et poussent le résultat (si non None) dans q_out.
+    Le temps passé dans func est cumulé dans timings[name].
+    Une exception de func est signalée à error_callback(message) et l'élément
+    est abandonné : le thread continue de consommer q_in (sinon le producteur
+    resterait bloqué sur la file bornée).
+    """
+    def worker():
+        while True:
+            item = q_in.get()
+            if item is _STOP:
+                # On relaie l'arrêt aux autres threads du même étage
+                q_in.put(_STOP)
+                return
+            t0 = time.perf_counter()
+            try:
+                result = func(item)
+            except Exception as e:
+                result = None
+                if error_callback: error_callback(f"Erreur ({name}) : {e}")
+            elapsed = time.perf_counter() - t0
+            with lock:
+                timings[name] += elapsed
+            if result is not None and q_out is not None:
+                q_out.put(result)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, n_threads))]
+    for t in threads:
+        t.start()
+    return threads
+
+def _imwrite_params(out_path, jpeg_quality):
+    ext = os.path.splitext(out_path)[1].lower()
+    if ext in (".jpg", ".jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+    return []
+
+def run_fusion_logic(source_dir, crop_verso=False, progress_callback=None,
+                     jpeg_quality=95, n_readers=4, n_workers=2, n_writers=2,
+                     max_queue=8, stats_callback=None):
     """
     Exécute la fusion (Cropped/Full).
+    Pipeline producteur/consommateur à trois étages (lecture, calcul, écriture),
+    chacun servi par son pool de threads. Les files bornées (max_queue) limitent
+    le nombre d'images décodées en mémoire simultanément.
+    stats_callback(stats) : reçoit les temps cumulés par étage en fin de traitement.
     """
     suffix = "_CROPPED" if crop_verso else "_FULL"
     dest_dir = os.path.join(source_dir, f"FUSION{suffix}")
     os.makedirs(dest_dir, exist_ok=True)
 
-    extensions = ['*.jpg', '*.jpeg', '*.png', '*.tif']
-    files = []
-    for ext in extensions:
-        files.extend(glob.glob(os.path.join(source_dir, ext)))
+    index = build_pairing_index(source_dir)
 
-    if progress_callback: progress_callback(f"Fusion dans {os.path.basename(dest_dir)}...")
-    
-    count = 0
-    for r_path in files:
-        filename = os.path.basename(r_path)
-        if "R" not in filename.upper(): continue
-        
-        v_path = find_verso_path(r_path)
-        if not v_path: continue
+    if progress_callback:
+        progress_callback(format_pairing_summary(index))
+        progress_callback(f"Fusion dans {os.path.basename(dest_dir)}...")
 
+    lock = threading.Lock()
+    timings = {"lecture": 0.0, "calcul": 0.0, "ecriture": 0.0}
+    counters = {"written": 0}
+    pool = CanvasPool(max_free=max(2, n_writers + n_workers))
+
+    def decode(pair):
+        r_path, v_path = pair
         img_r = cv2.imread(r_path)
         img_v = cv2.imread(v_path)
-        if img_r is None or img_v is None: continue
+        if img_r is None or img_v is None: return None
+        return os.path.basename(r_path), img_r, img_v
 
-        # Recto toujours entier
-        part_r = img_r
-        
-        # Verso selon option
-        if crop_verso:
-            part_v = crop_content(img_v)
-        else:
-            part_v = img_v
-        
-        target_width = max(part_r.shape[1], part_v.shape[1])
-        final_r = pad_to_width(part_r, target_width)
-        final_v = pad_to_width(part_v, target_width)
-        
-        separator = np.full((30, target_width, 3), 255, dtype=np.uint8)
+    def compute(item):
+        filename, img_r, img_v = item
+        try:
+            # Recto toujours entier, verso découpé selon option
+            combined = compose_recto_verso(img_r, img_v, crop_verso=crop_verso, pool=pool)
+        except Exception as e:
+            if progress_callback: progress_callback(f"Erreur {filename}: {e}")
+            return None
+
+        out_name = filename.replace("R", "FINAL").replace("r", "FINAL")
+        if out_name == filename: out_name = os.path.splitext(filename)[0] + "_FINAL.jpg"
+        return filename, out_name, combined
 
+    def write(item):
+        filename, out_name, combined = item
+        out_path = os.path.join(dest_dir, out_name)
         try:
-            combined = cv2.vconcat([final_r, separator, final_v])
-            out_name = filename.replace("R", "FINAL").replace("r", "FINAL")
-            if out_name == filename: out_name = os.path.splitext(filename)[0] + "_FINAL.jpg"
-            cv2.imwrite(os.path.join(dest_dir, out_name), combined)
-            count += 1
-            if progress_callback: progress_callback(f"Fusionné: {out_name}")
+            ok = cv2.imwrite(out_path, combined, _imwrite_params(out_path, jpeg_quality))
         except Exception as e:
             if progress_callback: progress_callback(f"Erreur {filename}: {e}")
+            return None
+        finally:
+            pool.release(combined)
+        if not ok:
+            if progress_callback: progress_callback(f"Erreur {filename}: écriture impossible")
+            return None
+        with lock:
+            counters["written"] += 1
+        if progress_callback: progress_callback(f"Fusionné: {out_name}")
+        return None
+
+    q_decode = queue.Queue(maxsize=max_queue)
+    q_compute = queue.Queue(maxsize=max_queue)
+    q_write = queue.Queue(maxsize=max_queue)
+
+    t_start = time.perf_counter()
+    readers = _start_pipeline_stage("lecture", decode, q_decode, q_compute, n_readers, timings, lock,
+                                    progress_callback)
+    workers = _start_pipeline_stage("calcul", compute, q_compute, q_write, n_workers, timings, lock,
+                                    progress_callback)
+    writers = _start_pipeline_stage("ecriture", write, q_write, None, n_writers, timings, lock,
+                                    progress_callback)
+
+    # Producteur : paires issues de l'index
+    n_pairs = 0
+    for r_name, v_name in index["pairs"].items():
+        q_decode.put((os.path.join(source_dir, r_name), os.path.join(source_dir, v_name)))
+        n_pairs += 1
+
+    # Arrêt en cascade : chaque étage se termine avant de fermer le suivant
+    for stage_threads, q_in in ((readers, q_decode), (workers, q_compute), (writers, q_write)):
+        q_in.put(_STOP)
+        for t in stage_threads:
+            t.join()
+
+    stats = {
+        "pairs": n_pairs,
+        "written": counters["written"],
+        "wall": time.perf_counter() - t_start,
+        **timings
+    }
 
-    if progress_callback: progress_callback(f"Terminé. {count} images générées.")
+    if progress_callback: progress_callback(f"Terminé. {counters['written']} images générées.")
+    if stats_callback: stats_callback(stats)
     return dest_dir
 
 # =============================================================================
 # OUTILS PRÉPARATION (PDF & REFERENTIEL)
 # =============================================================================
 
-def extract_images_from_pdf(pdf_path, output_dir, dpi=200, progress_callback=None):
+# Extensions possibles d'une page extraite (rendu : .jpg ; passthrough : .jpg/.jp2/.png)
+PAGE_EXTENSIONS = (".jpg", ".jp2", ".png")
+
+def _page_output_path(output_dir, page_index, ext=".jpg"):
+    return os.path.join(output_dir, f"page_{page_index+1:03d}{ext}")
+
+def _page_already_extracted(output_dir, page_index):
+    for ext in PAGE_EXTENSIONS:
+        path = _page_output_path(output_dir, page_index, ext)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            return True
+    return False
+
+def _embedded_page_image(doc, page, min_coverage=0.95):
+    """
+    Si la page n'est qu'une image (scan) couvrant la page, retourne
+    (extension, octets) à écrire tels quels, sans rééchantillonnage :
+      - DCTDecode -> flux JPEG brut (.jpg)
+      - JPXDecode -> flux JPEG 2000 brut (.jp2)
+      - FlateDecode -> PNG sans perte (.png)
+    Retourne None pour les pages composites (plusieurs images, masque, rotation,
+    CMYK, filtres chaînés...) qui doivent être rendues.
+    """
+    if page.rotation:
+        return None
+    images = page.get_images(full=True)
+    if len(images) != 1:
+        return None
+    xref, smask, _, _, _, colorspace, _, _, filt = images[0][:9]
+    if smask or colorspace not in ("DeviceGray", "DeviceRGB", "ICCBased"):
+        return None
+
+    placements = page.get_image_rects(xref, transform=True)
+    if len(placements) != 1:
+        return None
+    rect, matrix = placements[0]
+    # Image posée droite (ni miroir ni rotation) et couvrant la page
+    if matrix.b or matrix.c or matrix.a <= 0 or matrix.d <= 0:
+        return None
+    if abs(rect & page.rect) < min_coverage * abs(page.rect):
+        return None
+
+    # Un seul filtre (les tableaux de filtres chaînés sont rendus)
+    if doc.xref_get_key(xref, "Filter")[0] != "name":
+        return None
+    if filt == "DCTDecode":
+        return ".jpg", doc.xref_stream_raw(xref)
+    if filt == "JPXDecode":
+        return ".jp2", doc.xref_stream_raw(xref)
+    if filt == "FlateDecode":
+        info = doc.extract_image(xref)
+        if info and info.get("ext") == "png":
+            return ".png", info["image"]
+    return None
+
+def _write_page_image(doc, page, output_dir, page_index, dpi, mode="render"):
+    """
+    Écrit une page en pleine résolution (image embarquée ou rendu à dpi).
+    Retourne (chemin, True si image embarquée copiée telle quelle).
+    """
+    embedded = _embedded_page_image(doc, page) if mode == "passthrough" else None
+
+    if embedded is not None:
+        ext, data = embedded
+        out_path = _page_output_path(output_dir, page_index, ext)
+        tmp_path = out_path + ".part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+    else:
+        # Rendu de la page en image (Pixmap)
+        pix = page.get_pixmap(dpi=dpi)
+        out_path = _page_output_path(output_dir, page_index)
+        # Écriture atomique : une page interrompue n'est jamais prise pour terminée
+        tmp_path = out_path + ".part"
+        pix.save(tmp_path, output="jpg")
+
+    os.replace(tmp_path, out_path)
+    return out_path, embedded is not None
+
+def _extract_page_range(pdf_path, output_dir, dpi, pages, resume, mode="render"):
+    """
+    Rend une plage de pages. Chaque appel ouvre son propre document,
+    ce qui permet de l'exécuter dans un processus séparé.
+    mode='passthrough' : écrit directement l'image embarquée des pages scannées.
+    Retourne (nb_ecrites, nb_ignorees, nb_passthrough).
     """
-    Extrait chaque page du PDF en image JPEG.
+    written, skipped, native = 0, 0, 0
+    doc = fitz.open(pdf_path)
+    try:
+        for i in pages:
+            if resume and _page_already_extracted(output_dir, i):
+                skipped += 1
+                continue
+
+            _, is_native = _write_page_image(doc, doc[i], output_dir, i, dpi, mode)
+            native += is_native
+            written += 1
+    finally:
+        doc.close()
+    return written, skipped, native
+
+def extract_images_from_pdf(pdf_path, output_dir, dpi=200, progress_callback=None,
+                            workers=1, resume=False, chunk_size=8, mode="render"):
+    """
+    Extrait chaque page du PDF en image JPEG (page_001.jpg, ...).
     Nécessite la librairie PyMuPDF (fitz).
+    workers > 1 : les pages sont réparties par paquets de chunk_size entre
+        plusieurs processus ; la progression reste rapportée dans l'ordre.
+    resume : les pages déjà présentes dans output_dir ne sont pas recalculées.
+    mode : 'render' (rendu à dpi) ou 'passthrough' (image embarquée écrite
+        telle quelle, à sa résolution native ; rendu seulement pour les pages composites).
     """
+    if mode not in ("render", "passthrough"):
+        raise ValueError(f"Mode d'extraction inconnu : {mode}")
     if fitz is None:
         raise ImportError("La librairie 'PyMuPDF' (fitz) est requise. Installez-la via 'pip install pymupdf'.")
 
@@ -324,87 +1031,245 @@ def extract_images_from_pdf(pdf_path, output_dir, dpi=200, progress_callback=Non
         os.makedirs(output_dir)
 
     try:
-        doc = fitz.open(pdf_path)
-        total = len(doc)
+        with fitz.open(pdf_path) as doc:
+            total = len(doc)
         if progress_callback: progress_callback(f"Ouverture PDF : {total} pages détectées.")
 
-        for i, page in enumerate(doc):
-            # Rendu de la page en image (Pixmap)
-            pix = page.get_pixmap(dpi=dpi)
-            
-            # Nom de fichier : page_001.jpg
-            out_name = f"page_{i+1:03d}.jpg"
-            out_path = os.path.join(output_dir, out_name)
-            
-            pix.save(out_path)
-            
-            if progress_callback and i % 5 == 0:
-                progress_callback(f"Extraction page {i+1}/{total}...")
-        
-        if progress_callback: progress_callback("Extraction terminée avec succès.")
+        chunks = [range(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+        args = [(pdf_path, output_dir, dpi, pages, resume, mode) for pages in chunks]
+
+        done, total_written, total_skipped, total_native = 0, 0, 0, 0
+        if workers > 1 and len(chunks) > 1:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_extract_page_range, *zip(*args))
+        else:
+            executor = None
+            results = (_extract_page_range(*a) for a in args)
+
+        try:
+            # map() restitue les résultats dans l'ordre des paquets
+            for pages, (written, skipped, native) in zip(chunks, results):
+                done += len(pages)
+                total_written += written
+                total_skipped += skipped
+                total_native += native
+                if progress_callback:
+                    progress_callback(f"Extraction page {done}/{total}...")
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        if progress_callback:
+            if total_skipped:
+                progress_callback(f"{total_skipped} page(s) déjà présente(s), ignorée(s).")
+            if mode == "passthrough":
+                progress_callback(f"{total_native} image(s) embarquée(s) copiée(s) sans ré-encodage, "
+                                  f"{total_written - total_native} page(s) rendue(s).")
+            progress_callback(f"Extraction terminée avec succès ({total_written} page(s) écrite(s)).")
         return True
 
     except Exception as e:
         if progress_callback: progress_callback(f"Erreur extraction : {e}")
         raise e
 
-def _compute_folder_stats(folder_path, target_size=(800, 1000), limit=50):
-    """Helper pour calculer les stats d'un dossier (Moyenne/Std des profils)"""
-    extensions = ['*.jpg', '*.jpeg', '*.png', '*.tif', '*.bmp']
-    files = []
-    for ext in extensions:
-        files.extend(glob.glob(os.path.join(folder_path, ext)))
-    
-    files = sorted(files)[:limit]
+def _render_page_gray(page, target_size):
+    """
+    Rend la page en niveaux de gris à la résolution juste suffisante pour
+    target_size (largeur, hauteur), puis la redimensionne à target_size.
+    """
+    tw, th = target_size
+    zoom = max(tw / page.rect.width, th / page.rect.height)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+    return cv2.resize(gray, target_size, interpolation=cv2.INTER_AREA)
+
+def run_pdf_sorting_logic(pdf_path, json_path, output_dir, keep=("old", "new", "unsure"),
+                          dpi=200, mode="passthrough", progress_callback=None,
+                          debug_plots="deferred", backend="profiles", classifier_path=None,
+                          proba_threshold=0.8, coarse_factor=1):
+    """
+    Tri direct depuis un PDF, sans passer par des JPEG intermédiaires.
+    Chaque page est rendue en mémoire en niveaux de gris à basse résolution
+    pour le calcul des profils ; seules les pages des catégories de 'keep'
+    sont écrites en pleine résolution (cf. extract_images_from_pdf pour dpi/mode)
+    dans output_dir/TRI_ANCIEN, TRI_NOUVEAU, TRI_INCERTAIN.
+    backend / classifier_path / proba_threshold / coarse_factor : cf. run_sorting_logic.
+    Retourne le même dictionnaire que run_sorting_logic.
+    """
+    if fitz is None:
+        raise ImportError("La librairie 'PyMuPDF' (fitz) est requise. Installez-la via 'pip install pymupdf'.")
+    if debug_plots not in DEBUG_PLOT_MODES:
+        raise ValueError(f"Mode de diagnostic inconnu : {debug_plots}")
+
+    if progress_callback: progress_callback("Chargement des références...")
+    refs, target_size, classify_batch = load_sorting_backend(json_path, backend, classifier_path,
+                                                             proba_threshold, coarse_factor)
+    if refs is None: debug_plots = "none"
+
+    dests = {
+        "old": os.path.join(output_dir, "TRI_ANCIEN"),
+        "new": os.path.join(output_dir, "TRI_NOUVEAU"),
+        "unsure": os.path.join(output_dir, "TRI_INCERTAIN")
+    }
+    for d in dests.values():
+        os.makedirs(d, exist_ok=True)
+
+    counts = {"old": 0, "new": 0, "unsure": 0}
+    labels = {"old": "ANCIEN", "new": "NOUVEAU", "unsure": "INCERTAIN"}
+    manifest_rows = []
+    debug_jobs = []
+
+    with fitz.open(pdf_path) as doc:
+        total = len(doc)
+        if progress_callback: progress_callback(f"Ouverture PDF : {total} pages détectées. Début analyse...")
+
+        for i, page in enumerate(doc):
+            try:
+                h_prof, v_prof = compute_profiles(_render_page_gray(page, target_size))
+            except Exception as e:
+                if progress_callback: progress_callback(f"Erreur page {i+1}: {e}")
+                continue
+
+            category, score_old, score_new = classify_batch([(h_prof, v_prof)])[0]
+            counts[category] += 1
+            target_dest = dests[category]
+
+            out_name, used_mode = "-", "ignoré"
+            if category in keep:
+                out_path, is_native = _write_page_image(doc, page, target_dest, i, dpi, mode)
+                # Mode réellement appliqué : repli sur le rendu si la page n'a pas d'image embarquée
+                used_mode = "passthrough" if is_native else "render"
+                out_name = os.path.basename(out_path)
+                if category == "unsure":
+                    debug_name = os.path.splitext(out_name)[0] + "_DEBUG.png"
+                    debug_jobs.append((os.path.join(target_dest, debug_name), out_name, h_prof, v_prof))
+
+            manifest_rows.append({
+                "fichier": out_name,
+                "role": f"page {i+1}",
+                "categorie": category,
+                "destination": os.path.basename(target_dest) if category in keep else "-",
+                "mode": used_mode,
+                "score_ancien": f"{score_old:.4f}",
+                "score_nouveau": f"{score_new:.4f}"
+            })
+
+            if progress_callback: progress_callback(f"-> {labels[category]} (page {i+1}/{total})")
+
+    render_debug_plots(debug_jobs, refs, mode=debug_plots, dest_dir=dests["unsure"],
+                       progress_callback=progress_callback)
+
+    manifest_path = os.path.join(output_dir, "TRI_MANIFEST.csv")
+    _write_manifest(manifest_path, manifest_rows)
+
+    if progress_callback:
+        progress_callback("--- Terminé ---")
+        progress_callback(f"Anciennes: {counts['old']} | Nouvelles: {counts['new']} | Incertaines: {counts['unsure']}")
+
+    return {**dests, "manifest": manifest_path}
+
+class RunningProfileStats:
+    """
+    Moyenne et variance en ligne (algorithme de Welford) de profils de
+    longueur fixe, dans des tableaux float64 préalloués : la mémoire ne
+    dépend pas du nombre d'images.
+    """
+    def __init__(self, length):
+        self.n = 0
+        self.mean = np.zeros(length, dtype=np.float64)
+        self.m2 = np.zeros(length, dtype=np.float64)
+        self._delta = np.empty(length, dtype=np.float64)
+        self._delta2 = np.empty(length, dtype=np.float64)
+
+    def update(self, x):
+        self.n += 1
+        np.subtract(x, self.mean, out=self._delta)
+        self.mean += self._delta / self.n
+        np.subtract(x, self.mean, out=self._delta2)
+        self.m2 += self._delta * self._delta2
+
+    def std(self):
+        # Écart-type de population (équivalent np.std, ddof=0)
+        return np.sqrt(self.m2 / self.n) if self.n else np.zeros_like(self.m2)
+
+REFERENCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.bmp', '.jp2')
+
+def _list_images(folder_path, extensions=REFERENCE_EXTENSIONS):
+    with os.scandir(folder_path) as it:
+        return sorted(e.path for e in it
+                      if e.is_file() and os.path.splitext(e.name)[1].lower() in extensions)
+
+def _compute_folder_stats(folder_path, target_size=(800, 1000), limit=None, workers=None,
+                          chunk_size=64, progress_callback=None):
+    """
+    Helper pour calculer les stats d'un dossier (Moyenne/Std des profils).
+    Les images sont lues en parallèle par paquets de chunk_size et agrégées
+    au fil de l'eau : aucun profil n'est conservé.
+    limit : nombre maximum d'images (None = toutes).
+    """
+    files = _list_images(folder_path)[:limit]
     if not files: return None
 
-    h_profiles = []
-    v_profiles = []
-    
-    for f_path in files:
-        try:
-            img = cv2.imread(f_path)
-            if img is None: continue
-            
-            # Normalisation stricte
-            img = cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
-            
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-            
-            h_prof = np.sum(binary, axis=1)
-            v_prof = np.sum(binary, axis=0)
-            
-            if h_prof.max() > 0: h_prof = h_prof / h_prof.max()
-            if v_prof.max() > 0: v_prof = v_prof / v_prof.max()
-            
-            h_profiles.append(h_prof)
-            v_profiles.append(v_prof)
-        except:
-            pass
-            
-    if not h_profiles: return None
+    w, h = target_size
+    stats_h = RunningProfileStats(h)
+    stats_v = RunningProfileStats(w)
+
+    # cv2 libère le GIL pendant le décodage : un pool de threads suffit
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as ex:
+        for start in range(0, len(files), chunk_size):
+            chunk = files[start:start + chunk_size]
+            for h_prof, v_prof in ex.map(lambda f: get_image_profiles(f, target_size), chunk):
+                if h_prof is None: continue
+                stats_h.update(h_prof)
+                stats_v.update(v_prof)
+            if progress_callback:
+                progress_callback(f"  {min(start + chunk_size, len(files))}/{len(files)} images...")
+
+    if stats_h.n == 0: return None
     
     return {
-        'h_mean': np.mean(h_profiles, axis=0).tolist(),
-        'h_std': np.std(h_profiles, axis=0).tolist(),
-        'v_mean': np.mean(v_profiles, axis=0).tolist(),
-        'v_std': np.std(v_profiles, axis=0).tolist()
+        'count': stats_h.n,
+        'h_mean': stats_h.mean.tolist(),
+        'h_std': stats_h.std().tolist(),
+        'v_mean': stats_v.mean.tolist(),
+        'v_std': stats_v.std().tolist()
     }
 
-def generate_reference_profile(folder_old, folder_new, output_json, progress_callback=None):
+def save_references(output_path, export_data):
+    """Écrit les références en JSON, en .npz ou au format binaire .refprof selon l'extension de output_path."""
+    lower = output_path.lower()
+    if lower.endswith(REFPROF_EXTENSION):
+        _write_refprof(output_path, export_data)
+    elif lower.endswith(".npz"):
+        arrays = {"target_size": np.array(export_data["target_size"])}
+        for cls in ("old", "new"):
+            for key in REFERENCE_KEYS:
+                arrays[f"{cls}_{key}"] = np.asarray(export_data[cls][key], dtype=np.float64)
+            arrays[f"{cls}_count"] = np.array(export_data[cls].get("count", 0))
+        np.savez_compressed(output_path, **arrays)
+    else:
+        with open(output_path, "w") as f:
+            json.dump(export_data, f)
+
+def generate_reference_profile(folder_old, folder_new, output_json, progress_callback=None,
+                               limit=None, workers=None):
     """
-    Crée le fichier JSON de référence à partir de deux dossiers d'exemples.
+    Crée le fichier de référence (JSON, .npz ou .refprof) à partir de deux dossiers d'exemples.
     """
     target_size = (800, 1000)
     
     if progress_callback: progress_callback("Analyse du groupe ANCIEN...")
-    stats_old = _compute_folder_stats(folder_old, target_size)
+    stats_old = _compute_folder_stats(folder_old, target_size, limit=limit, workers=workers,
+                                      progress_callback=progress_callback)
     if not stats_old: raise ValueError("Aucune image valide trouvée dans le dossier ANCIEN.")
 
     if progress_callback: progress_callback("Analyse du groupe NOUVEAU...")
-    stats_new = _compute_folder_stats(folder_new, target_size)
+    stats_new = _compute_folder_stats(folder_new, target_size, limit=limit, workers=workers,
+                                      progress_callback=progress_callback)
     if not stats_new: raise ValueError("Aucune image valide trouvée dans le dossier NOUVEAU.")
+
+    if progress_callback:
+        progress_callback(f"Images retenues : {stats_old['count']} ANCIEN / {stats_new['count']} NOUVEAU.")
     
     export_data = {
         "target_size": target_size,
@@ -413,7 +1278,6 @@ def generate_reference_profile(folder_old, folder_new, output_json, progress_cal
     }
     
     if progress_callback: progress_callback(f"Sauvegarde dans {os.path.basename(output_json)}...")
-    with open(output_json, "w") as f:
-        json.dump(export_data, f)
+    save_references(output_json, export_data)
         
     return True
@@ -0,0 +1,193 @@
+"""
+Métamodèle Random Forest multi-sorties : une seule forêt pour toutes les réponses.
+
+Au lieu d'entraîner une forêt par réponse dans chaque module (importances,
+Sobol, SHAP, optimisation), la forêt est ajustée une fois sur la matrice
+des réponses Y (n_points, n_réponses). Chaque module en extrait la sortie
+qui le concerne : prédictions, importances par réponse, vue mono-réponse.
+
+Les réponses sont centrées-réduites avant l'ajustement (sinon la réponse de
+plus grande échelle décide de toutes les coupures) ; les prédictions sont
+ramenées à l'échelle d'origine.
+"""
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+# Une réponse qui perdrait plus de cette fraction de ses lignes complètes à
+# cause des valeurs manquantes des autres réponses a sa propre forêt
+MAX_ROWS_LOST = 0.1
+
+
+def _tree_output_importances(tree, n_features):
+    """
+    Importances MDI par sortie d'un arbre de régression multi-sorties.
+    La baisse d'erreur quadratique d'une coupure, pour une sortie, vaut
+    w_g*(m_g - m)^2 + w_d*(m_d - m)^2 (moyennes des noeuds dans tree_.value,
+    poids dans weighted_n_node_samples) : pas besoin des données d'entraînement.
+    Retourne un tableau (n_features, n_sorties), colonnes normalisées à 1.
+    """
+    t = tree.tree_
+    values = t.value[:, :, 0]
+    weights = t.weighted_n_node_samples
+    nodes = np.where(t.children_left != -1)[0]
+    left, right = t.children_left[nodes], t.children_right[nodes]
+
+    decrease = (weights[left, None] * (values[left] - values[nodes]) ** 2 +
+                weights[right, None] * (values[right] - values[nodes]) ** 2)
+    importances = np.zeros((n_features, values.shape[1]))
+    np.add.at(importances, t.feature[nodes], decrease)
+    importances /= weights[0]
+
+    total = importances.sum(axis=0)
+    return np.divide(importances, total, out=np.zeros_like(importances), where=total > 0)
+
+
+def _forest_output_importances(model, n_features, n_outputs):
+    # Moyenne sur les arbres puis normalisation, comme feature_importances_ de sklearn
+    per_tree = [_tree_output_importances(t, n_features) for t in model.estimators_ if t.tree_.node_count > 1]
+    importances = np.mean(per_tree, axis=0) if per_tree else np.zeros((n_features, n_outputs))
+    total = importances.sum(axis=0)
+    return np.divide(importances, total, out=np.zeros_like(importances), where=total > 0)
+
+
+def _columns(Y):
+    # Une forêt (ou un arbre) à une seule sortie prédit un vecteur 1D
+    Y = np.asarray(Y)
+    return Y.reshape(len(Y), -1)
+
+
+class _OutputGroup:
+    """Forêt ajustée sur un groupe de réponses centrées-réduites."""
+
+    def __init__(self, model, responses, mean, scale, n_rows):
+        self.model = model
+        self.responses = list(responses)
+        self.mean = mean
+        self.scale = scale
+        self.n_rows = n_rows
+        self.importances = _forest_output_importances(model, model.n_features_in_, len(responses))
+
+    def predict(self, X):
+        return _columns(self.model.predict(X)) * self.scale + self.mean
+
+
+class _ResponseTree:
+    """Arbre multi-sorties restreint à une sortie, à l'échelle d'origine (interface predict des arbres sklearn)."""
+
+    def __init__(self, tree, index, mean, scale):
+        self.tree = tree
+        self.index = index
+        self.mean = mean
+        self.scale = scale
+
+    def predict(self, X, check_input=True):
+        return _columns(self.tree.predict(X, check_input=check_input))[:, self.index] * self.scale + self.mean
+
+
+class ResponseForest:
+    """
+    Vue mono-réponse d'un MultiOutputSurrogate : predict et estimators_
+    comme une RandomForestRegressor, utilisable par forest_predict_stats,
+    search_optimum, refine_all_zones...
+    """
+
+    def __init__(self, group, response):
+        self.response = response
+        self.index = group.responses.index(response)
+        self.model = group.model
+        self.mean = group.mean[self.index]
+        self.scale = group.scale[self.index]
+        self.estimators_ = [_ResponseTree(t, self.index, self.mean, self.scale) for t in group.model.estimators_]
+        self.feature_importances_ = group.importances[:, self.index]
+
+    def predict(self, X):
+        return _columns(self.model.predict(X))[:, self.index] * self.scale + self.mean
+
+
+class MultiOutputSurrogate:
+    """
+    Forêt multi-sorties ajustée une fois sur les réponses sélectionnées.
+    Les réponses dont les valeurs manquantes ne coïncident pas avec celles des
+    autres sont servies par leur propre forêt (cf. fit_multi_surrogate) :
+    chaque réponse est apprise sur toutes ses lignes renseignées.
+    """
+
+    def __init__(self, params, responses, groups):
+        self.params = list(params)
+        self.responses = list(responses)
+        self.groups = groups
+        self._group_of = {r: g for g in groups for r in g.responses}
+
+    def check_params(self, params):
+        if list(params) != self.params:
+            raise ValueError("Le métamodèle partagé a été entraîné sur d'autres paramètres.")
+
+    def output_model(self, response):
+        """
+        (forêt, indice de sortie, moyenne, écart-type) de response : la forêt
+        prédit la réponse centrée-réduite (valeur = sortie * écart-type + moyenne).
+        """
+        g = self._group_of[response]
+        i = g.responses.index(response)
+        return g.model, i, g.mean[i], g.scale[i]
+
+    def predict(self, X, response=None):
+        """Prédictions (n, n_réponses) à l'échelle d'origine, ou la seule colonne de response."""
+        if response is not None:
+            return self.for_response(response).predict(X)
+        Y = np.hstack([g.predict(X) for g in self.groups])
+        order = [r for g in self.groups for r in g.responses]
+        return Y[:, [order.index(r) for r in self.responses]]
+
+    def feature_importances(self, response):
+        """Importances MDI {param: valeur} pour une réponse."""
+        g = self._group_of[response]
+        return dict(zip(self.params, g.importances[:, g.responses.index(response)]))
+
+    def for_response(self, response):
+        return ResponseForest(self._group_of[response], response)
+
+
+def _fit_group(data, params, responses, n_estimators, random_state, rf_kwargs):
+    Y = data[responses].values.astype(float)
+    mean = Y.mean(axis=0)
+    scale = Y.std(axis=0)
+    scale[scale == 0] = 1.0
+    Y = (Y - mean) / scale
+
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state, **rf_kwargs)
+    model.fit(data[params].values, Y[:, 0] if Y.shape[1] == 1 else Y)
+    return _OutputGroup(model, responses, mean, scale, len(data))
+
+
+def fit_multi_surrogate(df, params, responses, n_estimators=200, random_state=42, **rf_kwargs):
+    """
+    Ajuste une RandomForestRegressor multi-sorties sur les réponses centrées-réduites.
+
+    La forêt commune est apprise sur les lignes complètes (paramètres et
+    toutes ses réponses). Une réponse qui y perdrait plus de MAX_ROWS_LOST de
+    ses propres lignes renseignées est ajustée à part, sur ces lignes.
+    """
+    params, responses = list(params), list(responses)
+    data = df[params + responses].dropna(subset=params)
+    rf_kwargs.setdefault("n_jobs", -1)
+
+    available = {r: int(data[r].notna().sum()) for r in responses}
+    empty = [r for r, n in available.items() if n == 0]
+    if empty:
+        raise ValueError(f"Aucune valeur renseignée pour : {', '.join(empty)}.")
+
+    # Les réponses les plus lacunaires sortent du groupe commun tant qu'elles
+    # font perdre trop de lignes aux autres
+    shared = sorted(responses, key=lambda r: available[r], reverse=True)
+    while len(shared) > 1:
+        n_common = len(data[shared].dropna())
+        if all(n_common >= (1 - MAX_ROWS_LOST) * available[r] for r in shared): break
+        shared.pop()
+    separate = [r for r in responses if r not in shared]
+
+    groups = [_fit_group(data.dropna(subset=shared), params, [r for r in responses if r in shared],
+                         n_estimators, random_state, rf_kwargs)]
+    for r in separate:
+        groups.append(_fit_group(data.dropna(subset=[r]), params, [r], n_estimators, random_state, rf_kwargs))
+    return MultiOutputSurrogate(params, responses, groups)
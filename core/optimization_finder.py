@@ -1,12 +1,30 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import numpy as np
 import pandas as pd
+from scipy.stats import qmc
 from sklearn.tree import DecisionTreeRegressor, _tree
 from sklearn.ensemble import RandomForestRegressor
 
+try:
+    import optuna
+    OPTUNA_AVAILABLE = True
+except ImportError:
+    OPTUNA_AVAILABLE = False
+
+# Méthodes de recherche de l'optimum sur le métamodèle
+SEARCH_METHODS = ("random", "lhs", "tpe", "cmaes")
+
+# Critères maximisés : moyenne du forêt, borne haute (exploratoire) ou basse (prudente)
+ACQUISITIONS = ("mean", "ucb", "lcb")
+
 def find_optimal_zones(df, params, response, top_k=4, max_depth=4, min_samples_leaf=0.05):
     """
     Identifie les zones (feuilles d'un arbre de décision) où la réponse est maximisée.
+    Les lignes sans réponse (ex. essais ajoutés par la boucle active) sont ignorées.
     """
+    df = df.dropna(subset=list(params) + [response])
     X = df[params].values
     y = df[response].values
 
@@ -63,26 +81,24 @@ def find_optimal_zones(df, params, response, top_k=4, max_depth=4, min_samples_l
     sorted_zones = sorted(tree_rules, key=lambda x: x['mean'], reverse=True)
     return sorted_zones[:top_k]
 
-def refine_optimal_point(df, params, response, zone_bounds, expansion_pct=0.1, n_iter=5000):
+def fit_surrogate(df, params, response, n_estimators=200, random_state=42):
     """
-    Cherche le point optimal à l'intérieur (ou proche) d'une zone donnée via un métamodèle.
-    
-    Args:
-        df: Données d'entraînement.
-        params: Liste des paramètres.
-        response: Colonne réponse.
-        zone_bounds: Dict {param: (min, max)} définissant la zone.
-        expansion_pct: Pourcentage d'élargissement des bornes (ex: 0.1 pour 10%).
-        n_iter: Nombre de points simulés.
+    Entraîne le métamodèle (Random Forest) sur tout l'espace.
+    (On utilise un RF plus profond que l'arbre de décision pour la finesse)
+    Les lignes sans réponse sont ignorées.
     """
-    # 1. Entraîner un métamodèle robuste sur tout l'espace
-    # (On utilise un RF plus profond que l'arbre de décision pour la finesse)
+    df = df.dropna(subset=list(params) + [response])
     X = df[params].values
     y = df[response].values
-    rf = RandomForestRegressor(n_estimators=200, random_state=42)
+    rf = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state, n_jobs=-1)
     rf.fit(X, y)
-    
-    # 2. Définir les bornes de recherche
+    return rf
+
+def compute_search_bounds(df, params, zone_bounds, expansion_pct=0.1):
+    """
+    Bornes [(min, max), ...] de recherche pour chaque paramètre : la zone
+    élargie de expansion_pct, limitée aux bornes observées dans df.
+    """
     search_bounds = []
     for p in params:
         # Bornes globales absolues (physiques)
@@ -106,21 +122,253 @@ def refine_optimal_point(df, params, response, zone_bounds, expansion_pct=0.1, n
         target_max = min(global_max, z_max + span * expansion_pct)
         
         search_bounds.append((target_min, target_max))
-        
-    # 3. Génération aléatoire (Uniforme) dans l'hypercube étendu
-    # Shape: (n_iter, n_params)
-    random_samples = np.random.uniform(
-        low=[b[0] for b in search_bounds],
-        high=[b[1] for b in search_bounds],
-        size=(n_iter, len(params))
-    )
-    
-    # 4. Prédiction
-    preds = rf.predict(random_samples)
+    return search_bounds
+
+def forest_predict_stats(model, X):
+    """
+    Moyenne et écart-type des prédictions des arbres d'une forêt pour le lot X.
+    Les prédictions des arbres sont empilées dans un tableau (n_arbres, n_points)
+    calculé en parallèle (les arbres libèrent le GIL), sans revalider X à chaque
+    arbre. Pour un modèle sans arbres, l'écart-type est nul.
+    """
+    estimators = getattr(model, "estimators_", None)
+    if estimators is None:
+        mean = np.asarray(model.predict(X), dtype=float)
+        return mean, np.zeros_like(mean)
+
+    X32 = np.ascontiguousarray(X, dtype=np.float32)
+    stacked = np.empty((len(estimators), len(X32)))
+
+    def predict_tree(i):
+        stacked[i] = estimators[i].predict(X32, check_input=False)
+
+    with ThreadPoolExecutor(max_workers=min(len(estimators), os.cpu_count() or 1)) as ex:
+        list(ex.map(predict_tree, range(len(estimators))))
+    return stacked.mean(axis=0), stacked.std(axis=0)
+
+def acquisition_scores(mean, std, acquisition="mean", kappa=1.0):
+    """Score maximisé par la recherche : mean, mean + kappa*std (ucb) ou mean - kappa*std (lcb)."""
+    if acquisition == "ucb": return mean + kappa * std
+    if acquisition == "lcb": return mean - kappa * std
+    return mean
+
+def _scale(unit, low, high):
+    # Hypercube unité -> bornes (tolère low == high, contrairement à qmc.scale)
+    return low + unit * (high - low)
+
+class _SamplingProposer:
+    """
+    Propositions par lots sans modèle :
+    - random : uniforme dans tout le domaine (comportement historique)
+    - lhs    : hypercube latin, recentré sur le meilleur point et resserré à chaque lot
+    """
+    def __init__(self, bounds, method, rng, shrink=0.7):
+        self.low = np.array([b[0] for b in bounds], dtype=float)
+        self.high = np.array([b[1] for b in bounds], dtype=float)
+        self.method = method
+        self.rng = rng
+        self.shrink = shrink
+        self.box = (self.low.copy(), self.high.copy())
+        self.lhs = qmc.LatinHypercube(d=len(bounds), seed=rng)
+
+    def ask(self, n):
+        if self.method == "random":
+            return self.rng.uniform(self.low, self.high, size=(n, len(self.low)))
+        return _scale(self.lhs.random(n), *self.box)
+
+    def tell(self, X, scores, best_x):
+        if self.method != "lhs": return
+        half = (self.box[1] - self.box[0]) * self.shrink / 2
+        low = np.clip(best_x - half, self.low, self.high)
+        high = np.clip(best_x + half, self.low, self.high)
+        self.box = (low, high)
+
+class _OptunaProposer:
+    """Propositions par lots via l'interface ask/tell d'optuna (TPE ou CMA-ES)."""
+    def __init__(self, bounds, method, seed):
+        if not OPTUNA_AVAILABLE:
+            raise ImportError("La librairie optuna est requise. Veuillez l'installer avec : pip install optuna")
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        if method == "tpe":
+            sampler = optuna.samplers.TPESampler(seed=seed, n_startup_trials=20)
+        else:
+            try:
+                import cmaes  # noqa: F401  (dépendance de CmaEsSampler)
+            except ImportError:
+                raise ImportError("CMA-ES requiert la librairie cmaes : pip install cmaes")
+            sampler = optuna.samplers.CmaEsSampler(seed=seed)
+        self.study = optuna.create_study(direction="maximize", sampler=sampler)
+        self.names = [f"x{i}" for i in range(len(bounds))]
+        self.distributions = {n: optuna.distributions.FloatDistribution(float(lo), float(hi))
+                              for n, (lo, hi) in zip(self.names, bounds)}
+        self.pending = []
+
+    def ask(self, n):
+        self.pending = [self.study.ask(self.distributions) for _ in range(n)]
+        return np.array([[t.params[k] for k in self.names] for t in self.pending])
+
+    def tell(self, X, scores, best_x):
+        for trial, score in zip(self.pending, scores):
+            self.study.tell(trial, float(score))
+        self.pending = []
+
+def search_optimum(model, bounds, params, method="lhs", n_iter=5000, batch_size=None,
+                   tol=1e-4, patience=3, random_state=None, return_info=False,
+                   acquisition="mean", kappa=1.0):
+    """
+    Cherche le maximum du critère d'acquisition du métamodèle dans l'hypercube 'bounds'.
+
+    Les points sont proposés par lots (batch_size) puis évalués en une seule
+    prédiction vectorisée. La recherche s'arrête après n_iter évaluations ou
+    lorsque le meilleur score n'a pas progressé de plus de tol (relatif)
+    pendant 'patience' lots consécutifs.
+
+    Args:
+        method: 'random', 'lhs', 'tpe' ou 'cmaes' (ces deux derniers via optuna).
+        batch_size: taille des lots (défaut : n_iter/10 pour random/lhs, 50 pour optuna).
+        acquisition / kappa: critère maximisé (cf. acquisition_scores) ; 'lcb'
+            évite les points extrapolés où les arbres divergent.
+        return_info: si vrai, renvoie aussi {'method', 'acquisition', 'std', 'score',
+            'n_evals', 'converged', 'trace'} où std est l'écart-type entre arbres au
+            meilleur point et trace liste (évaluations cumulées, meilleur score,
+            meilleur score du lot).
+
+    Returns:
+        (best_val, best_coords) ou (best_val, best_coords, info), best_val étant
+        la prédiction moyenne au meilleur point.
+    """
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"Méthode de recherche inconnue : {method}")
+    if acquisition not in ACQUISITIONS:
+        raise ValueError(f"Critère d'acquisition inconnu : {acquisition}")
+
+    rng = np.random.default_rng(random_state)
+    if method in ("random", "lhs"):
+        proposer = _SamplingProposer(bounds, method, rng)
+        batch_size = batch_size or max(1, n_iter // 10)
+    else:
+        proposer = _OptunaProposer(bounds, method, random_state)
+        batch_size = batch_size or 50
+
+    best_score, best_x = -np.inf, None
+    best_val, best_std = None, None
+    n_evals, stall, converged = 0, 0, False
+    trace = []
+    while n_evals < n_iter:
+        X = proposer.ask(min(batch_size, n_iter - n_evals))
+        mean, std = forest_predict_stats(model, X)
+        scores = acquisition_scores(mean, std, acquisition, kappa)
+        n_evals += len(X)
+
+        idx = int(np.argmax(scores))
+        if best_x is None:
+            improved = True
+        else:
+            improved = scores[idx] > best_score + tol * max(abs(best_score), 1e-12)
+        if scores[idx] > best_score:
+            best_score, best_x = float(scores[idx]), X[idx].copy()
+            best_val, best_std = float(mean[idx]), float(std[idx])
+        proposer.tell(X, scores, best_x)
+        trace.append((n_evals, best_score, float(scores[idx])))
+
+        stall = 0 if improved else stall + 1
+        if stall >= patience:
+            converged = True
+            break
+
+    best_coords = dict(zip(params, best_x))
+    if return_info:
+        return best_val, best_coords, {"method": method, "acquisition": acquisition,
+                                       "std": best_std, "score": best_score, "n_evals": n_evals,
+                                       "converged": converged, "trace": trace}
+    return best_val, best_coords
+
+def refine_optimal_point(df, params, response, zone_bounds, expansion_pct=0.1, n_iter=5000,
+                         method="lhs", model=None, return_info=False, **search_kwargs):
+    """
+    Cherche le point optimal à l'intérieur (ou proche) d'une zone donnée via un métamodèle.
     
-    # 5. Trouver le max
-    idx_max = np.argmax(preds)
-    best_val = preds[idx_max]
-    best_coords = dict(zip(params, random_samples[idx_max]))
+    Args:
+        df: Données d'entraînement.
+        params: Liste des paramètres.
+        response: Colonne réponse.
+        zone_bounds: Dict {param: (min, max)} définissant la zone.
+        expansion_pct: Pourcentage d'élargissement des bornes (ex: 0.1 pour 10%).
+        n_iter: Nombre maximal de points simulés.
+        method: Méthode de recherche (cf. search_optimum).
+        model: Métamodèle déjà entraîné (sinon fit_surrogate).
+        return_info: Renvoie aussi la trace de convergence (cf. search_optimum).
+    """
+    # 1. Entraîner un métamodèle robuste sur tout l'espace
+    if model is None:
+        model = fit_surrogate(df, params, response)
     
-    return best_val, best_coords
\ No newline at end of file
+    # 2. Définir les bornes de recherche
+    search_bounds = compute_search_bounds(df, params, zone_bounds, expansion_pct)
+        
+    # 3. Recherche par lots sur le métamodèle
+    return search_optimum(model, search_bounds, params, method=method, n_iter=n_iter,
+                          return_info=return_info, **search_kwargs)
+
+# Métamodèle partagé par les processus de refine_all_zones (cf. _init_zone_worker)
+_WORKER_MODEL = None
+
+def _init_zone_worker(model):
+    # Le métamodèle n'est transmis qu'une fois par processus, pas à chaque zone
+    global _WORKER_MODEL
+    _WORKER_MODEL = model
+
+def _refine_zone_job(args):
+    bounds, params, search_kwargs = args
+    return search_optimum(_WORKER_MODEL, bounds, params, return_info=True, **search_kwargs)
+
+def refine_all_zones(df, params, response, zones, expansion_pct=0.1, n_iter=5000, method="lhs",
+                     acquisition="mean", kappa=1.0, model=None, workers=None, random_state=42):
+    """
+    Affine toutes les zones de find_optimal_zones avec un unique métamodèle,
+    les recherches étant réparties sur un pool de processus.
+
+    Returns:
+        Liste (dans l'ordre des zones) de dicts {'zone', 'zone_mean', 'best_val', 'std',
+        'coords', 'n_evals', 'converged', 'dist_ref'} où dist_ref est la distance
+        euclidienne, dans l'espace normalisé [0, 1] des paramètres, entre l'optimum
+        de la zone et celui de la zone #1.
+    """
+    if not zones: return []
+    if model is None:
+        model = fit_surrogate(df, params, response)
+
+    jobs = []
+    for i, zone in enumerate(zones):
+        bounds = compute_search_bounds(df, params, zone['bounds'], expansion_pct)
+        kwargs = {"method": method, "n_iter": n_iter, "acquisition": acquisition, "kappa": kappa,
+                  "random_state": None if random_state is None else random_state + i}
+        jobs.append((bounds, params, kwargs))
+
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_zone_worker,
+                             initargs=(model,)) as ex:
+        outcomes = list(ex.map(_refine_zone_job, jobs))
+
+    # Normalisation par les bornes globales pour la distance à la zone #1
+    g_min = df[params].min().values.astype(float)
+    g_span = (df[params].max().values - g_min).astype(float)
+    g_span[g_span == 0] = 1.0
+
+    def norm(coords):
+        return (np.array([coords[p] for p in params], dtype=float) - g_min) / g_span
+
+    ref = norm(outcomes[0][1])
+    results = []
+    for i, (zone, (best_val, coords, info)) in enumerate(zip(zones, outcomes)):
+        results.append({
+            'zone': i + 1,
+            'zone_mean': zone['mean'],
+            'best_val': best_val,
+            'std': info['std'],
+            'coords': coords,
+            'n_evals': info['n_evals'],
+            'converged': info['converged'],
+            'dist_ref': float(np.linalg.norm(norm(coords) - ref))
+        })
+    return results
@@ -0,0 +1,322 @@
+"""
+Rendu de jeux de paramètres OCR via ocr_quality_audit.pipeline_complet.
+
+Un lot applique plusieurs jeux de paramètres (centres de zones, optimum,
+point sélectionné...) à une liste d'images : chaque image n'est décodée
+qu'une fois par processus, pour tous les jeux, et chaque sortie est écrite
+et consignée dès qu'elle est prête.
+"""
+import csv
+import datetime
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+RENDER_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+# Paramètres attendus par pipeline_complet et valeurs par défaut
+OCR_PARAM_DEFAULTS = {
+    'line_h_size': 20,
+    'line_v_size': 20,
+    'dilate_iter': 1,
+    'norm_kernel': 79,       # Doit être impair
+    'denoise_h': 10.0,
+    'noise_threshold': 200,  # Souvent int pour seuil pixel
+    'bin_block_size': 11,    # Impair
+    'bin_c': 2.0
+}
+
+_FLOAT_PARAMS = ('denoise_h', 'bin_c')
+
+
+def normalize_ocr_params(params):
+    """
+    Paramètres d'un point de l'espace (noms de colonnes, flottants) ->
+    dictionnaire typé pour pipeline_complet, avec corrections de parité
+    (OpenCV exige des noyaux impairs) et tailles minimales.
+    """
+    ocr_params = {}
+    for name, default in OCR_PARAM_DEFAULTS.items():
+        value = params.get(name, default)
+        ocr_params[name] = float(value) if name in _FLOAT_PARAMS else int(value)
+
+    if ocr_params['norm_kernel'] % 2 == 0: ocr_params['norm_kernel'] += 1
+    if ocr_params['bin_block_size'] % 2 == 0: ocr_params['bin_block_size'] += 1
+    if ocr_params['line_h_size'] < 1: ocr_params['line_h_size'] = 1
+    if ocr_params['line_v_size'] < 1: ocr_params['line_v_size'] = 1
+    return ocr_params
+
+
+def scale_ocr_params(ocr_params, scale):
+    """
+    Paramètres normalisés adaptés à une image réduite d'un facteur scale :
+    les tailles de noyaux (en pixels) sont mises à l'échelle en restant
+    impaires quand OpenCV l'exige. Les autres paramètres sont inchangés.
+    """
+    scaled = dict(ocr_params)
+    for name in ('line_h_size', 'line_v_size'):
+        scaled[name] = max(1, int(round(ocr_params[name] * scale)))
+    for name, minimum in (('norm_kernel', 1), ('bin_block_size', 3)):
+        value = max(minimum, int(round(ocr_params[name] * scale)))
+        scaled[name] = value if value % 2 else value + 1
+    return scaled
+
+
+def zone_center(df, params, zone_bounds):
+    """Centre d'une zone (bornes infinies remplacées par les bornes globales de df)."""
+    center = {}
+    for col in params:
+        local_min, local_max = zone_bounds.get(col, (-np.inf, np.inf))
+        if local_min == -np.inf: local_min = df[col].min()
+        if local_max == np.inf: local_max = df[col].max()
+        center[col] = (local_min + local_max) / 2.0
+    return center
+
+
+def list_render_images(folder):
+    """Chemins des images de folder (extension insensible à la casse), triés."""
+    with os.scandir(folder) as it:
+        return sorted(e.path for e in it
+                      if e.is_file() and os.path.splitext(e.name)[1].lower() in RENDER_EXTENSIONS)
+
+
+# =============================================================================
+# CACHE DE PRÉVISUALISATION
+# =============================================================================
+
+class RenderCache:
+    """
+    Cache LRU des images sources décodées et des sorties de pipeline_complet,
+    borné en mémoire (somme des nbytes des tableaux).
+
+    Les sources sont indexées par (chemin, mtime, taille) : une image modifiée
+    sur disque est relue. Les sorties sont indexées par la source et les
+    paramètres normalisés : deux points qui ne diffèrent qu'avant les
+    corrections de parité/arrondi partagent le même rendu.
+    Les tableaux renvoyés sont partagés avec le cache (lecture seule) ;
+    pipeline_complet reçoit toujours une copie de la source.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _source_key(img_path):
+        st = os.stat(img_path)
+        return ("source", os.path.abspath(img_path), st.st_mtime_ns, st.st_size)
+
+    def _get(self, key):
+        with self._lock:
+            arr = self._entries.get(key)
+            if arr is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return arr
+
+    def _put(self, key, arr):
+        with self._lock:
+            if key in self._entries or arr.nbytes > self.max_bytes:
+                return
+            self._entries[key] = arr
+            self.nbytes += arr.nbytes
+            while self.nbytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.nbytes -= old.nbytes
+
+    def load(self, img_path):
+        """Image source en niveaux de gris (décodée une seule fois tant qu'elle reste en cache)."""
+        key = self._source_key(img_path)
+        img = self._get(key)
+        if img is None:
+            img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                raise ValueError(f"Impossible de lire {os.path.basename(img_path)}")
+            img.flags.writeable = False
+            self._put(key, img)
+        return img
+
+    def render(self, img_path, params):
+        """
+        (source, sortie de pipeline_complet) pour img_path et un point de
+        l'espace (noms de colonnes) ; normalisé par normalize_ocr_params.
+        """
+        import ocr_quality_audit
+
+        img = self.load(img_path)
+        ocr_params = normalize_ocr_params(params)
+        key = ("rendu",) + self._source_key(img_path)[1:] + (tuple(sorted(ocr_params.items())),)
+        processed = self._get(key)
+        if processed is None:
+            # Copie : la source mise en cache est en lecture seule et pipeline_complet
+            # peut travailler sur place
+            processed = ocr_quality_audit.pipeline_complet(img.copy(), ocr_params)
+            processed.flags.writeable = False
+            self._put(key, processed)
+        return img, processed
+
+    def is_rendered(self, img_path, params):
+        """Vrai si la sortie pleine résolution est déjà en cache."""
+        key = ("rendu",) + self._source_key(img_path)[1:] + (tuple(sorted(normalize_ocr_params(params).items())),)
+        with self._lock:
+            return key in self._entries
+
+    def render_preview(self, img_path, params, max_side=1000):
+        """
+        Aperçu rapide : la source est réduite pour que son plus grand côté
+        fasse au plus max_side pixels et les noyaux sont mis à l'échelle
+        (scale_ocr_params). Retourne (source réduite, sortie, facteur).
+        """
+        import ocr_quality_audit
+
+        img = self.load(img_path)
+        scale = min(1.0, max_side / max(img.shape[:2]))
+        if scale >= 1.0:
+            return self.render(img_path, params) + (1.0,)
+
+        src_key = self._source_key(img_path)[1:]
+        small_key = ("apercu_source",) + src_key + (max_side,)
+        small = self._get(small_key)
+        if small is None:
+            size = (max(1, int(round(img.shape[1] * scale))), max(1, int(round(img.shape[0] * scale))))
+            small = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+            small.flags.writeable = False
+            self._put(small_key, small)
+
+        ocr_params = scale_ocr_params(normalize_ocr_params(params), scale)
+        key = ("apercu",) + src_key + (max_side, tuple(sorted(ocr_params.items())))
+        processed = self._get(key)
+        if processed is None:
+            processed = ocr_quality_audit.pipeline_complet(small.copy(), ocr_params)
+            processed.flags.writeable = False
+            self._put(key, processed)
+        return small, processed, scale
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+# =============================================================================
+# JOURNAL CSV
+# =============================================================================
+
+def append_render_log(log_path, rows):
+    """
+    Ajoute des lignes (dicts) au journal CSV. Si de nouvelles colonnes
+    apparaissent, le fichier est réécrit avec l'union des en-têtes.
+    """
+    if not rows: return
+    new_fields = []
+    for row in rows:
+        new_fields.extend(k for k in row if k not in new_fields)
+
+    existing_fields, existing_rows = [], []
+    if os.path.exists(log_path) and os.path.getsize(log_path) > 0:
+        with open(log_path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            existing_fields = list(reader.fieldnames or [])
+            if not set(new_fields) <= set(existing_fields):
+                existing_rows = list(reader)
+
+    if existing_fields and set(new_fields) <= set(existing_fields):
+        with open(log_path, "a", newline="", encoding="utf-8") as f:
+            csv.DictWriter(f, fieldnames=existing_fields, restval="").writerows(rows)
+        return
+
+    fields = existing_fields + [k for k in new_fields if k not in existing_fields]
+    tmp_path = log_path + ".part"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, restval="")
+        writer.writeheader()
+        writer.writerows(existing_rows)
+        writer.writerows(rows)
+    os.replace(tmp_path, log_path)
+
+
+def render_log_row(image_name, source, label, params, date=None):
+    """Ligne de journal : image de sortie, image source, jeu, date puis paramètres (noms de colonnes)."""
+    row = {"Image": image_name, "Source": source, "Jeu": label,
+           "Date": date or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    row.update({k: v for k, v in params.items()})
+    return row
+
+
+# =============================================================================
+# RENDU PAR LOT
+# =============================================================================
+
+def _render_image_job(args):
+    img_path, param_sets, output_dir, date = args
+    import ocr_quality_audit
+
+    img_name = os.path.basename(img_path)
+    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return img_name, [], f"Impossible de lire {img_name}"
+
+    base = os.path.splitext(img_name)[0]
+    rows = []
+    for label, raw_params in param_sets:
+        # Copie par jeu : pipeline_complet peut travailler sur place
+        result = ocr_quality_audit.pipeline_complet(img.copy(), normalize_ocr_params(raw_params))
+        out_name = f"{base}_{label}.png"
+        cv2.imwrite(os.path.join(output_dir, out_name), result)
+        rows.append(render_log_row(out_name, img_name, label, raw_params, date))
+    return img_name, rows, None
+
+
+def run_batch_render(image_paths, param_sets, output_dir, log_path=None, workers=None,
+                     progress_callback=None):
+    """
+    Applique chaque jeu de paramètres à chaque image, sur un pool de processus.
+
+    Args:
+        image_paths: images sources (lues en niveaux de gris).
+        param_sets: liste de (libellé, paramètres) ; les paramètres sont ceux de
+            l'espace analysé (noms de colonnes), normalisés par normalize_ocr_params.
+            Sortie : <image>_<libellé>.png dans output_dir.
+        log_path: journal CSV (défaut : output_dir/render_history_log.csv),
+            alimenté au fil des images terminées.
+        progress_callback(done, total, message).
+
+    Returns:
+        (nombre d'images écrites, liste des erreurs).
+    """
+    if not param_sets:
+        raise ValueError("Aucun jeu de paramètres à appliquer.")
+    os.makedirs(output_dir, exist_ok=True)
+    log_path = log_path or os.path.join(output_dir, "render_history_log.csv")
+    date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    param_sets = [(label, dict(params)) for label, params in param_sets]
+    jobs = [(path, param_sets, output_dir, date) for path in image_paths]
+
+    written, errors = 0, []
+    workers = workers or min(len(jobs), os.cpu_count() or 1) or 1
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = {ex.submit(_render_image_job, job): os.path.basename(job[0]) for job in jobs}
+        for done, fut in enumerate(as_completed(futures), 1):
+            try:
+                img_name, rows, error = fut.result()
+            except Exception as e:
+                img_name, rows, error = futures[fut], [], f"{futures[fut]} : {e}"
+            if error:
+                errors.append(error)
+            append_render_log(log_path, rows)
+            written += len(rows)
+            if progress_callback:
+                progress_callback(done, len(jobs), error or f"{img_name} : {len(rows)} rendu(s)")
+
+    return written, errors
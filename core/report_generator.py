@@ -1,5 +1,10 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+
 from core.pca import compute_pca
 from core.rf_importance import compute_rf_importances
 from core.boosting_importance import compute_gb_importances
@@ -7,66 +12,64 @@ from core.correlation_analysis import compute_correlations
 from core.combined_importance import combine_importances
 
 
-def generate_markdown_report(
-    path,
-    df,
-    param_cols,
-    response_col,
-    title="Rapport d'analyse de screening"
-):
+# Éléments d'un lot de résultats et fonction de calcul associée
+REPORT_PIECES = {
+    "pca": lambda df, params, response: compute_pca(df, params),
+    "rf": compute_rf_importances,
+    "gb": compute_gb_importances,
+    "corr": compute_correlations,
+}
+
+
+def fill_from_surrogate(results, df, param_cols, response_col, surrogate):
     """
-    Génère un rapport Markdown complet et l'enregistre dans 'path'.
-    - df : DataFrame complet
-    - param_cols : liste des paramètres utilisés
-    - response_col : nom de la réponse principale
+    Importances RF d'un lot lues sur le métamodèle multi-réponses partagé
+    (cf. core.multi_surrogate) au lieu d'ajuster une forêt, s'il couvre ces
+    paramètres et cette réponse.
     """
+    if (surrogate is not None and results.get("rf") is None
+            and surrogate.params == list(param_cols) and response_col in surrogate.responses):
+        results["rf"] = compute_rf_importances(df, param_cols, response_col, surrogate=surrogate)
+    return results
 
-    path = Path(path)
 
-    # ------------------------
-    # Infos de base
-    # ------------------------
-    n_points = len(df)
-    n_params = len(param_cols)
+def compute_report_results(df, param_cols, response_col, results=None, workers=None, surrogate=None):
+    """
+    Complète un lot de résultats pour le rapport :
+    - "pca" : retour de compute_pca (df_pca, variance expliquée, modèle)
+    - "rf" / "gb" : importances {param: valeur}
+    - "corr" : (corr_pearson, corr_spearman)
+    - "combined" : importance combinée
+    Seuls les éléments absents de results sont calculés, en parallèle (pool
+    de threads : les ajustements sklearn libèrent le GIL). results est
+    complété sur place et retourné.
+    surrogate : métamodèle multi-réponses fournissant les importances RF.
+    """
+    results = fill_from_surrogate({} if results is None else results, df, param_cols, response_col, surrogate)
+    missing = [k for k in REPORT_PIECES if results.get(k) is None]
 
-    # ------------------------
-    # PCA
-    # ------------------------
-    df_pca, explained, pca_model = compute_pca(df, param_cols)
-    loadings = pca_model.components_
+    if missing:
+        with ThreadPoolExecutor(max_workers=workers or min(len(missing), os.cpu_count() or 1)) as ex:
+            futures = {k: ex.submit(REPORT_PIECES[k], df, param_cols, response_col) for k in missing}
+            for k, fut in futures.items():
+                results[k] = fut.result()
 
-    # ------------------------
-    # Importances RF / GB / Corr / Combinée
-    # ------------------------
-    imp_rf = compute_rf_importances(df, param_cols, response_col)
-    imp_gb = compute_gb_importances(df, param_cols, response_col)
-    corr_p, corr_s = compute_correlations(df, param_cols, response_col)
-    imp_combined = combine_importances(imp_rf, imp_gb, corr_p)
+    if results.get("combined") is None:
+        results["combined"] = combine_importances(results["rf"], results["gb"], results["corr"][0])
+    return results
 
+
+def _sorted_items(d):
     # Tri pour affichage
-    def sorted_dict(d):
-        return sorted(d.items(), key=lambda x: x[1], reverse=True)
+    return sorted(d.items(), key=lambda x: x[1], reverse=True)
 
-    rf_sorted = sorted_dict(imp_rf)
-    gb_sorted = sorted_dict(imp_gb)
-    comb_sorted = sorted_dict(imp_combined)
 
-    # ------------------------
-    # Construction du Markdown
-    # ------------------------
-    lines = []
-
-    lines.append(f"# {title}\n")
-    lines.append("## 1. Résumé général\n")
-    lines.append(f"- Nombre de points : **{n_points}**")
-    lines.append(f"- Nombre de paramètres : **{n_params}**")
-    lines.append(f"- Paramètres analysés : `{', '.join(param_cols)}`")
-    lines.append(f"- Réponse principale : `{response_col}`\n")
+def _pca_lines(lines, results, param_cols, num):
+    """Section PCA (variance expliquée + loadings PC1/PC2)."""
+    df_pca, explained, pca_model = results["pca"]
+    loadings = pca_model.components_
 
-    # ------------------------
-    # PCA
-    # ------------------------
-    lines.append("## 2. Analyse PCA\n")
+    lines.append(f"## {num}. Analyse PCA\n")
 
     lines.append(f"- PC1 explique **{explained[0]*100:.1f}%** de la variance.")
     if len(explained) > 1:
@@ -74,7 +77,7 @@ def generate_markdown_report(
     else:
         lines.append("")
 
-    lines.append("### 2.1 Loadings des composantes principales\n")
+    lines.append(f"### {num}.1 Loadings des composantes principales\n")
 
     # PC1
     lines.append(f"**PC1 ({explained[0]*100:.1f}% var.)**\n")
@@ -93,32 +96,38 @@ def generate_markdown_report(
             lines.append(f"| `{param}` | {weight:+.4f} |")
         lines.append("")
 
+
+def _importance_lines(lines, results, param_cols, response_col, num, level="##"):
+    """Section importances (RF, GB, corrélations, combinée) d'une réponse."""
+    corr_p, corr_s = results["corr"]
+    sub = level + "#"
+
+    lines.append(f"{level} {num}. Importances des paramètres\n")
+
     # ------------------------
     # Importances RF
     # ------------------------
-    lines.append("## 3. Importances des paramètres\n")
-
-    lines.append("### 3.1 RandomForest\n")
+    lines.append(f"{sub} {num}.1 RandomForest\n")
     lines.append("| Paramètre | Importance RF |")
     lines.append("|-----------|---------------|")
-    for p, v in rf_sorted:
+    for p, v in _sorted_items(results["rf"]):
         lines.append(f"| `{p}` | {v:.4f} |")
     lines.append("")
 
     # ------------------------
     # Importances GB
     # ------------------------
-    lines.append("### 3.2 Gradient Boosting\n")
+    lines.append(f"{sub} {num}.2 Gradient Boosting\n")
     lines.append("| Paramètre | Importance GB |")
     lines.append("|-----------|---------------|")
-    for p, v in gb_sorted:
+    for p, v in _sorted_items(results["gb"]):
         lines.append(f"| `{p}` | {v:.4f} |")
     lines.append("")
 
     # ------------------------
     # Corrélations
     # ------------------------
-    lines.append("### 3.3 Corrélations avec la réponse\n")
+    lines.append(f"{sub} {num}.3 Corrélations avec la réponse\n")
     lines.append(f"_Réponse :_ `{response_col}`\n")
 
     lines.append("| Paramètre | Corr. Pearson | Corr. Spearman |")
@@ -132,19 +141,21 @@ def generate_markdown_report(
     # ------------------------
     # Importance combinée
     # ------------------------
-    lines.append("### 3.4 Importance combinée (RF + GB + Corr)\n")
+    lines.append(f"{sub} {num}.4 Importance combinée (RF + GB + Corr)\n")
     lines.append("_Score combiné = 0.5·RF + 0.4·GB + 0.1·|corrPearson|_\n")
 
     lines.append("| Rang | Paramètre | Importance combinée |")
     lines.append("|------|-----------|---------------------|")
-    for i, (p, v) in enumerate(comb_sorted, start=1):
+    for i, (p, v) in enumerate(_sorted_items(results["combined"]), start=1):
         lines.append(f"| {i} | `{p}` | {v:.4f} |")
     lines.append("")
 
+
+def _recommendation_lines(lines, comb_sorted, num):
     # ------------------------
     # Recommandations automatiques (simples)
     # ------------------------
-    lines.append("## 4. Recommandations (brouillon automatique)\n")
+    lines.append(f"## {num}. Recommandations (brouillon automatique)\n")
 
     if comb_sorted:
         top_params = [p for p, _ in comb_sorted[:3]]
@@ -158,13 +169,188 @@ def generate_markdown_report(
     lines.append("- Fixer les paramètres faibles à une valeur médiane raisonnable.")
     lines.append("- Lancer un second screening local pour affiner la zone optimale.\n")
 
+
+def _annex_lines(lines, num):
     # ------------------------
     # Annexes
     # ------------------------
-    lines.append("## 5. Annexes\n")
+    lines.append(f"## {num}. Annexes\n")
     lines.append("- Projections PCA (PC1, PC2) exportables depuis la fenêtre PCA.")
     lines.append("- Graphiques d’importance (RF, GB, combinée) exportables depuis la fenêtre d’analyse avancée.")
     lines.append("- Données complètes disponibles dans les exports CSV.\n")
 
+
+def generate_markdown_report(
+    path,
+    df,
+    param_cols,
+    response_col,
+    title="Rapport d'analyse de screening",
+    results=None,
+    surrogate=None
+):
+    """
+    Génère un rapport Markdown complet et l'enregistre dans 'path'.
+    - df : DataFrame complet
+    - param_cols : liste des paramètres utilisés
+    - response_col : nom de la réponse principale
+    - results : lot de résultats déjà calculés (cf. compute_report_results),
+      seuls les éléments manquants sont recalculés
+    - surrogate : métamodèle multi-réponses partagé (importances RF)
+    """
+
+    path = Path(path)
+    results = compute_report_results(df, param_cols, response_col, results, surrogate=surrogate)
+
+    # ------------------------
+    # Construction du Markdown
+    # ------------------------
+    lines = []
+
+    lines.append(f"# {title}\n")
+    lines.append("## 1. Résumé général\n")
+    lines.append(f"- Nombre de points : **{len(df)}**")
+    lines.append(f"- Nombre de paramètres : **{len(param_cols)}**")
+    lines.append(f"- Paramètres analysés : `{', '.join(param_cols)}`")
+    lines.append(f"- Réponse principale : `{response_col}`\n")
+
+    _pca_lines(lines, results, param_cols, 2)
+    _importance_lines(lines, results, param_cols, response_col, 3)
+    _recommendation_lines(lines, _sorted_items(results["combined"]), 4)
+    _annex_lines(lines, 5)
+
     # Écriture du fichier
     path.write_text("\n".join(lines), encoding="utf-8")
+
+
+# =============================================================================
+# RAPPORT MULTI-RÉPONSES
+# =============================================================================
+
+# Matrice des paramètres partagée par les processus (cf. _init_report_worker)
+_WORKER_X = None
+
+def _init_report_worker(X):
+    global _WORKER_X
+    _WORKER_X = X
+
+def _fit_importance_job(args):
+    # Mêmes réglages que compute_rf_importances / compute_gb_importances
+    kind, y = args
+    if kind == "rf":
+        model = RandomForestRegressor(n_estimators=400, random_state=0)
+    else:
+        model = GradientBoostingRegressor(n_estimators=400, learning_rate=0.05, max_depth=3, random_state=0)
+    model.fit(_WORKER_X, y)
+    return model.feature_importances_
+
+
+def compute_batch_results(df, param_cols, response_cols, results=None, workers=None,
+                          progress_callback=None, surrogate=None):
+    """
+    Lots de résultats ({réponse: lot}, cf. compute_report_results) pour
+    plusieurs réponses. La PCA et les matrices de corrélation (Pearson,
+    Spearman) sont calculées une seule fois pour toutes les réponses ; les
+    modèles RF/GB manquants sont ajustés dans un pool de processus qui
+    reçoit la matrice des paramètres une seule fois par processus.
+    results est complété sur place et retourné.
+    """
+    results = {} if results is None else results
+    bundles = {r: fill_from_surrogate(results.setdefault(r, {}), df, param_cols, r, surrogate)
+               for r in response_cols}
+
+    if any(b.get("pca") is None for b in bundles.values()):
+        pca = next((b["pca"] for b in bundles.values() if b.get("pca") is not None), None)
+        if pca is None: pca = compute_pca(df, param_cols)
+        for b in bundles.values():
+            if b.get("pca") is None: b["pca"] = pca
+
+    need_corr = [r for r, b in bundles.items() if b.get("corr") is None]
+    if need_corr:
+        cols = param_cols + [r for r in need_corr if r not in param_cols]
+        corr_p = df[cols].corr(method="pearson")
+        corr_s = df[cols].corr(method="spearman")
+        for r in need_corr:
+            bundles[r]["corr"] = ({p: corr_p.at[p, r] for p in param_cols},
+                                  {p: corr_s.at[p, r] for p in param_cols})
+
+    jobs = [(r, kind) for r, b in bundles.items() for kind in ("rf", "gb") if b.get(kind) is None]
+    if jobs:
+        X = df[param_cols].values
+        workers = workers or min(len(jobs), os.cpu_count() or 1)
+        if progress_callback:
+            progress_callback(f"Ajustement de {len(jobs)} modèle(s) sur {workers} processus...")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_report_worker, initargs=(X,)) as ex:
+            args = [(kind, df[r].values) for r, kind in jobs]
+            for (r, kind), imp in zip(jobs, ex.map(_fit_importance_job, args)):
+                bundles[r][kind] = dict(zip(param_cols, imp))
+                if progress_callback: progress_callback(f"  {kind.upper()} : {r}")
+
+    for r, b in bundles.items():
+        if b.get("combined") is None:
+            b["combined"] = combine_importances(b["rf"], b["gb"], b["corr"][0])
+    return results
+
+
+def generate_batch_report(
+    path,
+    df,
+    param_cols,
+    response_cols,
+    title="Rapport d'analyse de screening (multi-réponses)",
+    results=None,
+    workers=None,
+    progress_callback=None,
+    surrogate=None
+):
+    """
+    Rapport Markdown unique pour plusieurs réponses : résumé, PCA commune,
+    synthèse des importances combinées (paramètres x réponses) puis une
+    section détaillée par réponse.
+    - results : {réponse: lot de résultats} déjà calculés (cf. compute_batch_results)
+    - surrogate : métamodèle multi-réponses partagé (importances RF)
+    Retourne les lots de résultats complétés.
+    """
+    path = Path(path)
+    results = compute_batch_results(df, param_cols, response_cols, results, workers, progress_callback,
+                                    surrogate)
+
+    lines = []
+    lines.append(f"# {title}\n")
+    lines.append("## 1. Résumé général\n")
+    lines.append(f"- Nombre de points : **{len(df)}**")
+    lines.append(f"- Nombre de paramètres : **{len(param_cols)}**")
+    lines.append(f"- Paramètres analysés : `{', '.join(param_cols)}`")
+    lines.append(f"- Réponses analysées : `{', '.join(response_cols)}`\n")
+
+    # PCA (ne dépend que des paramètres)
+    _pca_lines(lines, results[response_cols[0]], param_cols, 2)
+
+    # ------------------------
+    # Synthèse multi-réponses
+    # ------------------------
+    combined = np.array([[results[r]["combined"][p] for r in response_cols] for p in param_cols])
+    mean_imp = dict(zip(param_cols, combined.mean(axis=1)))
+    mean_sorted = _sorted_items(mean_imp)
+
+    lines.append("## 3. Synthèse des importances combinées\n")
+    lines.append("| Rang | Paramètre | " + " | ".join(f"`{r}`" for r in response_cols) + " | Moyenne |")
+    lines.append("|------|-----------|" + "|".join("---" for _ in response_cols) + "|---------|")
+    for i, (p, v) in enumerate(mean_sorted, start=1):
+        row = combined[param_cols.index(p)]
+        lines.append(f"| {i} | `{p}` | " + " | ".join(f"{x:.4f}" for x in row) + f" | {v:.4f} |")
+    lines.append("")
+
+    # ------------------------
+    # Détail par réponse
+    # ------------------------
+    lines.append("## 4. Détail par réponse\n")
+    for i, r in enumerate(response_cols, start=1):
+        lines.append(f"### Réponse `{r}`\n")
+        _importance_lines(lines, results[r], param_cols, r, f"4.{i}", level="###")
+
+    _recommendation_lines(lines, mean_sorted, 5)
+    _annex_lines(lines, 6)
+
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return results
@@ -1,6 +1,11 @@
 from sklearn.ensemble import RandomForestRegressor
 
-def compute_rf_importances(df, params, response):
+def compute_rf_importances(df, params, response, surrogate=None):
+    # Métamodèle multi-réponses déjà entraîné (cf. core.multi_surrogate) : importances par sortie
+    if surrogate is not None:
+        surrogate.check_params(params)
+        return surrogate.feature_importances(response)
+
     X = df[params].values
     y = df[response].values
 
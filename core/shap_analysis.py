@@ -8,7 +8,7 @@ try:
 except ImportError:
     SHAP_AVAILABLE = False
 
-def compute_shap_analysis(df, params, response):
+def compute_shap_analysis(df, params, response, surrogate=None):
     """
     Entraîne un modèle Random Forest et calcule les valeurs SHAP.
 
@@ -16,12 +16,15 @@ def compute_shap_analysis(df, params, response):
         df (pd.DataFrame): Données.
         params (list): Liste des colonnes paramètres.
         response (str): Colonne réponse.
+        surrogate (MultiOutputSurrogate): Métamodèle multi-réponses déjà entraîné
+            (cf. core.multi_surrogate) ; seule la sortie de response est expliquée.
 
     Returns:
         tuple: (shap_values, X_df, explainer)
             - shap_values: tableau numpy ou objet Explanation des valeurs SHAP.
             - X_df: DataFrame des features (pour les noms et valeurs).
-            - explainer: L'objet explainer (utile pour certains plots).
+            - explainer: L'objet explainer (utile pour certains plots) ; avec un
+              métamodèle, expected_value est celle de response, à l'échelle d'origine.
     """
     if not SHAP_AVAILABLE:
         raise ImportError("La librairie SHAP est requise. Veuillez l'installer avec : pip install shap")
@@ -31,8 +34,12 @@ def compute_shap_analysis(df, params, response):
 
     # 1. Entraînement du modèle (Random Forest)
     # On utilise un modèle assez profond pour capturer les non-linéarités
-    model = RandomForestRegressor(n_estimators=100, max_depth=None, min_samples_leaf=2, random_state=42)
-    model.fit(X, y)
+    if surrogate is None:
+        model = RandomForestRegressor(n_estimators=100, max_depth=None, min_samples_leaf=2, random_state=42)
+        model.fit(X, y)
+    else:
+        surrogate.check_params(params)
+        model, idx, mean, scale = surrogate.output_model(response)
 
     # 2. Création de l'explainer
     # TreeExplainer est optimisé pour les arbres
@@ -42,4 +49,16 @@ def compute_shap_analysis(df, params, response):
     # check_additivity=False permet d'éviter certaines erreurs de précision flottante bénignes
     shap_values = explainer.shap_values(X, check_additivity=False)
 
+    if surrogate is not None:
+        # Forêt multi-sorties : liste (une matrice par sortie) ou tableau (n, p, sorties) selon la version
+        if isinstance(shap_values, list):
+            shap_values = shap_values[idx]
+        elif np.ndim(shap_values) == 3:
+            shap_values = shap_values[..., idx]
+        # La forêt prédit la réponse centrée-réduite : contributions et valeur de base
+        # ramenées à l'échelle d'origine (base + somme des contributions = prédiction)
+        shap_values = np.asarray(shap_values) * scale
+        base = np.ravel(explainer.expected_value)
+        explainer.expected_value = float(base[idx if len(base) > 1 else 0]) * scale + mean
+
     return shap_values, X, explainer
@@ -9,7 +9,7 @@ try:
 except ImportError:
     SALIB_AVAILABLE = False
 
-def compute_sobol_indices(df, params, response, n_samples=1024):
+def compute_sobol_indices(df, params, response, n_samples=1024, surrogate=None):
     """
     Calcule les indices de Sobol (S1, ST) en utilisant un métamodèle Random Forest.
     
@@ -19,6 +19,8 @@ def compute_sobol_indices(df, params, response, n_samples=1024):
         response (str): Nom de la colonne réponse.
         n_samples (int): Nombre d'échantillons de base pour la séquence de Sobol (N).
                          Le nombre total d'évaluations sera N * (D + 2) (si second_order=False).
+        surrogate (MultiOutputSurrogate): Métamodèle multi-réponses déjà entraîné
+                         (cf. core.multi_surrogate) ; sinon un RF est entraîné pour response.
 
     Returns:
         dict: Dictionnaire contenant les séries pandas 'S1', 'ST', 'S1_conf', 'ST_conf'.
@@ -27,12 +29,17 @@ def compute_sobol_indices(df, params, response, n_samples=1024):
         raise ImportError("La librairie SALib est requise. Veuillez l'installer avec : pip install SALib")
 
     # 1. Entraînement du métamodèle (Random Forest)
-    X_train = df[params].values
-    y_train = df[response].values
-    
-    # On utilise un RF assez robuste pour servir de surrogate
-    rf = RandomForestRegressor(n_estimators=200, random_state=42)
-    rf.fit(X_train, y_train)
+    if surrogate is None:
+        X_train = df[params].values
+        y_train = df[response].values
+
+        # On utilise un RF assez robuste pour servir de surrogate
+        rf = RandomForestRegressor(n_estimators=200, random_state=42)
+        rf.fit(X_train, y_train)
+        predict = rf.predict
+    else:
+        surrogate.check_params(params)
+        predict = lambda X: surrogate.predict(X, response)
     
     # 2. Définition du problème pour SALib (Bornes extraites des données)
     # On suppose que le plan d'expérience couvre l'espace d'intérêt
@@ -47,7 +54,7 @@ def compute_sobol_indices(df, params, response, n_samples=1024):
     X_sobol = sobol.sample(problem, n_samples, calc_second_order=False)
     
     # 4. Prédiction sur les points virtuels via le métamodèle
-    y_sobol = rf.predict(X_sobol)
+    y_sobol = predict(X_sobol)
     
     # 5. Calcul des indices
     si = analyze_sobol.analyze(problem, y_sobol, calc_second_order=False, print_to_console=False)
@@ -1,3 +1,4 @@
+import threading
 import tkinter as tk
 from tkinter import messagebox, filedialog
 import numpy as np
@@ -14,7 +15,7 @@ class AnalysisWindow(tk.Toplevel):
     - Importance combinée
     """
 
-    def __init__(self, master, df, params, responses):
+    def __init__(self, master, df, params, responses, surrogate=None):
         super().__init__(master)
         self.title("Analyse avancée des paramètres")
 
@@ -22,6 +23,9 @@ class AnalysisWindow(tk.Toplevel):
         self.params = params
         self.responses = responses
         self.response = responses[0]
+        # Résultats déjà calculés, par réponse (réutilisés par le rapport)
+        self.results = {}
+        self.surrogate = surrogate # Métamodèle multi-réponses partagé (optionnel)
 
         # Layout
         self.columnconfigure(0, weight=1)
@@ -45,7 +49,10 @@ class AnalysisWindow(tk.Toplevel):
         tk.Button(btns, text="Importance combinée",
                   command=self.show_combined).grid(row=0, column=3, padx=4)
         tk.Button(btns, text="Exporter rapport (md)",
-                  command=self.export_report).grid(row=1, column=0, columnspan=4, pady=8)
+                  command=self.export_report).grid(row=1, column=0, columnspan=2, pady=8)
+        self.btn_batch_report = tk.Button(btns, text=f"Rapport multi-réponses ({len(self.responses)}, md)",
+                                          command=self.export_batch_report)
+        self.btn_batch_report.grid(row=1, column=2, columnspan=2, pady=8)
 
         # Zone graphique
         self.fig = Figure(figsize=(6, 4))
@@ -57,8 +64,7 @@ class AnalysisWindow(tk.Toplevel):
     # RandomForest
     # ============
     def show_rf(self):
-        from core.rf_importance import compute_rf_importances
-        imp = compute_rf_importances(self.df, self.params, self.response)
+        imp = self._result("rf")
 
         self._plot_importance(imp, "RandomForest")
 
@@ -66,8 +72,7 @@ class AnalysisWindow(tk.Toplevel):
     # Gradient Boosting
     # ===================
     def show_gb(self):
-        from core.boosting_importance import compute_gb_importances
-        imp = compute_gb_importances(self.df, self.params, self.response)
+        imp = self._result("gb")
 
         self._plot_importance(imp, "Gradient Boosting")
 
@@ -75,8 +80,7 @@ class AnalysisWindow(tk.Toplevel):
     # Corrélations
     # ===================
     def show_corr(self):
-        from core.correlation_analysis import compute_correlations
-        corr_p, corr_s = compute_correlations(self.df, self.params, self.response)
+        corr_p, corr_s = self._result("corr")
 
         self.ax.clear()
         labels = list(corr_p.keys())
@@ -100,16 +104,12 @@ class AnalysisWindow(tk.Toplevel):
     # Importance combinée
     # ================================
     def show_combined(self):
-        from core.rf_importance import compute_rf_importances
-        from core.boosting_importance import compute_gb_importances
-        from core.correlation_analysis import compute_correlations
         from core.combined_importance import combine_importances
 
-        imp_rf = compute_rf_importances(self.df, self.params, self.response)
-        imp_gb = compute_gb_importances(self.df, self.params, self.response)
-        corr_p, _ = compute_correlations(self.df, self.params, self.response)
-
-        imp = combine_importances(imp_rf, imp_gb, corr_p)
+        imp = self._result("combined")
+        if imp is None:
+            imp = combine_importances(self._result("rf"), self._result("gb"), self._result("corr")[0])
+            self.results[self.response]["combined"] = imp
 
         self._plot_importance(imp, "Importance combinée")
 
@@ -126,15 +126,69 @@ class AnalysisWindow(tk.Toplevel):
         if not path:
             return
 
+        # Seuls les résultats pas encore affichés sont calculés (en parallèle)
         generate_markdown_report(
             path=path,
             df=self.df,
             param_cols=self.params,
-            response_col=self.response
+            response_col=self.response,
+            results=self.results.setdefault(self.response, {}),
+            surrogate=self.surrogate
         )
 
         messagebox.showinfo("Rapport", f"Rapport Markdown généré :\n{path}")
 
+    def export_batch_report(self):
+        from core.report_generator import generate_batch_report
+
+        path = filedialog.asksaveasfilename(
+            defaultextension=".md",
+            filetypes=[("Markdown", "*.md"), ("Tous les fichiers", "*.*")]
+        )
+        if not path:
+            return
+
+        # Modèles par réponse ajustés en parallèle (processus) : hors du thread Tk
+        self.btn_batch_report.config(state="disabled")
+
+        # Le thread complète une copie des lots : les vues continuent d'utiliser
+        # self.results, les éléments calculés y sont reversés dans le thread Tk
+        results = {r: dict(bundle) for r, bundle in self.results.items()}
+
+        def task():
+            try:
+                generate_batch_report(path, self.df, self.params, list(self.responses), results=results,
+                                      surrogate=self.surrogate)
+                self.after(0, lambda: self._merge_results(results))
+                self.after(0, lambda: messagebox.showinfo("Rapport", f"Rapport multi-réponses généré :\n{path}", parent=self))
+            except Exception as e:
+                self.after(0, lambda e=e: messagebox.showerror("Erreur", f"Génération du rapport impossible :\n{e}", parent=self))
+            finally:
+                self.after(0, lambda: self.btn_batch_report.config(state="normal"))
+
+        threading.Thread(target=task, daemon=True).start()
+
+    # ===============
+    # Cache des résultats
+    # ===============
+    def _merge_results(self, results):
+        """Reverse dans self.results les éléments calculés ailleurs, sans écraser ceux déjà présents."""
+        for response, bundle in results.items():
+            current = self.results.setdefault(response, {})
+            for key, value in bundle.items():
+                if current.get(key) is None:
+                    current[key] = value
+
+    def _result(self, key):
+        """Élément du lot de résultats de la réponse courante, calculé au premier appel."""
+        from core.report_generator import REPORT_PIECES, fill_from_surrogate
+
+        results = fill_from_surrogate(self.results.setdefault(self.response, {}), self.df,
+                                      self.params, self.response, self.surrogate)
+        if results.get(key) is None and key in REPORT_PIECES:
+            results[key] = REPORT_PIECES[key](self.df, self.params, self.response)
+        return results.get(key)
+
     # ===============
     # Plot générique
     # ===============
@@ -2,17 +2,48 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, ttk
 import os
 import threading
-from core.image_logic import run_sorting_logic, run_fusion_logic
+from core.image_logic import run_sorting_logic, run_fusion_logic, run_pdf_sorting_logic
+
+# Libellés affichés -> modes de répartition (core.image_logic.DISPATCH_MODES)
+DISPATCH_LABELS = {
+    "Copie": "copy",
+    "Lien physique (hardlink)": "hardlink",
+    "Clone CoW (reflink)": "reflink",
+    "Lien symbolique": "symlink",
+    "Déplacement": "move",
+    "Manifeste CSV seul": "manifest",
+}
+
+# Libellés affichés -> méthodes de classement (core.image_logic.SORTING_BACKENDS)
+BACKEND_LABELS = {
+    "Corrélation aux gabarits": "profiles",
+    "Classifieur entraîné": "classifier",
+}
+
+# Libellés affichés -> modes de rendu des diagnostics (core.image_logic.DEBUG_PLOT_MODES)
+DEBUG_PLOT_LABELS = {
+    "Graphiques différés (matplotlib)": "deferred",
+    "Rendu rapide (OpenCV)": "raster",
+    "Planches récapitulatives": "montage",
+    "Aucun": "none",
+}
 
 class ImageWindow(tk.Toplevel):
     def __init__(self, master):
         super().__init__(master)
         self.title("Finalisation Traitement Images")
-        self.geometry("900x700")
+        self.geometry("900x740")
         
         # Variables
         self.json_path = tk.StringVar()
         self.source_dir = tk.StringVar()
+        self.jpeg_quality = tk.IntVar(value=95)
+        self.dispatch_mode = tk.StringVar(value="Copie")
+        self.debug_mode = tk.StringVar(value="Graphiques différés (matplotlib)")
+        self.backend = tk.StringVar(value="Corrélation aux gabarits")
+        self.classifier_path = tk.StringVar()
+        self.proba_threshold = tk.DoubleVar(value=0.8)
+        self.coarse_matching = tk.BooleanVar(value=False)
         
         self.sorted_dirs = {} # Pour stocker les chemins de sortie du tri
         
@@ -34,10 +65,11 @@ class ImageWindow(tk.Toplevel):
         self.txt_log.see(tk.END)
 
     def auto_locate_json(self):
-        # Cherche dans "Type de fiche" ou racine
+        # Cherche dans "Type de fiche" ou racine, format binaire en priorité
         candidates = [
-            os.path.join("Type de fiche", "reference_profiles.json"),
-            "reference_profiles.json"
+            os.path.join(folder, "reference_profiles" + ext)
+            for ext in (".refprof", ".npz", ".json")
+            for folder in ("Type de fiche", ".")
         ]
         for c in candidates:
             if os.path.exists(c):
@@ -66,14 +98,70 @@ class ImageWindow(tk.Toplevel):
         tk.Entry(f2, textvariable=self.source_dir).pack(side="left", fill="x", expand=True, padx=5)
         tk.Button(f2, text="...", command=self.browse_source).pack(side="left")
 
+        # Ligne 3 : Mode de répartition
+        f3 = tk.Frame(frame)
+        f3.pack(fill="x", pady=2)
+        tk.Label(f3, text="Répartition :", width=15, anchor="w").pack(side="left")
+        ttk.Combobox(f3, textvariable=self.dispatch_mode, values=list(DISPATCH_LABELS),
+                     state="readonly", width=25).pack(side="left", padx=5)
+        tk.Label(f3, text="Diagnostics incertains :").pack(side="left", padx=(15, 0))
+        ttk.Combobox(f3, textvariable=self.debug_mode, values=list(DEBUG_PLOT_LABELS),
+                     state="readonly", width=30).pack(side="left", padx=5)
+
+        # Ligne 4 : Méthode de classement
+        f5 = tk.Frame(frame)
+        f5.pack(fill="x", pady=2)
+        tk.Label(f5, text="Méthode :", width=15, anchor="w").pack(side="left")
+        ttk.Combobox(f5, textvariable=self.backend, values=list(BACKEND_LABELS),
+                     state="readonly", width=25).pack(side="left", padx=5)
+        tk.Label(f5, text="Modèle :").pack(side="left", padx=(15, 0))
+        tk.Entry(f5, textvariable=self.classifier_path).pack(side="left", fill="x", expand=True, padx=5)
+        tk.Button(f5, text="...", command=self.browse_classifier).pack(side="left")
+        tk.Label(f5, text="Seuil proba :").pack(side="left", padx=(10, 0))
+        tk.Spinbox(f5, from_=0.5, to=0.99, increment=0.05, width=5, textvariable=self.proba_threshold).pack(side="left", padx=5)
+        tk.Checkbutton(f5, text="Recherche rapide (grossière puis fine)", variable=self.coarse_matching).pack(side="left", padx=(10, 0))
+
         # Bouton Action
         self.btn_sort = tk.Button(frame, text="Lancer le Tri", bg="#dddddd", command=self.start_sorting)
         self.btn_sort.pack(fill="x", pady=5)
 
+        # Tri direct depuis un PDF (sans extraction préalable)
+        f4 = tk.Frame(frame)
+        f4.pack(fill="x", pady=2)
+        self.keep_vars = {
+            "old": tk.BooleanVar(value=True),
+            "new": tk.BooleanVar(value=True),
+            "unsure": tk.BooleanVar(value=True)
+        }
+        self.btn_sort_pdf = tk.Button(f4, text="Trier directement un PDF...", bg="#e6f2ff", command=self.start_pdf_sorting)
+        self.btn_sort_pdf.pack(side="left", padx=(0, 10))
+        tk.Label(f4, text="Pages à écrire :").pack(side="left")
+        for key, label in (("old", "Anciennes"), ("new", "Nouvelles"), ("unsure", "Incertaines")):
+            tk.Checkbutton(f4, text=label, variable=self.keep_vars[key]).pack(side="left")
+
     def browse_json(self):
-        f = filedialog.askopenfilename(filetypes=[("JSON", "*.json")], parent=self)
+        f = filedialog.askopenfilename(filetypes=[("Références", "*.refprof *.json *.npz"), ("Références binaires", "*.refprof"), ("JSON", "*.json"), ("NumPy compressé", "*.npz")], parent=self)
         if f: self.json_path.set(f)
 
+    def browse_classifier(self):
+        f = filedialog.askopenfilename(filetypes=[("Classifieur", "*.joblib")], parent=self)
+        if f:
+            self.classifier_path.set(f)
+            self.backend.set("Classifieur entraîné")
+
+    def backend_options(self):
+        """Options de classement à transmettre au coeur, ou None (avec message) si incomplètes."""
+        backend = BACKEND_LABELS.get(self.backend.get(), "profiles")
+        if backend == "profiles" and not os.path.exists(self.json_path.get()):
+            messagebox.showerror("Erreur", "Fichier JSON introuvable.", parent=self)
+            return None
+        if backend == "classifier" and not os.path.exists(self.classifier_path.get()):
+            messagebox.showerror("Erreur", "Fichier du classifieur introuvable.", parent=self)
+            return None
+        return {"backend": backend, "classifier_path": self.classifier_path.get() or None,
+                "proba_threshold": self.proba_threshold.get(),
+                "coarse_factor": 4 if self.coarse_matching.get() else 1}
+
     def browse_source(self):
         d = filedialog.askdirectory(parent=self)
         if d: self.source_dir.set(d)
@@ -82,8 +170,8 @@ class ImageWindow(tk.Toplevel):
         json_p = self.json_path.get()
         src_d = self.source_dir.get()
         
-        if not os.path.exists(json_p):
-            messagebox.showerror("Erreur", "Fichier JSON introuvable.", parent=self)
+        options = self.backend_options()
+        if options is None:
             return
         if not os.path.exists(src_d):
             messagebox.showerror("Erreur", "Dossier Source introuvable.", parent=self)
@@ -91,12 +179,15 @@ class ImageWindow(tk.Toplevel):
             
         self.btn_sort.config(state="disabled")
         self.log("--- Démarrage du Tri ---")
+        mode = DISPATCH_LABELS.get(self.dispatch_mode.get(), "copy")
+        debug_mode = DEBUG_PLOT_LABELS.get(self.debug_mode.get(), "deferred")
         
         # Threading pour ne pas geler l'UI
         def task():
             try:
                 # Appel Core Logic
-                res = run_sorting_logic(src_d, json_p, progress_callback=self.update_log_threadsafe)
+                res = run_sorting_logic(src_d, json_p, progress_callback=self.update_log_threadsafe,
+                                        dispatch_mode=mode, debug_plots=debug_mode, **options)
                 self.sorted_dirs = res
                 self.after(0, self.on_sort_finished)
             except Exception as e:
@@ -105,6 +196,38 @@ class ImageWindow(tk.Toplevel):
 
         threading.Thread(target=task).start()
 
+    def start_pdf_sorting(self):
+        json_p = self.json_path.get()
+        options = self.backend_options()
+        if options is None:
+            return
+
+        pdf = filedialog.askopenfilename(filetypes=[("PDF Files", "*.pdf")], parent=self)
+        if not pdf: return
+
+        out_dir = os.path.splitext(pdf)[0] + "_TRI"
+        keep = tuple(k for k, v in self.keep_vars.items() if v.get())
+        debug_mode = DEBUG_PLOT_LABELS.get(self.debug_mode.get(), "deferred")
+
+        self.btn_sort.config(state="disabled")
+        self.btn_sort_pdf.config(state="disabled")
+        self.log(f"--- Démarrage du Tri PDF : {os.path.basename(pdf)} -> {out_dir} ---")
+
+        def task():
+            try:
+                res = run_pdf_sorting_logic(pdf, json_p, out_dir, keep=keep,
+                                            progress_callback=self.update_log_threadsafe,
+                                            debug_plots=debug_mode, **options)
+                self.sorted_dirs = res
+                self.after(0, self.on_sort_finished)
+            except Exception as e:
+                self.update_log_threadsafe(f"ERREUR FATALE: {e}")
+                self.after(0, lambda: self.btn_sort.config(state="normal"))
+            finally:
+                self.after(0, lambda: self.btn_sort_pdf.config(state="normal"))
+
+        threading.Thread(target=task).start()
+
     def update_log_threadsafe(self, msg):
         self.after(0, lambda: self.log(msg))
 
@@ -130,6 +253,11 @@ class ImageWindow(tk.Toplevel):
         lbl = tk.Label(self.frame_step2, text="Cette étape utilise les dossiers générés par le tri (TRI_NOUVEAU / TRI_ANCIEN).\nChoisissez quel groupe traiter :", justify="left")
         lbl.pack(anchor="w", pady=5)
         
+        opt_frame = tk.Frame(self.frame_step2)
+        opt_frame.pack(fill="x", pady=2)
+        tk.Label(opt_frame, text="Qualité JPEG :").pack(side="left")
+        tk.Spinbox(opt_frame, from_=50, to=100, width=4, textvariable=self.jpeg_quality).pack(side="left", padx=5)
+
         btn_frame = tk.Frame(self.frame_step2)
         btn_frame.pack(fill="x")
         
@@ -167,16 +295,26 @@ class ImageWindow(tk.Toplevel):
             if not target_dir: return
 
         self.log(f"--- Démarrage Fusion ({mode.upper()}) sur {target_dir} ---")
+        quality = self.jpeg_quality.get()
         
         def task():
             try:
-                run_fusion_logic(target_dir, crop_verso=do_crop, progress_callback=self.update_log_threadsafe)
+                run_fusion_logic(target_dir, crop_verso=do_crop, progress_callback=self.update_log_threadsafe,
+                                 jpeg_quality=quality, stats_callback=self.log_fusion_stats)
                 self.update_log_threadsafe("--- Fusion Terminée ---")
             except Exception as e:
                 self.update_log_threadsafe(f"ERREUR: {e}")
 
         threading.Thread(target=task).start()
 
+    def log_fusion_stats(self, stats):
+        """Affiche les temps cumulés par étage du pipeline de fusion."""
+        self.update_log_threadsafe(
+            f"Temps : total {stats['wall']:.1f}s | lecture {stats['lecture']:.1f}s | "
+            f"calcul {stats['calcul']:.1f}s | écriture {stats['ecriture']:.1f}s "
+            f"({stats['written']}/{stats['pairs']} paires)"
+        )
+
     # =========================================================================
     # UI LOGS
     # =========================================================================
@@ -27,9 +27,10 @@ class PCAWindow(tk.Toplevel):
     - figure entièrement réinitialisée à chaque refresh (pas de bugs Matplotlib)
     """
 
-    def __init__(self, master, df, param_cols, response_cols):
+    def __init__(self, master, df, param_cols, response_cols, surrogate=None):
         super().__init__(master)
         self.title("Analyse PCA (avancée)")
+        self.surrogate = surrogate # Métamodèle multi-réponses partagé (optionnel)
 
         self.df = df
         self.all_param_cols = param_cols.copy()
@@ -243,7 +244,7 @@ class PCAWindow(tk.Toplevel):
         # =====================================================================
     def open_analysis(self):
         from gui.analysis_window import AnalysisWindow
-        AnalysisWindow(self, self.df, self.param_cols, self.response_cols)
+        AnalysisWindow(self, self.df, self.param_cols, self.response_cols, surrogate=self.surrogate)
 
     # =========================================================
     # Exports
@@ -298,6 +299,7 @@ class MainWindow:
         self.param_cols = []
         self.response_cols = []
         self.results = None
+        self.shared_surrogate = None # Métamodèle multi-réponses (cf. get_shared_surrogate)
 
         # -------------------------
         # Fichier
@@ -367,6 +369,11 @@ class MainWindow:
         self.std_thresh_var = tk.StringVar(value="2.5")
         tk.Entry(opt_frame, textvariable=self.std_thresh_var, width=6).grid(row=3, column=1, sticky="w", padx=4)
 
+        # Une seule forêt multi-sorties pour Sobol / SHAP / Optimisation
+        self.shared_surrogate_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(opt_frame, text="Métamodèle multi-réponses partagé (une seule forêt)",
+                       variable=self.shared_surrogate_var).grid(row=4, column=0, columnspan=2, sticky="w")
+
         # -------------------------
         # Boutons d'analyse
         # -------------------------
@@ -419,6 +426,7 @@ class MainWindow:
             self.param_listbox.insert(tk.END, col)
             self.resp_listbox.insert(tk.END, col)
 
+        self.shared_surrogate = None
         self.log_text.insert(tk.END, "Fichier chargé.\n")
 
     # =====================================================================
@@ -543,7 +551,8 @@ class MainWindow:
             self.log_text.insert(tk.END, "⚠ Aucun paramètre sélectionné.\n")
             return
 
-        PCAWindow(self.master, self.df, self.param_cols, self.response_cols)
+        PCAWindow(self.master, self.df, self.param_cols, self.response_cols,
+                  surrogate=self.get_shared_surrogate())
         self.log_text.insert(tk.END, "Fenêtre PCA avancée ouverte.\n")
 
     # =====================================================================
@@ -561,6 +570,28 @@ class MainWindow:
         export_group_results(self.results, path)
         self.log_text.insert(tk.END, f"Résultats exportés vers : {path}\n")
 
+    # =====================================================================
+    # Métamodèle partagé
+    # =====================================================================
+    def get_shared_surrogate(self):
+        """
+        Forêt multi-sorties sur toutes les réponses sélectionnées (si l'option
+        est cochée), entraînée une fois puis réutilisée tant que la sélection
+        ne change pas.
+        """
+        if not self.shared_surrogate_var.get() or not self.response_cols:
+            return None
+        s = self.shared_surrogate
+        if s is None or s.params != self.param_cols or s.responses != self.response_cols:
+            from core.multi_surrogate import fit_multi_surrogate
+            try:
+                self.shared_surrogate = fit_multi_surrogate(self.df, self.param_cols, self.response_cols)
+            except Exception as e:
+                self.log_text.insert(tk.END, f"⚠ Métamodèle partagé indisponible : {e}\n")
+                return None
+            self.log_text.insert(tk.END, f"Métamodèle multi-réponses entraîné ({len(self.response_cols)} réponses).\n")
+        return self.shared_surrogate
+
     # =====================================================================
     # Sobol
     # =====================================================================
@@ -573,7 +604,8 @@ class MainWindow:
             return
 
         from gui.sobol_window import SobolWindow
-        SobolWindow(self.master, self.df, self.param_cols, self.response_cols)
+        SobolWindow(self.master, self.df, self.param_cols, self.response_cols,
+                    surrogate=self.get_shared_surrogate())
         self.log_text.insert(tk.END, "Fenêtre Analyse Sobol ouverte.\n")
 
     # =====================================================================
@@ -588,7 +620,8 @@ class MainWindow:
             return
 
         from gui.shap_window import ShapWindow
-        ShapWindow(self.master, self.df, self.param_cols, self.response_cols)
+        ShapWindow(self.master, self.df, self.param_cols, self.response_cols,
+                   surrogate=self.get_shared_surrogate())
         self.log_text.insert(tk.END, "Fenêtre Analyse SHAP ouverte.\n")
 
     # =====================================================================
@@ -611,7 +644,8 @@ class MainWindow:
             analysis_name = "Analyse"
 
         from gui.optimization_window import OptimizationWindow
-        OptimizationWindow(self.master, self.df, self.param_cols, self.response_cols, analysis_name=analysis_name)
+        OptimizationWindow(self.master, self.df, self.param_cols, self.response_cols, analysis_name=analysis_name,
+                           surrogate=self.get_shared_surrogate())
         self.log_text.insert(tk.END, "Fenêtre Optimisation ouverte.\n")
 
     def open_image_tool(self):
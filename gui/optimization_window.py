@@ -6,16 +6,39 @@ matplotlib.use("TkAgg")
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import os
-import glob
+import threading
 import cv2
 from PIL import Image, ImageTk
+from core.render_engine import (RenderCache, zone_center, list_render_images,
+                                append_render_log, render_log_row, run_batch_render)
+
+# Libellés affichés -> (méthode core.optimization_finder.SEARCH_METHODS, budget d'évaluations)
+SEARCH_LABELS = {
+    "Hypercube latin adaptatif": ("lhs", 5000),
+    "Aléatoire uniforme": ("random", 5000),
+    "Bayésien (TPE, optuna)": ("tpe", 300),
+    "CMA-ES (optuna)": ("cmaes", 600),
+}
+
+# Libellés affichés -> critères core.optimization_finder.ACQUISITIONS
+ACQUISITION_LABELS = {
+    "Moyenne": "mean",
+    "Prudent (moy. - k·σ)": "lcb",
+    "Exploratoire (moy. + k·σ)": "ucb",
+}
+
+# Objectif de la boucle active : libellé -> colonne des scores (None : réponse du criblage)
+ACTIVE_SCORER_LABELS = {
+    "Confiance Tesseract (colonne séparée)": "confiance_tesseract",
+    "Fonction du criblage -> réponse": None,
+}
 
 class OptimizationWindow(tk.Toplevel):
     """
     Fenêtre affichant les zones optimales (Bump Hunting via Arbre de Décision).
     """
 
-    def __init__(self, master, df, params, response_cols, analysis_name="Analyse"):
+    def __init__(self, master, df, params, response_cols, analysis_name="Analyse", surrogate=None):
         super().__init__(master)
         self.title("Découverte de Zones Optimales")
         self.geometry("1600x700")
@@ -31,6 +54,10 @@ class OptimizationWindow(tk.Toplevel):
         self.response = response_cols[0] if isinstance(response_cols, list) else response_cols
 
         self.zones = []
+        self.surrogate = None # Métamodèle RF entraîné une seule fois (cf. get_surrogate)
+        self.shared_surrogate = surrogate # Métamodèle multi-réponses partagé (optionnel)
+        self.active_df = None # Criblage augmenté par la boucle active (scores dans une colonne séparée)
+        self.render_cache = RenderCache() # Sources décodées et rendus déjà calculés (visualize_render)
         self.last_optimized_coords = None
         self.last_picked_coords = None
 
@@ -185,13 +212,69 @@ class OptimizationWindow(tk.Toplevel):
                   command=self.run_fine_optimization, bg="#ccffcc", state="normal")
         self.btn_optimize.pack(side="left", padx=10)
 
+        self.btn_refine_all = tk.Button(ctrl_sub, text="Affiner Toutes les Zones",
+                  command=self.run_all_zones_optimization, bg="#e6e6ff", state="normal")
+        self.btn_refine_all.pack(side="left", padx=10)
+
         self.btn_visualize = tk.Button(ctrl_sub, text="Visualiser Rendu",
                   command=self.visualize_render, bg="#ffcc99", state="normal")
         self.btn_visualize.pack(side="left", padx=10)
 
-        # Résultat texte
-        self.txt_opt_res = scrolledtext.ScrolledText(opt_frame, height=5, font=("Consolas", 9), bg="#e6ffe6")
-        self.txt_opt_res.pack(fill="x", pady=5)
+        self.var_progressive = tk.BooleanVar(value=True)
+        tk.Checkbutton(ctrl_sub, text="Aperçu progressif", variable=self.var_progressive).pack(side="left")
+
+        # Méthode de recherche et critère
+        search_sub = tk.Frame(opt_frame)
+        search_sub.pack(fill="x", pady=(2, 0))
+        tk.Label(search_sub, text="Méthode :").pack(side="left")
+        self.search_method = tk.StringVar(value="Hypercube latin adaptatif")
+        ttk.Combobox(search_sub, textvariable=self.search_method, values=list(SEARCH_LABELS),
+                     state="readonly", width=22).pack(side="left", padx=5)
+
+        tk.Label(search_sub, text="Critère :").pack(side="left")
+        self.acquisition = tk.StringVar(value="Moyenne")
+        ttk.Combobox(search_sub, textvariable=self.acquisition, values=list(ACQUISITION_LABELS),
+                     state="readonly", width=22).pack(side="left", padx=5)
+        tk.Label(search_sub, text="k :").pack(side="left")
+        self.kappa = tk.DoubleVar(value=1.0)
+        tk.Spinbox(search_sub, from_=0.0, to=5.0, increment=0.5, width=4, textvariable=self.kappa).pack(side="left", padx=5)
+
+        # Boucle active : le pipeline OCR sert d'objectif (cf. core.active_learning)
+        active_sub = tk.Frame(opt_frame)
+        active_sub.pack(fill="x", pady=(2, 0))
+        tk.Label(active_sub, text="Boucle active (OCR) - tours :").pack(side="left")
+        self.al_rounds = tk.IntVar(value=5)
+        tk.Spinbox(active_sub, from_=1, to=50, width=4, textvariable=self.al_rounds).pack(side="left", padx=5)
+        tk.Label(active_sub, text="jeux/tour :").pack(side="left")
+        self.al_batch = tk.IntVar(value=8)
+        tk.Spinbox(active_sub, from_=1, to=64, width=4, textvariable=self.al_batch).pack(side="left", padx=5)
+        tk.Label(active_sub, text="images test :").pack(side="left")
+        self.al_images = tk.IntVar(value=5)
+        tk.Spinbox(active_sub, from_=1, to=100, width=4, textvariable=self.al_images).pack(side="left", padx=5)
+        tk.Label(active_sub, text="score :").pack(side="left")
+        self.al_scorer = ttk.Combobox(active_sub, values=list(ACTIVE_SCORER_LABELS), state="readonly", width=30)
+        self.al_scorer.current(0)
+        self.al_scorer.pack(side="left", padx=5)
+        self.al_score_fn = tk.StringVar(value="module:fonction")
+        tk.Entry(active_sub, textvariable=self.al_score_fn, width=18).pack(side="left", padx=5)
+        self.btn_active = tk.Button(active_sub, text="Lancer la Boucle", command=self.run_active_learning_loop,
+                                    bg="#fff0cc", state="normal")
+        self.btn_active.pack(side="left", padx=10)
+        self.btn_active_stop = tk.Button(active_sub, text="Arrêter", command=self.stop_active_learning_loop,
+                                         state="disabled")
+        self.btn_active_stop.pack(side="left")
+        self.al_stop_event = threading.Event()
+
+        # Résultat texte + courbe de convergence
+        res_sub = tk.Frame(opt_frame)
+        res_sub.pack(fill="x", pady=5)
+        self.txt_opt_res = scrolledtext.ScrolledText(res_sub, height=5, width=40, font=("Consolas", 9), bg="#e6ffe6")
+        self.txt_opt_res.pack(side="left", fill="both", expand=True)
+
+        self.fig_conv = Figure(figsize=(3, 1.2))
+        self.ax_conv = self.fig_conv.add_subplot(111)
+        self.canvas_conv = FigureCanvasTkAgg(self.fig_conv, res_sub)
+        self.canvas_conv.get_tk_widget().pack(side="left", fill="both", padx=(5, 0))
 
         # --- Panneau 3 : Vue Parallèle (Droite - Nouveau) ---
         self.visu_frame = tk.LabelFrame(paned, text="Vue Globale (Coordonnées Parallèles)")
@@ -571,6 +654,9 @@ class OptimizationWindow(tk.Toplevel):
         idx = int(selected[0])
         zone = self.zones[idx]
         expansion = self.scale_ext.get() / 100.0 # Convertir % en float
+        method, n_iter = SEARCH_LABELS.get(self.search_method.get(), ("lhs", 5000))
+        acquisition = ACQUISITION_LABELS.get(self.acquisition.get(), "mean")
+        kappa = self.kappa.get()
         
         self.txt_opt_res.delete("1.0", tk.END)
         self.txt_opt_res.insert(tk.END, "Simulation en cours...\n")
@@ -579,25 +665,128 @@ class OptimizationWindow(tk.Toplevel):
         try:
             from core.optimization_finder import refine_optimal_point
             
-            best_val, best_coords = refine_optimal_point(
+            best_val, best_coords, info = refine_optimal_point(
                 self.df, self.params, self.response,
+                model=self.get_surrogate(),
                 zone_bounds=zone['bounds'],
-                expansion_pct=expansion
+                expansion_pct=expansion,
+                n_iter=n_iter,
+                method=method,
+                acquisition=acquisition,
+                kappa=kappa,
+                return_info=True
             )
             
             self.last_optimized_coords = best_coords
             self.last_picked_coords = None
 
+            status = "convergé" if info["converged"] else "budget atteint"
             self.txt_opt_res.delete("1.0", tk.END)
-            self.txt_opt_res.insert(tk.END, f"--- Optimum Estimé (Ext: {expansion*100:.0f}%) ---\n")
-            self.txt_opt_res.insert(tk.END, f"Réponse Prévue : {best_val:.4f}\n")
+            self.txt_opt_res.insert(tk.END, f"--- Optimum Estimé (Ext: {expansion*100:.0f}%, {method}, {acquisition}) ---\n")
+            self.txt_opt_res.insert(tk.END, f"Réponse Prévue : {best_val:.4f} ± {info['std']:.4f}\n")
+            self.txt_opt_res.insert(tk.END, f"Évaluations : {info['n_evals']} ({status})\n")
             self.txt_opt_res.insert(tk.END, "Paramètres :\n")
             for p, v in best_coords.items():
                 self.txt_opt_res.insert(tk.END, f"  {p:<15} : {v:.4f}\n")
+
+            self.plot_convergence(info["trace"])
                 
         except Exception as e:
             self.txt_opt_res.insert(tk.END, f"Erreur: {e}")
 
+    def get_surrogate(self):
+        """Métamodèle de la réponse, entraîné au premier appel puis réutilisé."""
+        if self.surrogate is None and self.shared_surrogate is not None:
+            self.surrogate = self.shared_surrogate.for_response(self.response)
+        if self.surrogate is None:
+            from core.optimization_finder import fit_surrogate
+            self.surrogate = fit_surrogate(self.df, self.params, self.response)
+        return self.surrogate
+
+    def run_all_zones_optimization(self):
+        if not self.zones:
+            messagebox.showinfo("Info", "Lancez d'abord la recherche de zones.", parent=self)
+            self.lift()
+            self.focus_force()
+            return
+
+        expansion = self.scale_ext.get() / 100.0
+        method, n_iter = SEARCH_LABELS.get(self.search_method.get(), ("lhs", 5000))
+        acquisition = ACQUISITION_LABELS.get(self.acquisition.get(), "mean")
+
+        self.txt_opt_res.delete("1.0", tk.END)
+        self.txt_opt_res.insert(tk.END, f"Affinage de {len(self.zones)} zones en parallèle...\n")
+        self.update()
+
+        try:
+            from core.optimization_finder import refine_all_zones
+
+            results = refine_all_zones(
+                self.df, self.params, self.response, self.zones,
+                expansion_pct=expansion, n_iter=n_iter, method=method,
+                acquisition=acquisition, kappa=self.kappa.get(),
+                model=self.get_surrogate()
+            )
+        except Exception as e:
+            self.txt_opt_res.insert(tk.END, f"Erreur: {e}")
+            return
+
+        best = max(results, key=lambda r: r['best_val'])
+        self.txt_opt_res.delete("1.0", tk.END)
+        self.txt_opt_res.insert(tk.END, f"--- {len(results)} zones affinées ({method}, {acquisition}) ---\n")
+        self.txt_opt_res.insert(tk.END, f"Meilleur optimum : zone #{best['zone']} -> {best['best_val']:.4f} ± {best['std']:.4f}\n")
+        self.show_zones_comparison(results)
+
+    def show_zones_comparison(self, results):
+        """Tableau comparatif des optimums par zone ; la sélection d'une ligne la rend visualisable."""
+        win = tk.Toplevel(self)
+        win.title("Comparaison des Optimums par Zone")
+        win.geometry("700x300")
+        win.transient(self)
+
+        cols = ("Zone", "ZoneMean", "Best", "Std", "Dist", "Evals")
+        tree = ttk.Treeview(win, columns=cols, show="headings", selectmode="browse")
+        for col, title, width in (("Zone", "#", 40), ("ZoneMean", "Moy. Zone", 90),
+                                  ("Best", "Optimum Prévu", 110), ("Std", "± σ arbres", 90),
+                                  ("Dist", "Dist. Zone #1", 90), ("Evals", "Évaluations", 110)):
+            tree.heading(col, text=title)
+            tree.column(col, width=width, anchor="center")
+        tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+        for i, r in enumerate(results):
+            status = "" if r['converged'] else " (budget)"
+            tree.insert("", "end", iid=i, values=(r['zone'], f"{r['zone_mean']:.4f}", f"{r['best_val']:.4f}",
+                                                  f"{r['std']:.4f}", f"{r['dist_ref']:.2f}",
+                                                  f"{r['n_evals']}{status}"))
+
+        def on_select(_):
+            sel = tree.selection()
+            if not sel: return
+            r = results[int(sel[0])]
+            self.last_optimized_coords = r['coords']
+            self.last_picked_coords = None
+            self.txt_opt_res.delete("1.0", tk.END)
+            self.txt_opt_res.insert(tk.END, f"--- Optimum Zone #{r['zone']} ---\n")
+            self.txt_opt_res.insert(tk.END, f"Réponse Prévue : {r['best_val']:.4f} ± {r['std']:.4f}\n")
+            self.txt_opt_res.insert(tk.END, "Paramètres :\n")
+            for p, v in r['coords'].items():
+                self.txt_opt_res.insert(tk.END, f"  {p:<15} : {v:.4f}\n")
+
+        tree.bind("<<TreeviewSelect>>", on_select)
+        tk.Label(win, text="Sélectionnez une ligne pour l'utiliser avec 'Visualiser Rendu'.", fg="gray").pack(pady=(0, 5))
+
+    def plot_convergence(self, trace):
+        """Meilleur score cumulé (et meilleur du lot) en fonction du nombre d'évaluations."""
+        self.ax_conv.clear()
+        if trace:
+            evals, best, batch_best = zip(*trace)
+            self.ax_conv.plot(evals, batch_best, ".", color="gray", markersize=3, label="Lot")
+            self.ax_conv.step(evals, best, where="post", color="green", label="Meilleur")
+        self.ax_conv.set_xlabel("Évaluations", fontsize=7)
+        self.ax_conv.tick_params(labelsize=6)
+        self.fig_conv.tight_layout()
+        self.canvas_conv.draw()
+
     def export_filtered_report(self):
         """
         Génère un rapport statistique complet sur la sélection actuelle (Zone Verte).
@@ -764,15 +953,8 @@ class OptimizationWindow(tk.Toplevel):
         self.focus_force()
 
         if folder:
-            # Extensions courantes
-            exts = ['*.png', '*.jpg', '*.jpeg', '*.tif', '*.tiff', '*.bmp']
-            files = []
-            for ext in exts:
-                files.extend(glob.glob(os.path.join(folder, ext)))
-
-            # Garder juste les noms de fichiers
-            files = [os.path.basename(f) for f in files]
-            files.sort()
+            # Garder juste les noms de fichiers (extensions courantes, cf. list_render_images)
+            files = [os.path.basename(f) for f in list_render_images(folder)]
 
             self.combo_images['values'] = files
             if files:
@@ -814,69 +996,39 @@ class OptimizationWindow(tk.Toplevel):
                 return
             
             idx = int(selected[0])
-            zone = self.zones[idx]
-            z_bounds = zone['bounds']
-            
-            # Pour chaque paramètre possible, on calcule le centre
-            # Si le param n'est pas dans z_bounds, on prend le centre global
-            temp_params = {}
-            for col in self.params: # self.params est la liste des colonnes
-                glob_min = self.df[col].min()
-                glob_max = self.df[col].max()
-                
-                # Bornes locales ou globales par défaut
-                local_min, local_max = z_bounds.get(col, (-np.inf, np.inf))
-                
-                if local_min == -np.inf: local_min = glob_min
-                if local_max == np.inf: local_max = glob_max
-                
-                # Centre
-                val = (local_min + local_max) / 2.0
-                temp_params[col] = val
-                
-            params_to_use = temp_params
+            # Centre de la zone (centre global pour les paramètres non contraints)
+            params_to_use = zone_center(self.df, self.params, self.zones[idx]['bounds'])
             source_type = f"Centre Zone #{idx+1}"
 
-        # 3. Mapper les paramètres pour ocr_quality_audit
-        # Paramètres attendus par pipeline_complet :
-        # line_h_size, line_v_size, dilate_iter, norm_kernel, denoise_h, noise_threshold, bin_block_size, bin_c
-        
+        # 3. Traitement (typage et corrections de parité : cf. core.render_engine.normalize_ocr_params)
+        # Un couple (image, paramètres normalisés) déjà vu est servi par le cache
         try:
-            # Copie pour modification
-            p = params_to_use.copy()
-            
-            # Préparation du dict final avec typage correct
-            ocr_params = {
-                'line_h_size': int(p.get('line_h_size', 20)),
-                'line_v_size': int(p.get('line_v_size', 20)),
-                'dilate_iter': int(p.get('dilate_iter', 1)),
-                'norm_kernel': int(p.get('norm_kernel', 79)), # Doit être impair
-                'denoise_h': float(p.get('denoise_h', 10.0)),
-                'noise_threshold': int(p.get('noise_threshold', 200)), # Souvent int pour seuil pixel
-                'bin_block_size': int(p.get('bin_block_size', 11)), # Impair
-                'bin_c': float(p.get('bin_c', 2.0))
-            }
-            
-            # Correction parité pour kernels (OpenCV exige impair)
-            if ocr_params['norm_kernel'] % 2 == 0: ocr_params['norm_kernel'] += 1
-            if ocr_params['bin_block_size'] % 2 == 0: ocr_params['bin_block_size'] += 1
-            if ocr_params['line_h_size'] < 1: ocr_params['line_h_size'] = 1
-            if ocr_params['line_v_size'] < 1: ocr_params['line_v_size'] = 1
-
-            # 4. Traitement
-            import ocr_quality_audit
-            
-            # Lire image avec OpenCV (niveaux de gris)
-            img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-            if img is None:
-                raise ValueError("Impossible de lire l'image.")
+            if not self.var_progressive.get() or self.render_cache.is_rendered(img_path, params_to_use):
+                img, processed_img = self.render_cache.render(img_path, params_to_use)
+
+                # 4. Afficher Résultat
+                # Passer params_to_use pour le log CSV (vrais noms de colonnes)
+                self.show_image_window(img, processed_img, img_name, source_type, params_to_use)
+                return
+
+            # Aperçu progressif : version réduite immédiate, pleine résolution en arrière-plan
+            small, processed_small, scale = self.render_cache.render_preview(img_path, params_to_use)
+            if scale >= 1.0:
+                self.show_image_window(small, processed_small, img_name, source_type, params_to_use)
+                return
+            update = self.show_image_window(small, processed_small, img_name, source_type, params_to_use,
+                                            preview=True)
 
-            # Appliquer Pipeline
-            processed_img = ocr_quality_audit.pipeline_complet(img, ocr_params)
+            def task():
+                try:
+                    img, processed_img = self.render_cache.render(img_path, params_to_use)
+                    self.after(0, lambda: update(img, processed_img))
+                except Exception as e:
+                    self.after(0, lambda e=e: messagebox.showerror("Erreur de Traitement",
+                                                               f"Le traitement pleine résolution a échoué :\n{e}",
+                                                               parent=self))
 
-            # 5. Afficher Résultat
-            # Passer params_to_use pour le log CSV (vrais noms de colonnes)
-            self.show_image_window(img, processed_img, img_name, source_type, params_to_use)
+            threading.Thread(target=task, daemon=True).start()
 
         except Exception as e:
             messagebox.showerror("Erreur de Traitement", f"Le traitement a échoué :\n{e}", parent=self)
@@ -885,16 +1037,121 @@ class OptimizationWindow(tk.Toplevel):
             import traceback
             traceback.print_exc()
 
-    def save_image_action(self, img_array, params, batch_mode=False, img_name="result"):
+    def run_active_learning_loop(self):
+        """
+        Propose, évalue (pipeline_complet + score choisi sur les images du
+        dossier source) et intègre des jeux de paramètres, tour après tour.
+        """
+        if not hasattr(self, 'image_folder') or not self.image_folder:
+            messagebox.showwarning("Attention", "Veuillez choisir un dossier d'images de test (Panneau Gauche).", parent=self)
+            self.lift()
+            self.focus_force()
+            return
+
+        # Objectif : confiance Tesseract dans sa propre colonne, ou fonction
+        # importable mesurant la même grandeur que la réponse du criblage
+        score_fn, score_col = None, ACTIVE_SCORER_LABELS[self.al_scorer.get()]
+        if score_col is None:
+            try:
+                import importlib
+                module_name, func_name = self.al_score_fn.get().split(":")
+                score_fn = getattr(importlib.import_module(module_name), func_name)
+            except Exception as e:
+                messagebox.showerror("Erreur", f"Fonction de score introuvable (module:fonction) :\n{e}", parent=self)
+                return
+
+        # Scores séparés : on repart des essais déjà évalués par une boucle précédente
+        base_df = self.df
+        if score_col and self.active_df is not None and score_col in self.active_df.columns:
+            base_df = self.active_df
+
+        images = list_render_images(self.image_folder)[:self.al_images.get()]
+        n_rounds, batch_size = self.al_rounds.get(), self.al_batch.get()
+        self.al_stop_event.clear()
+        self.btn_active.config(state="disabled")
+        self.btn_active_stop.config(state="normal")
+        self.txt_opt_res.delete("1.0", tk.END)
+        self.txt_opt_res.insert(tk.END, f"Boucle active : {n_rounds} tours x {batch_size} jeux sur {len(images)} images...\n")
+
+        def log(msg):
+            self.after(0, lambda: self.txt_opt_res.insert(tk.END, msg + "\n"))
+
+        def task():
+            try:
+                from core.active_learning import run_active_learning
+                data, history = run_active_learning(base_df, self.params, self.response, images,
+                                                    n_rounds=n_rounds, batch_size=batch_size,
+                                                    score_fn=score_fn, score_col=score_col,
+                                                    progress_callback=log, stop_event=self.al_stop_event)
+                self.after(0, lambda: self.on_active_learning_done(data, history, score_col))
+            except Exception as e:
+                log(f"Erreur: {e}")
+            finally:
+                self.after(0, lambda: self.btn_active.config(state="normal"))
+                self.after(0, lambda: self.btn_active_stop.config(state="disabled"))
+
+        threading.Thread(target=task, daemon=True).start()
+
+    def stop_active_learning_loop(self):
+        # Pris en compte à la fin du tour en cours
+        self.al_stop_event.set()
+        self.txt_opt_res.insert(tk.END, "Arrêt demandé (fin du tour en cours)...\n")
+
+    def on_active_learning_done(self, data, history, score_col):
+        if score_col is None:
+            # Scores dans la réponse du criblage : les essais rejoignent les données analysées
+            added = len(data) - len(self.df)
+            self.df = data
+            self.surrogate = None # Le métamodèle sera réentraîné sur les nouvelles données
+            self.shared_surrogate = None
+            self.plot_parallel_coordinates()
+        else:
+            # Autre grandeur : le criblage analysé (zones, métamodèle) reste inchangé
+            base = self.active_df if self.active_df is not None else self.df
+            added = len(data) - len(base)
+            self.active_df = data
+
+        if history:
+            self.plot_convergence([(h['n_evals'], h['best'], h['batch_best']) for h in history])
+        target = f"colonne '{score_col}'" if score_col else f"réponse '{self.response}'"
+        self.txt_opt_res.insert(tk.END, f"--- {added} essais ajoutés ({target}, colonne 'origine') ---\n")
+
+        path = filedialog.asksaveasfilename(
+            title="Exporter le criblage augmenté",
+            initialfile=f"Criblage_{self.analysis_name}_actif.csv",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv")],
+            parent=self
+        )
+        self.lift()
+        self.focus_force()
+        if path:
+            data.to_csv(path, index=False)
+            self.txt_opt_res.insert(tk.END, f"Criblage exporté : {os.path.basename(path)}\n")
+
+    def candidate_param_sets(self, params, tag):
+        """
+        Jeux de paramètres pour le rendu par lot : le jeu courant, puis les
+        centres des zones, l'optimum affiné et le point sélectionné.
+        """
+        sets = [(tag, params)]
+        for i, zone in enumerate(self.zones):
+            sets.append((f"{tag}_zone{i+1}", zone_center(self.df, self.params, zone['bounds'])))
+        if self.last_optimized_coords and self.last_optimized_coords is not params:
+            sets.append((f"{tag}_optimum", self.last_optimized_coords))
+        if self.last_picked_coords and self.last_picked_coords is not params:
+            sets.append((f"{tag}_point", self.last_picked_coords))
+        return sets
+
+    def save_image_action(self, img_array, params, batch_mode=False, img_name="result", all_candidates=False):
         """
         Sauvegarde l'image (ou le lot) et consigne les détails dans un fichier CSV.
+        all_candidates : en mode lot, applique aussi les autres candidats (cf. candidate_param_sets).
         """
         import datetime
-        import ocr_quality_audit # Requis pour le mode batch
         
         now = datetime.datetime.now()
         timestamp_str = now.strftime("%H-%M-%S")
-        date_log = now.strftime("%Y-%m-%d %H:%M:%S")
         
         # Préparation du nom par défaut pour la boite de dialogue
         base_img_name = os.path.splitext(img_name)[0]
@@ -920,69 +1177,38 @@ class OptimizationWindow(tk.Toplevel):
             return
 
         save_dir = os.path.dirname(file_path)
-        log_file = os.path.join(save_dir, "render_history_log.csv") # Changed extension to .csv
-        
-        # Determine parameter names for CSV header (assuming consistent params structure)
-        # This assumes 'params' keys are consistent across all calls within a session
-        param_names = list(params.keys())
-        header = ["Image", "Date"] + param_names
+        log_file = os.path.join(save_dir, "render_history_log.csv")
 
         try:
-            # Check if log file exists to decide whether to write header
-            file_exists = os.path.exists(log_file)
-            
-            # Function to write a log entry
-            def write_log_entry(img_filename, log_date, p_dict):
-                data_row_values = [img_filename, log_date] + [str(p_dict.get(p_name, "")) for p_name in param_names]
-                csv_line = ",".join(data_row_values) + "\n"
-                
-                with open(log_file, "a", encoding="utf-8") as f:
-                    # Write header only if file is new
-                    if not file_exists and f.tell() == 0: # f.tell() == 0 ensures it's truly empty
-                        f.write(",".join(header) + "\n")
-                    f.write(csv_line)
-
             # === MODE BATCH ===
             if batch_mode:
                 if not hasattr(self, 'image_folder') or not self.image_folder:
                     raise ValueError("Le dossier source des images est introuvable.")
                 
                 # Récupérer toutes les images du dossier source
-                exts = ['*.png', '*.jpg', '*.jpeg', '*.tif', '*.tiff', '*.bmp']
-                files = []
-                for ext in exts:
-                    files.extend(glob.glob(os.path.join(self.image_folder, ext)))
-                
+                files = list_render_images(self.image_folder)
                 if not files:
                     raise ValueError("Aucune image trouvée dans le dossier source.")
 
-                count = 0
-                for f_path in files:
-                    f_name = os.path.basename(f_path)
-                    f_base = os.path.splitext(f_name)[0]
-                    
-                    # Lecture
-                    img_in = cv2.imread(f_path, cv2.IMREAD_GRAYSCALE)
-                    if img_in is None: continue
-                    
-                    # Traitement
-                    res = ocr_quality_audit.pipeline_complet(img_in, params)
-                    
-                    # Nom de sortie : Original_Analyse_Heure.png
-                    out_name = f"{f_base}_{self.analysis_name}_{timestamp_str}.png"
-                    out_path = os.path.join(save_dir, out_name)
-                    
-                    # Sauvegarde
-                    cv2.imwrite(out_path, res)
-                    
-                    # Log
-                    write_log_entry(out_name, date_log, params)
-                    
-                    count += 1
+                tag = "".join(c for c in f"{self.analysis_name}_{timestamp_str}" if c.isalnum() or c in keep).strip()
+                param_sets = self.candidate_param_sets(params, tag) if all_candidates else [(tag, params)]
+                self.txt_opt_res.delete("1.0", tk.END)
+                self.txt_opt_res.insert(tk.END, f"Rendu par lot : {len(files)} images x {len(param_sets)} jeu(x)...\n")
 
-                messagebox.showinfo("Succès Batch", f"{count} images traitées et sauvegardées dans :\n{save_dir}\nLog CSV mis à jour.", parent=self)
-                self.lift()
-                self.focus_force()
+                def progress(done, total, msg):
+                    self.after(0, lambda: self.txt_opt_res.insert(tk.END, f"[{done}/{total}] {msg}\n"))
+
+                def task():
+                    try:
+                        count, errors = run_batch_render(files, param_sets, save_dir, log_path=log_file,
+                                                         progress_callback=progress)
+                        msg = f"{count} images traitées et sauvegardées dans :\n{save_dir}\nLog CSV mis à jour."
+                        if errors: msg += f"\n{len(errors)} erreur(s), cf. panneau Exploration Fine."
+                        self.after(0, lambda: messagebox.showinfo("Succès Batch", msg, parent=self))
+                    except Exception as e:
+                        self.after(0, lambda e=e: messagebox.showerror("Erreur", f"Echec du rendu par lot :\n{e}", parent=self))
+
+                threading.Thread(target=task, daemon=True).start()
 
             # === MODE SINGLE ===
             else:
@@ -990,7 +1216,7 @@ class OptimizationWindow(tk.Toplevel):
                 cv2.imwrite(file_path, img_array)
 
                 saved_name = os.path.basename(file_path)
-                write_log_entry(saved_name, date_log, params)
+                append_render_log(log_file, [render_log_row(saved_name, img_name, "unitaire", params)])
 
                 messagebox.showinfo("Succès", f"Image sauvegardée : {saved_name}\nLog CSV mis à jour.", parent=self)
                 self.lift()
@@ -1003,7 +1229,12 @@ class OptimizationWindow(tk.Toplevel):
             import traceback
             traceback.print_exc()
 
-    def show_image_window(self, original, processed, title, source_info, params):
+    def show_image_window(self, original, processed, title, source_info, params, preview=False):
+        """
+        Fenêtre Original / Traité. En mode preview, les images affichées sont
+        un aperçu réduit : la sauvegarde reste désactivée jusqu'à l'appel de la
+        fonction retournée avec le résultat pleine résolution.
+        """
         win = tk.Toplevel(self)
         win.title(f"Visualisation : {title} ({source_info})")
         win.geometry("1200x800")
@@ -1013,24 +1244,6 @@ class OptimizationWindow(tk.Toplevel):
         win.lift()  # Met la fenêtre au premier plan
         win.focus_force()  # Force le focus sur cette fenêtre
         
-        # Convertir OpenCV (BGR/Gray) -> PIL -> ImageTk
-        # Original
-        orig_pil = Image.fromarray(original)
-        
-        # Processed (s'assurer uint8)
-        proc_pil = Image.fromarray(processed)
-        
-        # Redimensionner pour affichage si trop grand (max height 600)
-        max_h = 600
-        scale = min(1.0, max_h / orig_pil.height)
-        if scale < 1.0:
-            new_size = (int(orig_pil.width * scale), int(orig_pil.height * scale))
-            orig_pil = orig_pil.resize(new_size, Image.Resampling.LANCZOS)
-            proc_pil = proc_pil.resize(new_size, Image.Resampling.LANCZOS)
-            
-        orig_tk = ImageTk.PhotoImage(orig_pil)
-        proc_tk = ImageTk.PhotoImage(proc_pil)
-        
         # Layout
         frame_imgs = tk.Frame(win)
         frame_imgs.pack(fill="both", expand=True, padx=10, pady=10)
@@ -1038,17 +1251,43 @@ class OptimizationWindow(tk.Toplevel):
         # Gauche : Original
         lbl_orig = tk.Label(frame_imgs, text="Original", font=("Arial", 12, "bold"))
         lbl_orig.grid(row=0, column=0)
-        lbl_img_orig = tk.Label(frame_imgs, image=orig_tk)
-        lbl_img_orig.image = orig_tk # Keep ref
+        lbl_img_orig = tk.Label(frame_imgs)
         lbl_img_orig.grid(row=1, column=0, padx=5)
         
         # Droite : Traité
         lbl_proc = tk.Label(frame_imgs, text="Traité (Pipeline)", font=("Arial", 12, "bold"))
         lbl_proc.grid(row=0, column=1)
-        lbl_img_proc = tk.Label(frame_imgs, image=proc_tk)
-        lbl_img_proc.image = proc_tk # Keep ref
+        lbl_img_proc = tk.Label(frame_imgs)
         lbl_img_proc.grid(row=1, column=1, padx=5)
 
+        # Image traitée courante (celle qui sera sauvegardée)
+        current = {"processed": processed}
+
+        def set_images(original, processed):
+            # Convertir OpenCV (BGR/Gray) -> PIL -> ImageTk
+            orig_pil = Image.fromarray(original)
+            proc_pil = Image.fromarray(processed)
+
+            # Redimensionner pour affichage si trop grand (max height 600)
+            max_h = 600
+            scale = min(1.0, max_h / orig_pil.height)
+            if scale < 1.0:
+                new_size = (int(orig_pil.width * scale), int(orig_pil.height * scale))
+                orig_pil = orig_pil.resize(new_size, Image.Resampling.LANCZOS)
+                proc_pil = proc_pil.resize(new_size, Image.Resampling.LANCZOS)
+
+            orig_tk = ImageTk.PhotoImage(orig_pil)
+            proc_tk = ImageTk.PhotoImage(proc_pil)
+            lbl_img_orig.config(image=orig_tk)
+            lbl_img_orig.image = orig_tk # Keep ref
+            lbl_img_proc.config(image=proc_tk)
+            lbl_img_proc.image = proc_tk # Keep ref
+            current["processed"] = processed
+
+        set_images(original, processed)
+        if preview:
+            lbl_proc.config(text="Traité (Aperçu réduit - calcul pleine résolution...)")
+
         # Contrôles Sauvegarde
         ctrl_frame = tk.Frame(frame_imgs, pady=10)
         ctrl_frame.grid(row=2, column=1)
@@ -1058,12 +1297,19 @@ class OptimizationWindow(tk.Toplevel):
                                    variable=self.var_batch_process, bg="#ffffcc", anchor="w")
         chk_batch.pack(side="top", pady=2)
 
+        self.var_batch_all = tk.BooleanVar(value=False)
+        tk.Checkbutton(ctrl_frame, text="Avec tous les candidats (zones, optimum, point)",
+                       variable=self.var_batch_all, anchor="w").pack(side="top", pady=2)
+
         # Bouton Sauvegarde
         btn_save = tk.Button(ctrl_frame, text="Sauvegarder l'image (ou le lot)", bg="#d9f2d9", font=("Arial", 10, "bold"),
-                  command=lambda: self.save_image_action(processed, params,
+                  command=lambda: self.save_image_action(current["processed"], params,
                                                          batch_mode=self.var_batch_process.get(),
-                                                         img_name=title), state="normal")
+                                                         img_name=title,
+                                                         all_candidates=self.var_batch_all.get()), state="normal")
         btn_save.pack(side="top", pady=5)
+        if preview:
+            btn_save.config(state="disabled")
         
         # Infos Paramètres en bas
         txt_info = scrolledtext.ScrolledText(win, height=6, bg="#f0f0f0")
@@ -1072,3 +1318,12 @@ class OptimizationWindow(tk.Toplevel):
         txt_info.insert(tk.END, f"Source Paramètres : {source_info}\n")
         txt_info.insert(tk.END, "Paramètres appliqués :\n")
         txt_info.insert(tk.END, str(params))
+
+        def finalize(original, processed):
+            # Résultat pleine résolution (ignoré si la fenêtre a été fermée entre-temps)
+            if not win.winfo_exists(): return
+            set_images(original, processed)
+            lbl_proc.config(text="Traité (Pipeline)")
+            btn_save.config(state="normal")
+
+        return finalize
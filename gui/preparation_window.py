@@ -2,28 +2,36 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, ttk
 import os
 import threading
-from core.image_logic import extract_images_from_pdf, generate_reference_profile
+from core.image_logic import extract_images_from_pdf, generate_reference_profile, validate_coarse_matching
 
 class PreparationWindow(tk.Toplevel):
     def __init__(self, master):
         super().__init__(master)
         self.title("Préparation des Images (PDF & Références)")
-        self.geometry("800x650")
+        self.geometry("800x760")
         
         # Variables Extraction
         self.pdf_path = tk.StringVar()
         self.extract_out_dir = tk.StringVar()
+        self.extract_workers = tk.IntVar(value=min(4, os.cpu_count() or 1))
+        self.extract_resume = tk.BooleanVar(value=True)
+        self.extract_passthrough = tk.BooleanVar(value=True)
         
         # Variables Références
         self.ref_old_dir = tk.StringVar()
         self.ref_new_dir = tk.StringVar()
-        self.ref_json_out = tk.StringVar(value="reference_profiles.json")
+        self.ref_json_out = tk.StringVar(value="reference_profiles.refprof")
+
+        # Variables Classifieur
+        self.clf_out = tk.StringVar(value="card_classifier.joblib")
+        self.clf_use_cache = tk.BooleanVar(value=True)
 
         # Layout
         self.columnconfigure(0, weight=1)
         
         self.create_extraction_ui()
         self.create_reference_ui()
+        self.create_classifier_ui()
         self.create_log_ui()
 
     def log(self, msg):
@@ -54,8 +62,16 @@ class PreparationWindow(tk.Toplevel):
         tk.Entry(f2, textvariable=self.extract_out_dir).pack(side="left", fill="x", expand=True, padx=5)
         tk.Button(f2, text="...", command=self.browse_extract_dir).pack(side="left")
 
+        # Options
+        f3 = tk.Frame(frame)
+        f3.pack(fill="x", pady=2)
+        tk.Label(f3, text="Processus :", width=15, anchor="w").pack(side="left")
+        tk.Spinbox(f3, from_=1, to=max(1, os.cpu_count() or 1), width=4, textvariable=self.extract_workers).pack(side="left", padx=5)
+        tk.Checkbutton(f3, text="Reprendre (ignorer les pages déjà extraites)", variable=self.extract_resume).pack(side="left", padx=15)
+        tk.Checkbutton(f3, text="Image embarquée sans ré-encodage", variable=self.extract_passthrough).pack(side="left")
+
         # Action
-        self.btn_extract = tk.Button(frame, text="Extraire les pages en JPEG", bg="#e6f2ff", command=self.run_extraction)
+        self.btn_extract = tk.Button(frame, text="Extraire les pages en images", bg="#e6f2ff", command=self.run_extraction)
         self.btn_extract.pack(fill="x", pady=5)
 
     def browse_pdf(self):
@@ -79,10 +95,14 @@ class PreparationWindow(tk.Toplevel):
             
         self.btn_extract.config(state="disabled")
         self.log(f"--- Démarrage Extraction : {os.path.basename(pdf)} ---")
+        workers = self.extract_workers.get()
+        resume = self.extract_resume.get()
+        mode = "passthrough" if self.extract_passthrough.get() else "render"
         
         def task():
             try:
-                extract_images_from_pdf(pdf, out, progress_callback=self.update_log_threadsafe)
+                extract_images_from_pdf(pdf, out, progress_callback=self.update_log_threadsafe,
+                                        workers=workers, resume=resume, mode=mode)
                 self.update_log_threadsafe("Extraction terminée.")
                 messagebox.showinfo("Succès", "Extraction terminée avec succès.", parent=self)
             except ImportError as e:
@@ -123,20 +143,22 @@ class PreparationWindow(tk.Toplevel):
         # Fichier Sortie JSON
         f3 = tk.Frame(frame)
         f3.pack(fill="x", pady=2)
-        tk.Label(f3, text="Sortie JSON :", width=18, anchor="w").pack(side="left")
+        tk.Label(f3, text="Fichier références :", width=18, anchor="w").pack(side="left")
         tk.Entry(f3, textvariable=self.ref_json_out).pack(side="left", fill="x", expand=True, padx=5)
         tk.Button(f3, text="...", command=self.browse_save_json).pack(side="left")
 
         # Action
         self.btn_ref = tk.Button(frame, text="Générer Fichier JSON", bg="#e6ffe6", command=self.run_generation)
         self.btn_ref.pack(fill="x", pady=5)
+        self.btn_validate = tk.Button(frame, text="Valider la recherche rapide sur ces exemples", command=self.run_validation)
+        self.btn_validate.pack(fill="x")
 
     def browse_dir(self, var):
         d = filedialog.askdirectory(parent=self)
         if d: var.set(d)
         
     def browse_save_json(self):
-        f = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")], initialfile="reference_profiles.json", parent=self)
+        f = filedialog.asksaveasfilename(defaultextension=".refprof", filetypes=[("Références binaires", "*.refprof"), ("JSON", "*.json"), ("NumPy compressé", "*.npz")], initialfile="reference_profiles.refprof", parent=self)
         if f: self.ref_json_out.set(f)
 
     def run_generation(self):
@@ -164,6 +186,86 @@ class PreparationWindow(tk.Toplevel):
 
         threading.Thread(target=task).start()
 
+    def run_validation(self):
+        old_d = self.ref_old_dir.get()
+        new_d = self.ref_new_dir.get()
+        ref_file = self.ref_json_out.get()
+
+        if not os.path.exists(old_d) or not os.path.exists(new_d):
+            messagebox.showerror("Erreur", "Veuillez sélectionner des dossiers valides.", parent=self)
+            return
+        if not os.path.exists(ref_file):
+            messagebox.showerror("Erreur", "Fichier de références introuvable : générez-le d'abord.", parent=self)
+            return
+
+        self.btn_validate.config(state="disabled")
+        self.log("--- Validation recherche grossière / fine ---")
+
+        def task():
+            try:
+                validate_coarse_matching(ref_file, {"old": old_d, "new": new_d},
+                                         progress_callback=self.update_log_threadsafe)
+            except Exception as e:
+                self.update_log_threadsafe(f"ERREUR: {e}")
+                self.after(0, lambda e=e: messagebox.showerror("Erreur", str(e), parent=self))
+            finally:
+                self.after(0, lambda: self.btn_validate.config(state="normal"))
+
+        threading.Thread(target=task).start()
+
+    # =========================================================================
+    # 3. UI ENTRAÎNEMENT CLASSIFIEUR
+    # =========================================================================
+    def create_classifier_ui(self):
+        frame = tk.LabelFrame(self, text="3. Entraînement Classifieur (Alternative aux Gabarits)", padx=10, pady=10, fg="#333", font=("Arial", 10, "bold"))
+        frame.pack(fill="x", padx=10, pady=5)
+
+        lbl = tk.Label(frame, text="Utilise les mêmes dossiers d'exemples 'ANCIEN' / 'NOUVEAU' que ci-dessus.", justify="left", fg="gray")
+        lbl.pack(anchor="w", pady=(0, 5))
+
+        f1 = tk.Frame(frame)
+        f1.pack(fill="x", pady=2)
+        tk.Label(f1, text="Fichier modèle :", width=18, anchor="w").pack(side="left")
+        tk.Entry(f1, textvariable=self.clf_out).pack(side="left", fill="x", expand=True, padx=5)
+        tk.Button(f1, text="...", command=self.browse_save_classifier).pack(side="left")
+        tk.Checkbutton(f1, text="Cache des profils", variable=self.clf_use_cache).pack(side="left", padx=(10, 0))
+
+        self.btn_clf = tk.Button(frame, text="Entraîner le Classifieur", bg="#fff2e6", command=self.run_training)
+        self.btn_clf.pack(fill="x", pady=5)
+
+    def browse_save_classifier(self):
+        f = filedialog.asksaveasfilename(defaultextension=".joblib", filetypes=[("Classifieur", "*.joblib")], initialfile="card_classifier.joblib", parent=self)
+        if f: self.clf_out.set(f)
+
+    def run_training(self):
+        old_d = self.ref_old_dir.get()
+        new_d = self.ref_new_dir.get()
+        out = self.clf_out.get()
+
+        if not os.path.exists(old_d) or not os.path.exists(new_d):
+            messagebox.showerror("Erreur", "Veuillez sélectionner des dossiers valides.", parent=self)
+            return
+
+        cache_path = os.path.splitext(out)[0] + "_profiles_cache.joblib" if self.clf_use_cache.get() else None
+        self.btn_clf.config(state="disabled")
+        self.log("--- Entraînement Classifieur ---")
+
+        def task():
+            try:
+                # Import tardif : scikit-learn n'est requis que pour ce mode
+                from core.card_classifier import train_card_classifier
+                train_card_classifier(old_d, new_d, out, cache_path=cache_path,
+                                      progress_callback=self.update_log_threadsafe)
+                self.update_log_threadsafe("Entraînement terminé.")
+                self.after(0, lambda: messagebox.showinfo("Succès", f"Fichier créé : {out}", parent=self))
+            except Exception as e:
+                self.update_log_threadsafe(f"ERREUR: {e}")
+                self.after(0, lambda e=e: messagebox.showerror("Erreur", str(e), parent=self))
+            finally:
+                self.after(0, lambda: self.btn_clf.config(state="normal"))
+
+        threading.Thread(target=task).start()
+
     # =========================================================================
     # UI LOGS
     # =========================================================================
@@ -19,7 +19,7 @@ class ShapWindow(tk.Toplevel):
     2. Dependence plot (Analyse fine des interactions)
     """
 
-    def __init__(self, master, df, params, response_cols):
+    def __init__(self, master, df, params, response_cols, surrogate=None):
         super().__init__(master)
         self.title("Analyse d'Interprétabilité (SHAP)")
         self.geometry("1000x800")
@@ -32,6 +32,7 @@ class ShapWindow(tk.Toplevel):
         self.shap_values = None
         self.X_data = None
         self.explainer = None
+        self.surrogate = surrogate # Métamodèle multi-réponses partagé (optionnel)
 
         # Layout
         self.columnconfigure(0, weight=1)
@@ -193,8 +194,10 @@ class ShapWindow(tk.Toplevel):
             from core.shap_analysis import compute_shap_analysis
             
             # On utilise self.active_params au lieu de self.params
+            # Le métamodèle partagé n'est valable que pour la liste complète des paramètres
+            surrogate = self.surrogate if self.active_params == list(self.params) else None
             self.shap_values, self.X_data, self.explainer = compute_shap_analysis(
-                self.df, self.active_params, self.response
+                self.df, self.active_params, self.response, surrogate=surrogate
             )
             
             self.refresh_plot()
@@ -13,7 +13,7 @@ class SobolWindow(tk.Toplevel):
     Utilise un Random Forest comme métamodèle pour calculer les indices.
     """
 
-    def __init__(self, master, df, params, response_cols):
+    def __init__(self, master, df, params, response_cols, surrogate=None):
         super().__init__(master)
         self.title("Analyse de Sobol (S1 / ST)")
         self.geometry("900x700")
@@ -25,6 +25,7 @@ class SobolWindow(tk.Toplevel):
         self.response_cols = response_cols # On garde la liste complète si besoin de changer
 
         self.results = None
+        self.surrogate = surrogate # Métamodèle multi-réponses partagé (optionnel)
 
         # Layout principal
         self.columnconfigure(0, weight=1)
@@ -71,7 +72,8 @@ class SobolWindow(tk.Toplevel):
             
             # Calcul
             # On utilise N=2048 par défaut pour une bonne précision sans être trop lent
-            res = compute_sobol_indices(self.df, self.params, self.response, n_samples=2048)
+            res = compute_sobol_indices(self.df, self.params, self.response, n_samples=2048,
+                                        surrogate=self.surrogate)
             self.results = res
             
             # Affichage Texte